@@ -1,7 +1,9 @@
 import gamelib
 import random
 import math
+import itertools
 import warnings
+import sys
 from sys import maxsize
 import json
 
@@ -53,7 +55,8 @@ class AlgoStrategy(gamelib.AlgoCore):
         self.scored_on_locations = []
         self.spawn_left, self.last_spawn = True, 0
         self.unit_type_map = { 0: WALL, 1: SUPPORT, 2: TURRET }
-        self.destroyed_buildings, self.turret_attacks, self.support_shields, self.wall_damage = [], {}, {}, {}
+        # Filled in on_turn from the action phase summaries kept by self.action_recorder
+        self.destroyed_buildings, self.support_shields = [], {}
         # target defence structure
         self.left_support_locations = [[11, 4], [10, 8], [12, 3], [13, 2], [12, 4], [13, 4], [13, 3]]
         self.right_support_locations = [[16, 4], [17, 8], [15, 3], [14, 2], [14, 4], [15, 4], [14, 3]]
@@ -71,7 +74,7 @@ class AlgoStrategy(gamelib.AlgoCore):
         unit deployments, and transmitting your intended deployments to the
         game engine.
         """
-        game_state = gamelib.GameState(self.config, turn_state)
+        game_state = gamelib.GameState(self.config, turn_state, self.query_cache, self.board_snapshots)
         gamelib.debug_write('Performing turn {} of your custom algo strategy'.format(game_state.turn_number))
         game_state.suppress_warnings(True)  #Comment or remove this line to enable warnings.
 
@@ -80,13 +83,25 @@ class AlgoStrategy(gamelib.AlgoCore):
         units = state["p1Units"]
         self.wall_stats, self.support_stats, self.turret_stats = units[0], units[1], units[2]
         self.upgrade_locations = units[7]
+        self.read_action_phase()
 
         self.starter_strategy(game_state)
 
-        self.destroyed_buildings = []
-
         game_state.submit_turn()
 
+    def read_action_phase(self):
+        """
+        Reads what happened during the previous action phases from the summaries AlgoCore's action_recorder
+        keeps, instead of walking the events of every action frame.
+        """
+        game, last_turn = self.action_recorder.game, self.action_recorder.last_turn
+        # Where the enemy scored on us, without repeats
+        self.scored_on_locations = game.locations(game.breaches[1])
+        # Our structures destroyed or removed last turn, as (location, unit type number)
+        self.destroyed_buildings = last_turn.structure_deaths(0)
+        # Shield given by each of our supports over the game, keyed by (x, y). Turret damage is ranked by self.structure_importance
+        self.support_shields = game.cells(game.shield_given[0])
+
     """
     NOTE: All the methods after this point are part of the sample starter-algo
     strategy and can safely be replaced for your custom algo.
@@ -97,10 +112,10 @@ class AlgoStrategy(gamelib.AlgoCore):
         if game_state.turn_number != 0:
             # Let's figure out their least defended area and send Scouts there.
 
-            # Only spawn when the opponent is not spawning, and we have waited at least 3 turns
+            # Only spawn when the opponent is unlikely to spawn, judging by their MP and past attacks, and we have waited at least 3 turns
             # Must spawn within 5 turns of last spawn
             x = game_state.turn_number - self.last_spawn
-            if (game_state.get_resource(1, 1) < 10 and x >= 3) or (x > 3):
+            if (self.attack_predictor.probability(game_state.get_resource(1, 1)) < 0.5 and x >= 3) or (x > 3):
                 # To simplify we will just check sending them from back left and right
                 scout_spawn_location_options = [[13, 0], [14, 0]]
                 best_location, min_damage = self.least_damage_spawn_location(game_state, scout_spawn_location_options)
@@ -153,11 +168,9 @@ class AlgoStrategy(gamelib.AlgoCore):
                 location = destroyed[0]
                 unit_type = self.unit_type_map[destroyed[1]]
                 game_state.attempt_spawn(unit_type, location)
-            for turret in self.turret_stats:
-                hp_percent = turret[2] / TURRET_HEALTH
-                location = [turret[0], turret[1]]
-                if hp_percent <= 0.3:
-                    game_state.attempt_remove(location)
+            # unit type number 2 is the turret
+            for location in self.structure_importance.low_health(0.3, unit_type=2):
+                game_state.attempt_remove(location)
 
             # Extra priority: force upgrade at least 1 support per round after round 20
             if game_state.turn_number > 18:
@@ -167,16 +180,20 @@ class AlgoStrategy(gamelib.AlgoCore):
                         break
 
             # 2nd priority: Build any reactive defence
-            sorted_turrets_desc = sorted(self.turret_attacks.items(), key=lambda item: item[1], reverse=True)
-            gamelib.debug_write("sorted_turrets: {}".format(sorted_turrets_desc))
-            self.build_reactive_defense(game_state, sorted_turrets_desc[:5])
+            # Our turrets by damage dealt over the game, from the importance index instead of sorting every turn
+            turret_damage = self.structure_importance.damage_dealt
+            top_turrets = turret_damage.top(5)
+            gamelib.logger.debug("top turrets: {}", top_turrets)
+            self.build_reactive_defense(game_state, top_turrets)
+            # Keep the repairs and reactive defence if the rest of the turn runs out of time
+            game_state.checkpoint()
 
             # 3rd priority: build our ideal structure. Build at most 1 support and 5 turrets each turn
             # Support is built after we deploy mobile units (in starter_strategy)
             self.spawn_mobile_units_and_support(game_state)
             # build turrets on the side where the turrets attack the most
             # first 0 to get 1st in list, 2nd 0 to get key (location), 3rd 0 to get x-coord
-            if not sorted_turrets_desc or sorted_turrets_desc[0][0][0] <= 13:  
+            if not top_turrets or top_turrets[0][0][0] <= 13:  
                 game_state.attempt_spawn(TURRET, self.left_turret_locations)
             else:
                 game_state.attempt_spawn(TURRET, self.right_turret_locations)
@@ -188,13 +205,17 @@ class AlgoStrategy(gamelib.AlgoCore):
             for (x, y, _, _) in sorted_supports_desc:
                 # location is a tuple so we convert to list type
                 game_state.attempt_upgrade([x, y])
-            for (location, _) in sorted_turrets_desc:
+            upgrade_cost = game_state.type_cost(TURRET, upgrade=True)[game_state.SP]
+            for (location, _) in turret_damage.ranked():
+                # Every turret upgrade costs the same, so the rest would fail too
+                if game_state.get_resource(game_state.SP) < upgrade_cost:
+                    break
                 game_state.attempt_upgrade(list(location))
 
             # If there's spare SP > 10, dont waste it. Add 1 turret at any random location that is not a forbidden(no building) location
             # no building locations are specified so that we don't block the path of mobile units
             if game_state.get_resource(0) > 10:  
-                self.build_relevant_turrets(game_state, sorted_turrets_desc[5:])
+                self.build_relevant_turrets(game_state, itertools.islice(turret_damage.ranked(), 5, None))
 
     def build_relevant_turrets(self, game_state, sorted_turrets_desc):
         # Based on importance metrics, add turrets near the turrets that attack the most
@@ -282,13 +303,9 @@ class AlgoStrategy(gamelib.AlgoCore):
         return health
 
     def detect_enemy_unit(self, game_state, unit_type=None, valid_x = None, valid_y = None):
-        total_units = 0
-        for location in game_state.game_map:
-            if game_state.contains_stationary_unit(location):
-                for unit in game_state.game_map[location]:
-                    if unit.player_index == 1 and (unit_type is None or unit.unit_type == unit_type) and (valid_x is None or location[0] in valid_x) and (valid_y is None or location[1] in valid_y):
-                        total_units += 1
-        return total_units
+        # Counts enemy structures (of unit_type if given) using the map's unit index instead of scanning every location
+        unit_types = [WALL, SUPPORT, TURRET] if unit_type is None else unit_type
+        return game_state.game_map.count_units(1, unit_types, valid_y, valid_x)
         
     def filter_blocked_locations(self, locations, game_state):
         filtered = []
@@ -297,57 +314,11 @@ class AlgoStrategy(gamelib.AlgoCore):
                 filtered.append(location)
         return filtered
 
-    def on_action_frame(self, turn_string):
-        """
-        This is the action frame of the game. This function could be called 
-        hundreds of times per turn and could slow the algo down so avoid putting slow code here.
-        Processing the action frames is complicated so we only suggest it if you have time and experience.
-        Full doc on format of a game frame at in json-docs.html in the root of the Starterkit.
-        """
-        # Let's record at what position we get scored on
-        state = json.loads(turn_string)
-        events = state["events"]
-        breaches = events["breach"]
-        for breach in breaches:
-            location = breach[0]
-            unit_owner_self = breach[4] == 1
-            # When parsing the frame data directly, 
-            # 1 is integer for yourself, 2 is opponent (StarterKit code uses 0, 1 as player_index instead)
-            if not unit_owner_self:
-                gamelib.debug_write("Got scored on at: {}".format(location))
-                self.scored_on_locations.append(location)
-                gamelib.debug_write("All locations: {}".format(self.scored_on_locations))
-
-        # Track if enemy destoryed our buildings
-        deaths = events["death"]
-        for death in deaths:
-            # death[4] is a Boolean, it's true for a player removing their own structure.
-            # death[3] is player id, 1 for myself
-            # death[0] is the location, death[1] is the unit type (int) {0 for wall, 1 for support, 2 for turrets}
-            if death[3] == 1 and death[1] < 3:
-                self.destroyed_buildings.append(death)
-
-        # Track turret attacks, support shielding and wall damage taken to calculate importance
-        attacks = events["attack"]
-        shields = events["shield"]
-        # damage_taken = events["damage"]
-        for attack in attacks:
-            if attack[6] == 1 and attack[3] == 2:
-                # turret location as key, turret damage as value
-                location = tuple(attack[0])
-                self.turret_attacks[location] = self.turret_attacks.get(location, 0) + attack[2]
-        for shield in shields:
-            if shield[6] == 1:
-                # support location as key, total shield amount as value
-                location = tuple(shield[0])
-                self.support_shields[location] = self.support_shields.get(location, 0) + shield[2]
-                gamelib.debug_write("Support at {sup} gave shield value {amt} to {id}".format(sup=location, amt=shield[2], id=shield[5]))
-        # for damage in damage_taken:
-        #     if damage[2] == 0:
-        #         # wall location as key, total damage taken as value
-        #         location = tuple(damage[0])
-        #         self.wall_damage[location] = self.wall_damage.get(location, 0) + damage[1]
-
 if __name__ == "__main__":
     algo = AlgoStrategy()
-    algo.start()
+    if "--serve" in sys.argv:
+        # Server mode: play many games in this process, from stdin or from a Unix socket. See AlgoCore.serve
+        arguments = sys.argv[sys.argv.index("--serve") + 1:]
+        algo.serve(arguments[0] if arguments else None)
+    else:
+        algo.start()
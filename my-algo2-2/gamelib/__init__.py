@@ -16,14 +16,89 @@ Investigating it is useful for advanced players interested in getting data from
 The Navigation class in navigation.py contains functions related to path-finding, which are used by GameState in pathing related functions. 
 Investigating it is useful for advanced player who want to optimize the slow default pathing algorithm we provide. \n 
 
+The QueryCache class in cache.py holds path and attacker results between turns, keyed by the board hashes kept by GameMap. 
+AlgoCore owns one for the whole game; pass it to GameState to reuse results while the board is unchanged. \n
+
+The predict_wave function in wave.py follows a wave of mobile units frame by frame, re-pathing them as the structures blocking them are destroyed. 
+GameState.predict_wave is the usual way to call it. predict_self_destructs in the same module predicts the blasts of units whose path ends away from their target edge. \n
+
+The analyze_chokepoints function in chokepoints.py finds the cells where a single structure would seal a route, and the smallest sets of cells that would. \n
+
+The plan_standoffs function in standoff.py ranks demolisher spawn locations by the damage they can deal to structures from outside turret range. \n
+
+The plan_intercepts function in intercept.py finds where and when interceptors from each of your edge cells would meet predicted enemy stacks. \n
+
+The BatchSimulator class in simulator.py steps many deploy plans on the same board at once as NumPy arrays. 
+numpy is optional: the rest of gamelib works without it. \n
+
+The WorkerPool class in workers.py runs independent evaluations, such as candidate spawn plans, in forked worker processes. 
+Start it with AlgoCore.start_worker_pool in on_game_start; it runs tasks serially where forking is not available. \n
+
+The ActionPhaseRecorder class in action_phase.py sums the events of every action frame into per cell tables, 
+rolled up per turn, over a sliding window of turns and over the game. AlgoCore feeds it; read it in on_turn. \n
+
+The ImportanceIndex class in importance.py ranks keys by a score in a heap, answering top k and threshold queries without sorting. 
+AlgoCore keeps a StructureImportance that ranks your structures by damage dealt, damage taken and health. \n
+
+The BoardDelta class in delta.py lists the structures added, removed and upgraded between two turns, comparing only the rows 
+whose hashes changed. GameState.board_delta compares a turn with the one before it, kept in AlgoCore.board_snapshots. \n
+
+The OpponentHistory class in history.py keeps the enemy's resources, builds, spawns and damage of the last turns in 
+fixed size ring buffers, with windowed totals and means. AlgoCore fills it as enemy_history. \n
+
+The IncomeTable class in income.py holds the MP and SP gained on every turn, built once from config["resources"]. 
+GameState.project_future_MP uses it. The AttackPredictor class in forecast.py estimates the probability and the unit mix 
+of an enemy attack from their MP and enemy_history; AlgoCore keeps one as attack_predictor. \n
+
+The PrecomputeCache class in precompute.py keeps the tables that only depend on the config, such as range masks, 
+in a memory mapped file in the algo folder, so they are computed once rather than every game. \n
+
+The Watchdog class in watchdog.py submits a fallback turn when on_turn nears the time limit. 
+AlgoCore creates it from the config; call GameState.checkpoint to offer the turn planned so far. \n
+
 util.py contains a small handful of functions that help with communication, including the debug-printing function, debug_write().
+Debug output is buffered and written once per turn by util.logger, which also supports log levels and per key rate limits. 
+debug_write logs at the INFO level. Set the ALGO_LOG_LEVEL environment variable to DEBUG to see debug lines, 
+or to WARNING to drop the debug_write output as well. \n
 """
 
 from .algocore import AlgoCore
-from .util import debug_write
+from .util import debug_write, logger
 from .game_state import GameState
 from .unit import GameUnit
 from .game_map import GameMap
+from .cache import QueryCache
+
+import importlib
+
+# Optional accelerators and analysis tools, loaded the first time they are used so that a cold start only
+# pays for the modules every algo needs. gamelib.BatchSimulator, for example, imports simulator.py and NumPy on first access.
+_LAZY_NAMES = {
+    "predict_wave": "wave",
+    "predict_self_destructs": "wave",
+    "analyze_chokepoints": "chokepoints",
+    "plan_standoffs": "standoff",
+    "plan_intercepts": "intercept",
+    "BatchSimulator": "simulator",
+    "WorkerPool": "workers",
+    "PrecomputeCache": "precompute",
+    "Watchdog": "watchdog",
+}
+
+__all__ = ["action_phase", "algocore", "cache", "chokepoints", "delta", "forecast", "game_state", "game_map", "history", "importance", "income", "intercept", "navigation", "precompute", "simulator", "standoff", "unit", "util", "watchdog", "wave", "workers"]
+ 
+
+
+def __getattr__(name):
+    if name in _LAZY_NAMES:
+        value = getattr(importlib.import_module("." + _LAZY_NAMES[name], __name__), name)
+    elif name in __all__:
+        value = importlib.import_module("." + name, __name__)
+    else:
+        raise AttributeError("module {!r} has no attribute {!r}".format(__name__, name))
+    globals()[name] = value
+    return value
+
 
-__all__ = ["algocore", "game_state", "game_map", "navigation", "unit", "util"]
- 
\ No newline at end of file
+def __dir__():
+    return sorted(set(globals()) | set(_LAZY_NAMES) | set(__all__))
@@ -0,0 +1,180 @@
+from array import array
+from collections import deque
+
+from .game_map import ARENA_SIZE, CELL_COUNT
+
+# Unit type numbers used in action frames: walls, supports and turrets, then scouts, demolishers and interceptors
+UNIT_TYPE_COUNT = 6
+STRUCTURE_TYPE_COUNT = 3
+_FIELDS = ("damage_dealt", "damage_taken", "shield_given", "breaches")
+
+
+def _cells():
+    return array("d", bytes(8 * CELL_COUNT))
+
+
+def _player(frame_player):
+    """Action frames number the players 1 for you and 2 for the enemy, gamelib uses 0 and 1
+    """
+    return 0 if frame_player == 1 else 1
+
+
+class ActionSummary:
+    """Per cell totals of the events of one or more action phases, for both players.
+
+    Every table is indexed by player_index (0 for you, 1 for the enemy) and then by cell index
+    (y * ARENA_SIZE + x), and holds one float per cell. Almost every entry is zero, so the summary also
+    keeps the cells any table has an entry for, and adding or reading summaries only visits those.
+
+    Attributes :
+        * turns (int): The number of action phases summed
+        * frames (int): The number of frames summed
+        * damage_dealt (list): Damage dealt by the player's structures, by the location of the structure
+        * damage_taken (list): Damage taken by the player's units, by the location of the unit
+        * shield_given (list): Shield given by the player's supports, by the location of the support
+        * breaches (list): Units of the player that scored, by the edge location they scored from
+        * deaths (list): Units of the player destroyed or removed, by unit type number and then location
+        * touched (set): The cell indices with an entry in some table. Entries brought back to zero by subtracting may remain.
+
+    """
+    def __init__(self):
+        self.turns = 0
+        self.frames = 0
+        for field in _FIELDS:
+            setattr(self, field, [_cells(), _cells()])
+        self.deaths = [[_cells() for _ in range(UNIT_TYPE_COUNT)] for _ in range(2)]
+        self.touched = set()
+
+    def _tables(self):
+        for field in _FIELDS:
+            for table in getattr(self, field):
+                yield table
+        for player_deaths in self.deaths:
+            for table in player_deaths:
+                yield table
+
+    def add(self, other, sign=1):
+        """Adds another summary to this one, or subtracts it if sign is -1
+        """
+        self.turns += sign * other.turns
+        self.frames += sign * other.frames
+        cells = other.touched
+        if not cells:
+            return self
+        self.touched |= cells
+        for mine, theirs in zip(self._tables(), other._tables()):
+            for cell in cells:
+                value = theirs[cell]
+                if value:
+                    total = mine[cell] + sign * value
+                    # Keeps rounding residue from showing up as a nonzero entry once a turn is subtracted
+                    mine[cell] = total if abs(total) > 1e-9 else 0.0
+        return self
+
+    def cells(self, table):
+        """The nonzero entries of one of the tables, as a dict mapping (x, y) to the value
+        """
+        return {(cell % ARENA_SIZE, cell // ARENA_SIZE): table[cell] for cell in sorted(self.touched) if table[cell]}
+
+    def locations(self, table):
+        """The [x, y] locations with a nonzero entry in one of the tables, lowest cell index first
+        """
+        return [[cell % ARENA_SIZE, cell // ARENA_SIZE] for cell in sorted(self.touched) if table[cell]]
+
+    def structure_deaths(self, player_index=0):
+        """The player's destroyed or removed structures, as a list of ([x, y], unit type number)
+        """
+        deaths = []
+        for unit_type in range(STRUCTURE_TYPE_COUNT):
+            deaths.extend((location, unit_type) for location in self.locations(self.deaths[player_index][unit_type]))
+        return deaths
+
+
+class ActionPhaseRecorder:
+    """Accumulates the events of the action phase into ActionSummary tables.
+
+    AlgoCore feeds it every action frame, already parsed, and calls end_turn before each on_turn, so a
+    strategy reads the finished summaries in on_turn instead of walking the events of every frame.
+    Besides the last turn, it keeps the totals over the whole game and over a sliding window of turns,
+    updated by adding the finished turn and subtracting the one that left the window.
+
+    Attributes :
+        * window (int): The number of turns in the sliding window
+        * current (ActionSummary): The action phase in progress
+        * last_turn (ActionSummary): The last finished action phase
+        * recent (ActionSummary): The totals over the last window finished action phases
+        * game (ActionSummary): The totals over every finished action phase of the game
+
+    """
+    def __init__(self, window=5):
+        self.window = window
+        self.reset()
+
+    def reset(self):
+        """Clears every summary, for a new game
+        """
+        self.current = ActionSummary()
+        self.last_turn = ActionSummary()
+        self.recent = ActionSummary()
+        self.game = ActionSummary()
+        self._turns = deque()
+
+    def record(self, frame):
+        """Adds the events of one action frame
+
+        Args:
+            frame: The parsed JSON of the frame
+
+        """
+        summary = self.current
+        summary.frames += 1
+        touched = summary.touched
+        events = frame.get("events", {})
+        for attack in events.get("attack", ()):
+            # Only structures are credited, by where they stand
+            if attack[3] < STRUCTURE_TYPE_COUNT:
+                x, y = attack[0]
+                cell = y * ARENA_SIZE + x
+                summary.damage_dealt[_player(attack[6])][cell] += attack[2]
+                touched.add(cell)
+        for damage in events.get("damage", ()):
+            x, y = damage[0]
+            cell = y * ARENA_SIZE + x
+            summary.damage_taken[_player(damage[4])][cell] += damage[1]
+            touched.add(cell)
+        for shield in events.get("shield", ()):
+            x, y = shield[0]
+            cell = y * ARENA_SIZE + x
+            summary.shield_given[_player(shield[6])][cell] += shield[2]
+            touched.add(cell)
+        for breach in events.get("breach", ()):
+            x, y = breach[0]
+            cell = y * ARENA_SIZE + x
+            summary.breaches[_player(breach[4])][cell] += 1
+            touched.add(cell)
+        for death in events.get("death", ()):
+            if death[1] < UNIT_TYPE_COUNT:
+                x, y = death[0]
+                cell = y * ARENA_SIZE + x
+                summary.deaths[_player(death[3])][death[1]][cell] += 1
+                touched.add(cell)
+
+    def end_turn(self):
+        """Finishes the action phase in progress and updates the rollups. If no frame was recorded, only last_turn is cleared.
+
+        Returns:
+            The finished ActionSummary, or None
+
+        """
+        if not self.current.frames:
+            self.last_turn = ActionSummary()
+            return None
+        finished, self.current = self.current, ActionSummary()
+        finished.turns = 1
+        self.last_turn = finished
+        self.game.add(finished)
+        self.recent.add(finished)
+        self._turns.append(finished)
+        if len(self._turns) > self.window:
+            self.recent.add(self._turns.popleft(), -1)
+        return finished
@@ -1,7 +1,13 @@
 import json
 
 from .game_state import GameState
-from .util import get_command, debug_write, BANNER_TEXT, send_command
+from .cache import QueryCache
+from .delta import BoardSnapshots
+from .action_phase import ActionPhaseRecorder
+from .importance import StructureImportance
+from .history import OpponentHistory
+from .forecast import AttackPredictor
+from .util import get_command, read_command, bind_streams, debug_write, logger, BANNER_TEXT
 
 class AlgoCore(object):
     """
@@ -10,10 +16,35 @@ class AlgoCore(object):
 
     Attributes :
         * config (JSON): json object containing information about the game
+        * query_cache (:obj: QueryCache): Path and attacker results that survive between turns. 
+          Pass it to GameState so turns with an unchanged board reuse earlier results.
+        * board_snapshots (:obj: BoardSnapshots): The structures of the last two turns. 
+          Pass it to GameState so GameState.board_delta can compare each turn with the one before.
+        * worker_pool (:obj: WorkerPool): Worker processes for parallel evaluations, None until start_worker_pool is called.
+          Each turn's game state is published to it before on_turn.
+        * watchdog (:obj: Watchdog): Submits the best turn offered so far, or a default turn, if on_turn nears the config's soft time limit.
+          Created from the config before on_game_start, which can adjust it or set it to None to turn it off.
+        * precompute (:obj: PrecomputeCache): Tables that depend only on the config, mapped from a file in the algo folder before on_game_start.
+        * action_recorder (:obj: ActionPhaseRecorder): Per cell totals of the action phase events, fed every frame. 
+          Read its last_turn, recent and game summaries in on_turn instead of walking the events in on_action_frame.
+        * structure_importance (:obj: StructureImportance): Your structures ranked by damage dealt, damage taken and health fraction, 
+          updated from every action frame and from each turn's state before on_turn.
+        * enemy_history (:obj: OpponentHistory): The enemy's health, resources, builds, spawns and damage of the last turns, 
+          in fixed size ring buffers filled from every turn state and action frame.
+        * attack_predictor (:obj: AttackPredictor): The probability and unit mix of an enemy attack, from their MP and enemy_history.
 
     """
     def __init__(self):
         self.config = None
+        self.query_cache = QueryCache()
+        self.board_snapshots = BoardSnapshots()
+        self.worker_pool = None
+        self.watchdog = None
+        self.precompute = None
+        self.action_recorder = ActionPhaseRecorder()
+        self.structure_importance = StructureImportance()
+        self.enemy_history = OpponentHistory()
+        self.attack_predictor = AttackPredictor(self.enemy_history)
 
     def on_game_start(self, config):
         """
@@ -23,6 +54,22 @@ class AlgoCore(object):
         """
         self.config = config
 
+    def start_worker_pool(self, processes=None):
+        """
+        Starts a pool of worker processes that evaluate tasks on the current turn's game state in parallel, 
+        see WorkerPool. Call it from on_game_start, after the config is loaded, so the workers are forked with it. 
+        Falls back to running tasks in this process where forking is not available.
+        """
+        if self.worker_pool is not None and self.worker_pool.config != self.config:
+            # A game with another config, while serving several games
+            self.worker_pool.close()
+            self.worker_pool = None
+        if self.worker_pool is None:
+            # Imported here so algos without workers never load multiprocessing
+            from .workers import WorkerPool
+            self.worker_pool = WorkerPool(self.config, processes)
+        return self.worker_pool
+
     def on_turn(self, game_state):
         """
         This step function is called at the start of each turn.
@@ -31,8 +78,8 @@ class AlgoCore(object):
         algo_strategy.py inherits from AlgoCore and overrides this on turn function. 
         Adjusting the on_turn function in algo_strategy is the main way to adjust your algo's logic. 
         """
-        send_command("[]")
-        send_command("[]")
+        from .watchdog import submit_turn
+        submit_turn([], [])
     
     def on_action_frame(self, action_frame_game_state):
         """
@@ -44,6 +91,22 @@ class AlgoCore(object):
         pass
 
 
+    def reset(self):
+        """
+        Clears the state kept from the previous game. Called when a new config arrives, before on_game_start, 
+        so an algo serving several games in a row starts each one fresh. \n
+        Strategies that keep game state outside on_game_start can extend it.
+        """
+        self.query_cache.clear()
+        self.board_snapshots.reset()
+        self.action_recorder.reset()
+        self.structure_importance.reset()
+        self.enemy_history.reset()
+        self.attack_predictor.reset()
+        logger.end_turn()
+        if self.watchdog is not None:
+            self.watchdog.end_turn()
+
     def start(self):
         """ 
         Start the parsing loop.
@@ -52,16 +115,99 @@ class AlgoCore(object):
         The algo continues this loop until it receives the "End" turn message from the game.
         """
         debug_write(BANNER_TEXT)
+        self._play(serving=False)
 
+    def serve(self, socket_path=None):
+        """
+        Plays many games in one long lived process, so interpreter startup, imports and precomputation are paid once. \n
+        Without a socket_path, games are read back to back from stdin: every config line starts a new game and 
+        the algo keeps reading after the end state until stdin is closed. \n
+        With a socket_path, the algo listens on a Unix socket and plays the games sent over each connection. 
+        Where os.fork is available, every connection is played by a child forked from this warm process, 
+        so both sides of a self-play match can connect at once; otherwise connections are served one at a time.
+        See run.sh for the shim that connects a match to a running server.
+        """
+        debug_write(BANNER_TEXT)
+        if socket_path is None:
+            self._play(serving=True)
+            return
+        import os
+        import socket
+        if os.path.exists(socket_path):
+            os.unlink(socket_path)
+        server = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        server.bind(socket_path)
+        server.listen()
+        can_fork = hasattr(os, "fork")
+        debug_write("Serving games on {}".format(socket_path))
+        try:
+            while True:
+                connection, _ = server.accept()
+                if can_fork:
+                    # Reap the children of finished connections
+                    try:
+                        while os.waitpid(-1, os.WNOHANG)[0]:
+                            pass
+                    except ChildProcessError:
+                        pass
+                    # Written now so the child does not inherit and repeat buffered lines
+                    logger.flush()
+                    if os.fork():
+                        connection.close()
+                        continue
+                    server.close()
+                    # os._exit skips the atexit hooks, so the connection closes the worker pool and flushes the logger itself
+                    self._play_connection(connection)
+                    os._exit(0)
+                self._play_connection(connection)
+        finally:
+            server.close()
+            if os.path.exists(socket_path):
+                os.unlink(socket_path)
+
+    def _play_connection(self, connection):
+        """Plays the games sent over one socket connection, then closes the worker pool and flushes the logger
+        """
+        reader = connection.makefile("r", encoding="utf-8")
+        writer = connection.makefile("w", encoding="utf-8")
+        bind_streams(reader, writer)
+        try:
+            self._play(serving=True)
+        except OSError as error:
+            debug_write("Connection lost: {}".format(error))
+        finally:
+            bind_streams()
+            for stream in (reader, writer, connection):
+                try:
+                    stream.close()
+                except OSError:
+                    pass
+            if self.worker_pool is not None:
+                self.worker_pool.close()
+                self.worker_pool = None
+            logger.flush()
+
+    def _play(self, serving):
+        """Handles messages until the end state, or until the input is closed when serving several games
+        """
         while True:
             # Note: Python blocks and hangs on stdin. Can cause issues if connections aren't setup properly and may need to
             # manually kill this Python program.
-            game_state_string = get_command()
+            game_state_string = read_command() if serving else get_command()
+            if serving and game_state_string == "":
+                break
             if "replaySave" in game_state_string:
                 """
                 This means this must be the config file. So, load in the config file as a json and add it to your AlgoStrategy class.
                 """
                 parsed_config = json.loads(game_state_string)
+                self.reset()
+                # Loaded with the first config rather than with gamelib, like the other modules only a running game needs
+                from .watchdog import Watchdog
+                from .precompute import load_precompute, config_key
+                self.watchdog = Watchdog.from_config(parsed_config)
+                if self.precompute is None or self.precompute.key != config_key(parsed_config):
+                    self.precompute = load_precompute(parsed_config)
                 self.on_game_start(parsed_config)
             elif "turnInfo" in game_state_string:
                 state = json.loads(game_state_string)
@@ -71,18 +217,39 @@ class AlgoCore(object):
                     This is the game turn game state message. Algo must now print to stdout 2 lines, one for build phase one for
                     deploy phase. Printing is handled by the provided functions.
                     """
+                    # The previous turn's action phase is over
+                    self.action_recorder.end_turn()
+                    self.structure_importance.update_health(state, self.config)
+                    self.enemy_history.begin_turn(state)
+                    logger.end_turn()
+                    if self.worker_pool is not None:
+                        self.worker_pool.set_snapshot(game_state_string)
+                    if self.watchdog is not None:
+                        self.watchdog.begin_turn()
                     self.on_turn(game_state_string)
+                    if self.watchdog is not None:
+                        self.watchdog.end_turn()
+                    logger.flush()
                 elif stateType == 1:
                     """
                     If stateType == 1, this game_state_string string represents a single frame of an action phase
                     """
+                    self.action_recorder.record(state)
+                    self.structure_importance.record(state)
+                    self.enemy_history.record(state)
                     self.on_action_frame(game_state_string)
                 elif stateType == 2:
                     """
                     This is the end game message. This means the game is over so break and finish the program.
+                    When serving, the worker pool is kept for the next game. A socket connection closes it when it ends.
                     """
                     debug_write("Got end state, game over. Stopping algo.")
-                    break
+                    logger.debug("{}", self.query_cache)
+                    if self.worker_pool is not None and not serving:
+                        self.worker_pool.close()
+                    logger.end_turn()
+                    if not serving:
+                        break
                 else:
                     """
                     Something is wrong? Received an incorrect or improperly formatted string.
@@ -0,0 +1,87 @@
+from collections import OrderedDict
+
+
+class QueryCache:
+    """A size bounded cache for results that only depend on the board, such as paths and attacker lists.
+
+    Keys are built from GameMap.structure_hash and GameMap.mobile_hash plus the arguments of the query,
+    so a result computed on one turn is reused on any later turn with the same board.
+    When the cache is full, the least recently used entry is evicted.
+
+    AlgoCore owns one QueryCache for the whole game, and GameState uses it when one is passed in.
+
+    Attributes :
+        * maxsize (int): The maximum number of entries kept
+        * hits (int): The number of lookups that found an entry
+        * misses (int): The number of lookups that did not find an entry
+
+    """
+    def __init__(self, maxsize=4096):
+        self.maxsize = maxsize
+        self.hits = 0
+        self.misses = 0
+        self.__entries = OrderedDict()
+
+    def __len__(self):
+        return len(self.__entries)
+
+    def __contains__(self, key):
+        return key in self.__entries
+
+    def get(self, key, default=None):
+        """Gets the entry for a key and marks it as recently used
+
+        Args:
+            key: A hashable key
+            default: The value returned if there is no entry for the key
+
+        Returns:
+            The cached value, or default if the key is not cached
+
+        """
+        entries = self.__entries
+        if key in entries:
+            entries.move_to_end(key)
+            self.hits += 1
+            return entries[key]
+        self.misses += 1
+        return default
+
+    def put(self, key, value):
+        """Stores a value, evicting the least recently used entry if the cache is full
+
+        Args:
+            key: A hashable key
+            value: The value to store. Cached values are shared, so they should not be modified afterwards.
+
+        """
+        entries = self.__entries
+        entries[key] = value
+        entries.move_to_end(key)
+        while len(entries) > self.maxsize:
+            entries.popitem(last=False)
+
+    def clear(self):
+        """Removes every entry and resets the hit and miss counts
+        """
+        self.__entries.clear()
+        self.hits = 0
+        self.misses = 0
+
+    def stats(self):
+        """Gets the cache statistics
+
+        Returns:
+            A dict with the number of hits, misses and entries, and the hit rate
+
+        """
+        lookups = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "size": len(self.__entries),
+            "hit_rate": self.hits / lookups if lookups else 0.0}
+
+    def __str__(self):
+        stats = self.stats()
+        return "QueryCache: {} hits, {} misses, {} entries, {:.0%} hit rate".format(stats["hits"], stats["misses"], stats["size"], stats["hit_rate"])
@@ -0,0 +1,209 @@
+from .game_map import ARENA_SIZE, CELL_COUNT, ARENA_CELLS, NEIGHBORS, cell_index, cell_location
+from .navigation import get_path_regions
+
+# Capacity of the edges that can never be part of a cut
+_UNCUT = CELL_COUNT
+
+
+class ChokepointAnalysis:
+    """The chokepoints of one player's routes from their spawn edges to their target edges.
+
+    For each spawn edge, every open cell of the edge is a source and every open cell of the
+    opposite edge is a sink. Only cells on the defending player's half of the board are
+    reported, since those are the cells the defender can build on.
+
+    Attributes :
+        * player_index (int): The player whose routes were analyzed, 0 for you 1 for the enemy
+        * cut_cells (dict): Maps each spawn edge to the sorted (x, y) cells that would seal it with a single structure
+        * min_cuts (dict): Maps each spawn edge to a smallest set of (x, y) cells that seals it, sorted. Empty if it is already sealed.
+        * sealed (dict): Maps each spawn edge to True if no unit spawned on it can reach its target edge
+
+    """
+    def __init__(self, player_index):
+        self.player_index = player_index
+        self.cut_cells = {}
+        self.min_cuts = {}
+        self.sealed = {}
+
+    def is_cut_cell(self, location):
+        """True if a single structure at the location would seal one of the routes
+        """
+        location = tuple(location)
+        return any(location in cells for cells in self.cut_cells.values())
+
+    def all_cut_cells(self):
+        """The cut cells of every route, as a set of (x, y)
+        """
+        return set(location for cells in self.cut_cells.values() for location in cells)
+
+    def all_min_cut_cells(self):
+        """The cells of every route's minimum cut, as a set of (x, y)
+        """
+        return set(location for cells in self.min_cuts.values() for location in cells)
+
+
+def analyze_chokepoints(game_state, player_index=1):
+    """Finds the cut cells and minimum vertex cuts of a player's routes across the board.
+    Both run in time linear in the number of cells for each route: cut cells are articulation points
+    found with an iterative Tarjan search, and the minimum cut comes from a unit capacity max flow
+    with every cell split in two, which needs at most one augmenting path per cell of the smallest cut.
+
+    Args:
+        * game_state: The GameState to analyze
+        * player_index: The player whose routes are analyzed, 0 for you 1 for the enemy
+
+    Returns:
+        A ChokepointAnalysis
+
+    """
+    game_map = game_state.game_map
+    key = ("chokepoints", game_map.structure_hash, player_index)
+    analysis = game_state.query_cache.get(key)
+    if analysis is not None:
+        return analysis
+
+    blocked = get_path_regions(game_state).blocked
+    open_cells = bytearray(CELL_COUNT)
+    for cell in ARENA_CELLS:
+        open_cells[cell] = not blocked[cell]
+    # The defender builds on the half the routes end in
+    if player_index == 1:
+        buildable = range(0, ARENA_SIZE // 2)
+        spawn_edges = [game_map.TOP_LEFT, game_map.TOP_RIGHT]
+    else:
+        buildable = range(ARENA_SIZE // 2, ARENA_SIZE)
+        spawn_edges = [game_map.BOTTOM_LEFT, game_map.BOTTOM_RIGHT]
+    cuttable = bytearray(CELL_COUNT)
+    for cell in ARENA_CELLS:
+        cuttable[cell] = open_cells[cell] and cell // ARENA_SIZE in buildable
+
+    analysis = ChokepointAnalysis(player_index)
+    for spawn_edge in spawn_edges:
+        edge_locations = game_map.get_edge_locations(spawn_edge)
+        target_locations = game_map.get_edge_locations(game_state.get_target_edge(edge_locations[0]))
+        sources = [cell_index(location) for location in edge_locations if open_cells[cell_index(location)]]
+        sinks = [cell_index(location) for location in target_locations if open_cells[cell_index(location)]]
+        cut = _min_vertex_cut(open_cells, cuttable, sources, sinks)
+        analysis.sealed[spawn_edge] = cut is None
+        analysis.cut_cells[spawn_edge] = sorted(tuple(cell_location(cell)) for cell in _cut_cells(open_cells, sources, sinks) if cuttable[cell])
+        analysis.min_cuts[spawn_edge] = sorted(tuple(cell_location(cell)) for cell in cut or [])
+
+    game_state.query_cache.put(key, analysis)
+    return analysis
+
+
+def _adjacency(open_cells, sources, sinks):
+    """The neighbors of every open cell, plus a source node and a sink node joined to the source and sink cells
+    """
+    source, sink = CELL_COUNT, CELL_COUNT + 1
+    adjacency = [[] for _ in range(CELL_COUNT + 2)]
+    for cell in ARENA_CELLS:
+        if open_cells[cell]:
+            adjacency[cell] = [neighbor for neighbor in NEIGHBORS[cell] if open_cells[neighbor]]
+    for cell in sources:
+        adjacency[source].append(cell)
+        adjacency[cell].append(source)
+    for cell in sinks:
+        adjacency[sink].append(cell)
+        adjacency[cell].append(sink)
+    return adjacency, source, sink
+
+
+def _cut_cells(open_cells, sources, sinks):
+    """Gets the cells whose removal separates every source from every sink.
+
+    These are the articulation points of the open cells that have the sink node below them in
+    a depth first search from the source node, found with an iterative version of Tarjan's algorithm.
+    """
+    adjacency, source, sink = _adjacency(open_cells, sources, sinks)
+    discovered = [0] * (CELL_COUNT + 2)
+    low = [0] * (CELL_COUNT + 2)
+    holds_sink = bytearray(CELL_COUNT + 2)
+    holds_sink[sink] = 1
+    discovered[source] = low[source] = 1
+    timer = 1
+    cuts = set()
+    stack = [(source, -1, iter(adjacency[source]))]
+    while stack:
+        node, parent, neighbors = stack[-1]
+        for neighbor in neighbors:
+            if not discovered[neighbor]:
+                timer += 1
+                discovered[neighbor] = low[neighbor] = timer
+                stack.append((neighbor, node, iter(adjacency[neighbor])))
+                break
+            if neighbor != parent and discovered[neighbor] < low[node]:
+                low[node] = discovered[neighbor]
+        else:
+            stack.pop()
+            if parent == -1:
+                continue
+            if low[node] < low[parent]:
+                low[parent] = low[node]
+            if holds_sink[node]:
+                holds_sink[parent] = 1
+                if low[node] >= discovered[parent] and parent < CELL_COUNT:
+                    cuts.add(parent)
+    return cuts
+
+
+def _min_vertex_cut(open_cells, cuttable, sources, sinks):
+    """Gets a smallest set of cuttable cells separating the sources from the sinks.
+
+    Every cell becomes an in node and an out node joined by an edge of capacity 1, or a
+    capacity that cannot be cut if the cell is not cuttable. Returns None if no source reaches a sink,
+    and an empty list if they cannot be separated.
+    """
+    source, sink = 2 * CELL_COUNT, 2 * CELL_COUNT + 1
+    heads, capacities, edges = [], [], [[] for _ in range(2 * CELL_COUNT + 2)]
+
+    def add_edge(start, end, capacity):
+        edges[start].append(len(heads))
+        heads.append(end)
+        capacities.append(capacity)
+        edges[end].append(len(heads))
+        heads.append(start)
+        capacities.append(0)
+
+    for cell in ARENA_CELLS:
+        if not open_cells[cell]:
+            continue
+        add_edge(2 * cell, 2 * cell + 1, 1 if cuttable[cell] else _UNCUT)
+        for neighbor in NEIGHBORS[cell]:
+            if open_cells[neighbor]:
+                add_edge(2 * cell + 1, 2 * neighbor, _UNCUT)
+    for cell in sources:
+        add_edge(source, 2 * cell, _UNCUT)
+    for cell in sinks:
+        add_edge(2 * cell + 1, sink, _UNCUT)
+
+    flow = 0
+    while True:
+        # Breadth first search for an augmenting path in the residual graph
+        via = [-1] * (2 * CELL_COUNT + 2)
+        via[source] = -2
+        frontier = [source]
+        head = 0
+        while head < len(frontier) and via[sink] == -1:
+            node = frontier[head]
+            head += 1
+            for edge in edges[node]:
+                if capacities[edge] and via[heads[edge]] == -1:
+                    via[heads[edge]] = edge
+                    frontier.append(heads[edge])
+        if via[sink] == -1:
+            break
+        if flow >= _UNCUT:
+            return []
+        # Every path crosses a cell edge, so each augmenting path carries one unit
+        node = sink
+        while node != source:
+            edge = via[node]
+            capacities[edge] -= 1
+            capacities[edge ^ 1] += 1
+            node = heads[edge ^ 1]
+        flow += 1
+    if flow == 0:
+        return None
+    # The cut is every cell whose in node is reachable in the residual graph and whose out node is not
+    return [cell for cell in ARENA_CELLS if open_cells[cell] and via[2 * cell] != -1 and via[2 * cell + 1] == -1]
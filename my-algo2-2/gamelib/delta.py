@@ -0,0 +1,167 @@
+from .action_phase import STRUCTURE_TYPE_COUNT
+from .game_map import ARENA_SIZE
+
+# Raw unit list indices of the remove and upgrade markers
+_REMOVE_INDEX = 6
+_UPGRADE_INDEX = 7
+
+
+class BoardSnapshot:
+    """The structures of one turn, by row, read from the raw unit lists of the turn state.
+
+    Each row maps x to (unit type number, player_index, upgraded). The Zobrist hash of every row is taken
+    from GameMap.structure_row_hashes, so two snapshots only need their rows compared where the hashes differ.
+
+    Attributes :
+        * turn_number (int): The turn the snapshot was taken on
+        * row_hashes (tuple): The structure hash of each row y
+        * rows (list): For each row y, a dict mapping x to (unit type number, player_index, upgraded)
+        * removing (frozenset): The (x, y, player_index) of the structures marked for removal
+
+    """
+    def __init__(self, turn_number, row_hashes, rows, removing=frozenset()):
+        self.turn_number = turn_number
+        self.row_hashes = tuple(row_hashes)
+        self.rows = rows
+        self.removing = frozenset(removing)
+
+    @classmethod
+    def from_units(cls, turn_number, row_hashes, player_units):
+        """Builds a snapshot from the raw unit lists of a turn state
+
+        Args:
+            * turn_number: The turn number of the state
+            * row_hashes: GameMap.structure_row_hashes once the state is parsed
+            * player_units: The p1Units and p2Units lists of the state, in player_index order
+
+        """
+        rows = [{} for _ in range(ARENA_SIZE)]
+        removing = set()
+        for player_index, units in enumerate(player_units):
+            upgraded = set((int(x), int(y)) for x, y, *_ in units[_UPGRADE_INDEX]) if len(units) > _UPGRADE_INDEX else ()
+            for unit_type in range(STRUCTURE_TYPE_COUNT):
+                for x, y, *_ in units[unit_type]:
+                    x, y = int(x), int(y)
+                    rows[y][x] = (unit_type, player_index, (x, y) in upgraded)
+            if len(units) > _REMOVE_INDEX:
+                removing.update((int(x), int(y), player_index) for x, y, *_ in units[_REMOVE_INDEX])
+        return cls(turn_number, row_hashes, rows, removing)
+
+    def structure_at(self, location):
+        """The (unit type number, player_index, upgraded) of the structure at a location, or None
+        """
+        x, y = location
+        return self.rows[y].get(x)
+
+
+class BoardSnapshots:
+    """The snapshots of the latest turn and the turn before it, kept between turns outside the query cache so they are never evicted.
+
+    AlgoCore owns one for the whole game and passes it to GameState, which adds each turn's snapshot.
+
+    Attributes :
+        * previous (:obj: BoardSnapshot): The snapshot of the turn before the latest one, or None
+        * latest (:obj: BoardSnapshot): The snapshot of the latest turn, or None
+
+    """
+    def __init__(self):
+        self.reset()
+
+    def reset(self):
+        """Forgets both snapshots, for a new game
+        """
+        self.previous = None
+        self.latest = None
+
+    def remember(self, snapshot):
+        """Adds the snapshot of a turn. A state parsed twice for the same turn does not shift the previous snapshot out.
+
+        Returns:
+            The snapshot of the turn before the snapshot's turn, or None if it is not known
+
+        """
+        latest = self.latest
+        if latest is not None and latest.turn_number < snapshot.turn_number:
+            self.previous = latest
+        elif latest is None or latest.turn_number > snapshot.turn_number:
+            self.previous = None
+        self.latest = snapshot
+        return self.previous
+
+
+class BoardDelta:
+    """The structures added, removed and upgraded between two turns.
+
+    Only the rows whose hashes differ between the two snapshots are compared, so the cost grows with the
+    number of changed rows rather than the number of structures. Entries are (x, y, unit type number, player_index),
+    with unit type numbers as in config["unitInformation"] (0 wall, 1 support, 2 turret).
+
+    Attributes :
+        * turn_number (int): The later turn
+        * previous_turn (int): The earlier turn
+        * added (list): Structures standing on the later turn but not the earlier one
+        * removed (list): Structures standing on the earlier turn but not the later one, destroyed or removed
+        * upgraded (list): Structures upgraded between the two turns
+        * removing (list): Structures newly marked for removal on the later turn
+        * changed_rows (list): The rows y whose structures changed
+        * changed_cells (set): The (x, y) of every cell whose structure changed
+
+    """
+    def __init__(self, previous, latest):
+        """Compares two snapshots
+
+        Args:
+            * previous (:obj: BoardSnapshot): The earlier turn
+            * latest (:obj: BoardSnapshot): The later turn
+
+        """
+        self.turn_number = latest.turn_number
+        self.previous_turn = previous.turn_number
+        self.added = []
+        self.removed = []
+        self.upgraded = []
+        self.changed_rows = [y for y in range(ARENA_SIZE) if previous.row_hashes[y] != latest.row_hashes[y]]
+        self.changed_cells = set()
+        for y in self.changed_rows:
+            before, after = previous.rows[y], latest.rows[y]
+            for x, (unit_type, player_index, upgraded) in after.items():
+                old = before.get(x)
+                if old == (unit_type, player_index, upgraded):
+                    continue
+                self.changed_cells.add((x, y))
+                if old is None:
+                    self.added.append((x, y, unit_type, player_index))
+                    continue
+                if old[:2] != (unit_type, player_index):
+                    # Destroyed and rebuilt as something else within the turn
+                    self.removed.append((x, y) + old[:2])
+                    self.added.append((x, y, unit_type, player_index))
+                if upgraded and not old[2]:
+                    self.upgraded.append((x, y, unit_type, player_index))
+            for x, old in before.items():
+                if x not in after:
+                    self.changed_cells.add((x, y))
+                    self.removed.append((x, y) + old[:2])
+        self.removing = []
+        for x, y, player_index in latest.removing - previous.removing:
+            structure = latest.structure_at((x, y))
+            if structure is not None:
+                self.removing.append((x, y, structure[0], player_index))
+
+    def __bool__(self):
+        return not self.is_empty()
+
+    def __repr__(self):
+        return "BoardDelta(turn {} to {}: {} added, {} removed, {} upgraded, {} removing)".format(
+            self.previous_turn, self.turn_number, len(self.added), len(self.removed), len(self.upgraded), len(self.removing))
+
+    def is_empty(self):
+        """True if no structure changed between the two turns
+        """
+        return not (self.added or self.removed or self.upgraded or self.removing)
+
+    def for_player(self, player_index):
+        """The added, removed, upgraded and removing lists restricted to one player's structures, as a dict
+        """
+        return {name: [entry for entry in getattr(self, name) if entry[3] == player_index]
+                for name in ("added", "removed", "upgraded", "removing")}
@@ -0,0 +1,128 @@
+import math
+
+from .action_phase import STRUCTURE_TYPE_COUNT, UNIT_TYPE_COUNT
+from .income import income_table
+
+_MOBILE_TYPES = range(STRUCTURE_TYPE_COUNT, UNIT_TYPE_COUNT)
+
+
+class AttackForecast:
+    """The predicted attack of a player on one turn.
+
+    Attributes :
+        * turn_number (int): The turn predicted
+        * MP (float): The MP the player is expected to hold on that turn
+        * probability (float): The probability the player spawns mobile units on that turn
+        * mix (dict): The expected fraction of the spawned units of each mobile unit type number
+        * units (dict): The expected number of units of each mobile unit type number if the player attacks with all their MP
+
+    """
+    def __init__(self, turn_number, MP, probability, mix, units):
+        self.turn_number = turn_number
+        self.MP = MP
+        self.probability = probability
+        self.mix = mix
+        self.units = units
+
+    def __repr__(self):
+        return "AttackForecast(turn {}: {:.0%} at {} MP, mix {})".format(self.turn_number, self.probability, self.MP, self.mix)
+
+
+class AttackPredictor:
+    """Predicts when a player attacks, and with which units, from their MP and an OpponentHistory.
+
+    Players usually bank MP until they reach an amount they are willing to attack with. Every finished turn
+    in the window is evidence about that amount: a turn they attacked with m MP says it is at most m, a turn
+    they held m MP says it is above m. The probability of attacking with MP is the share of the evidence
+    saying the amount is at most MP, with prior_weight turns of prior evidence that the player attacks
+    once they hold prior_MP. The unit mix is the share of each mobile unit type spawned in the window.
+    Each prediction costs one pass over the window, and the evidence is gathered once per turn.
+
+    Attributes :
+        * history (:obj: OpponentHistory): The spawns and MP of the player's finished turns
+        * window (int): The number of finished turns looked at
+        * prior_MP (float): The MP the player is assumed to attack with before anything is known
+        * prior_weight (float): The number of turns of evidence the prior counts as
+
+    """
+    def __init__(self, history, window=20, prior_MP=10, prior_weight=1.0):
+        self.history = history
+        self.window = window
+        self.prior_MP = prior_MP
+        self.prior_weight = prior_weight
+        self._evidence_turn = None
+        self._attacks = []
+        self._holds = []
+        self._mix = {}
+
+    def reset(self):
+        """Forgets the evidence gathered, for a new game
+        """
+        self._evidence_turn = None
+
+    def _gather(self):
+        """Collects the MP of the attack and hold turns and the unit mix, once per turn of the history
+        """
+        turn = self.history.turns.appended
+        if turn == self._evidence_turn:
+            return
+        self._evidence_turn = turn
+        history = self.history
+        MPs = history.values("MP", self.window)
+        spawned = history.values("spawned", self.window)
+        self._attacks = sorted(MP for MP, count in zip(MPs, spawned) if count)
+        self._holds = sorted(MP for MP, count in zip(MPs, spawned) if not count)
+        totals = {unit_type: history.total("spawned:{}".format(unit_type), self.window) for unit_type in _MOBILE_TYPES}
+        total = sum(totals.values())
+        if total:
+            self._mix = {unit_type: count / total for unit_type, count in totals.items() if count}
+        else:
+            self._mix = {unit_type: 1 / len(_MOBILE_TYPES) for unit_type in _MOBILE_TYPES}
+
+    def probability(self, MP):
+        """The probability the player attacks on a turn they hold MP on
+        """
+        self._gather()
+        if MP < 1:
+            return 0.0
+        attacks_below = sum(1 for attack_MP in self._attacks if attack_MP <= MP)
+        holds_above = sum(1 for hold_MP in self._holds if hold_MP >= MP)
+        prior = self.prior_weight if MP >= self.prior_MP else 0.0
+        return (attacks_below + prior) / (attacks_below + holds_above + self.prior_weight)
+
+    def mix(self):
+        """The expected fraction of the spawned units of each mobile unit type number
+        """
+        self._gather()
+        return dict(self._mix)
+
+    def forecast(self, game_state, turns=1):
+        """Forecasts the player's attack on this turn and the next ones, assuming they hold their MP until they attack.
+
+        Args:
+            * game_state: The GameState of the turn
+            * turns: The number of turns forecast, starting with this one
+
+        Returns:
+            A list of AttackForecast, one per turn. Their probability is that of the first attack happening on that turn.
+
+        """
+        income = income_table(game_state.config)
+        unit_information = game_state.config["unitInformation"]
+        mix = self.mix()
+        player_index = self.history.player_index
+        MP = game_state.get_resource(game_state.MP, player_index)
+        not_yet = 1.0
+        forecasts = []
+        for ahead in range(turns):
+            turn = game_state.turn_number + ahead
+            if ahead:
+                MP = income.project_MP(MP, turn - 1)
+            chance = self.probability(MP)
+            units = {}
+            for unit_type, share in mix.items():
+                cost = unit_information[unit_type].get("cost2", 0)
+                units[unit_type] = math.floor(MP * share / cost) if cost else 0
+            forecasts.append(AttackForecast(turn, MP, not_yet * chance, mix, units))
+            not_yet *= 1 - chance
+        return forecasts
@@ -1,7 +1,89 @@
 import math
+import random
 from .unit import GameUnit
 from .util import debug_write
 
+ARENA_SIZE = 28
+CELL_COUNT = ARENA_SIZE * ARENA_SIZE
+# Locations are encoded internally as integer cell indices, index = y * ARENA_SIZE + x.
+# Bounds checks and neighbor expansion use the precomputed tables below instead of arithmetic.
+
+
+def _arena_locations(arena_size):
+    """Every location on the diamond shaped board, row by row from the bottom, left to right
+    """
+    half_arena = arena_size // 2
+    locations = []
+    for y in range(arena_size):
+        row_size = y + 1 if y < half_arena else arena_size - y
+        for x in range(half_arena - row_size, half_arena + row_size):
+            locations.append((x, y))
+    return tuple(locations)
+
+_ARENA_LOCATIONS = _arena_locations(ARENA_SIZE)
+_ARENA_LOCATION_SET = frozenset(_ARENA_LOCATIONS)
+
+def cell_index(location):
+    """Encodes a location as an integer cell index
+    """
+    return location[1] * ARENA_SIZE + location[0]
+
+def cell_location(index):
+    """Decodes an integer cell index into an [x, y] location
+    """
+    return [index % ARENA_SIZE, index // ARENA_SIZE]
+
+# IN_ARENA[index] is 1 if the cell is on the board
+IN_ARENA = bytes(1 if (index % ARENA_SIZE, index // ARENA_SIZE) in _ARENA_LOCATION_SET else 0 for index in range(CELL_COUNT))
+# The cell indices of every location on the board, in the same order as iterating over a GameMap
+ARENA_CELLS = tuple(cell_index(location) for location in _ARENA_LOCATIONS)
+
+def _neighbor_cells(index):
+    x, y = index % ARENA_SIZE, index // ARENA_SIZE
+    neighbors = []
+    # Same order as ShortestPathFinder._get_neighbors: up, down, right, left
+    for nx, ny in ((x, y + 1), (x, y - 1), (x + 1, y), (x - 1, y)):
+        if (nx, ny) in _ARENA_LOCATION_SET:
+            neighbors.append(ny * ARENA_SIZE + nx)
+    return tuple(neighbors)
+
+# NEIGHBORS[index] holds the cell indices of the on board neighbors of a cell, empty for cells off the board
+NEIGHBORS = tuple(_neighbor_cells(index) if IN_ARENA[index] else () for index in range(CELL_COUNT))
+
+_RANGE_OFFSETS = {}
+
+def range_offsets(radius, hit_radius):
+    """Gets the (dx, dy, distance) of every cell in range of a unit, in the same order as GameMap.get_locations_in_range.
+    A unit with a given range affects all locations whose centers are within that range + get hit radius.
+    Offsets are computed once per radius and shared.
+    """
+    key = (radius, hit_radius)
+    offsets = _RANGE_OFFSETS.get(key)
+    if offsets is None:
+        search_radius = math.ceil(radius)
+        offsets = []
+        for dx in range(-search_radius, search_radius + 1):
+            for dy in range(-search_radius, search_radius + 1):
+                distance = math.sqrt(dx**2 + dy**2)
+                if distance < radius + hit_radius:
+                    offsets.append((dx, dy, distance))
+        offsets = _RANGE_OFFSETS[key] = tuple(offsets)
+    return offsets
+
+_HASH_MASK = (1 << 64) - 1
+# Zobrist key tables already built, by the number of unit types they cover
+_ZOBRIST_TABLES = {}
+
+def _zobrist_keys(unit_types):
+    """One fixed random 64-bit key per (cell, unit type, owner, upgraded), for configs with unit_types unit types.
+    The seed is fixed so that hashes of the same board agree between processes and games.
+    """
+    keys = _ZOBRIST_TABLES.get(unit_types)
+    if keys is None:
+        zobrist_random = random.Random(0x7E5A1)
+        keys = _ZOBRIST_TABLES[unit_types] = [zobrist_random.getrandbits(64) for _ in range(CELL_COUNT * unit_types * 4)]
+    return keys
+
 class GameMap:
     """Holds data about the current game map and provides functions
     useful for getting information related to the map.
@@ -9,6 +91,9 @@ class GameMap:
     game_map[x, y] will return a list of Units located at that location, 
     or an empty list if there are no units at the location
 
+    Iterating over the game map yields every location on the board, and units_by 
+    finds units by owner, type and region without scanning the whole board.
+
     Attributes :
         * config (JSON): Contains information about the current game rules
         * enable_warnings (bool): If true, debug messages for game_map functions will print out
@@ -18,6 +103,13 @@ class GameMap:
         * TOP_LEFT (int): A constant that represents the top left edge
         * BOTTOM_LEFT (int): Hidden challenge! Can you guess what this constant represents???
         * BOTTOM_RIGHT (int): A constant that represents the bottom right edge
+        * structure_hash (int): A 64-bit Zobrist hash of the structures on the map, by location, type, owner and upgrade
+        * mobile_hash (int): A 64-bit Zobrist hash of the mobile units on the map, by location, type and owner
+        * structure_row_hashes (list): The Zobrist hash of the structures of each row y. They XOR to structure_hash.
+
+    Both hashes are kept up to date by add_unit, remove_unit, upgrade_unit and item assignment,
+    so two maps with the same hash hold the same units and the hashes can be used as cache keys.
+    Editing the unit lists returned by game_map[x, y] directly bypasses the hashes.
 
     """
     def __init__(self, config):
@@ -36,36 +128,48 @@ class GameMap:
         self.BOTTOM_LEFT = 2
         self.BOTTOM_RIGHT = 3
         self.__map = self.__empty_grid()
-        self.__start = [13,0]
+        self.__unit_index = {}
+        self.__type_index = {unit_info.get("shorthand"): index for index, unit_info in enumerate(self.config["unitInformation"])}
+        self.__structure_types = [unit_info.get("shorthand") for unit_info in self.config["unitInformation"] if unit_info.get("unitCategory") == 0]
+        # Sized from the config, so every unit type it defines has its own block of keys
+        self.__zobrist_unit_types = len(self.config["unitInformation"])
+        self.__zobrist_keys = _zobrist_keys(self.__zobrist_unit_types)
+        self.structure_hash = 0
+        self.mobile_hash = 0
+        self.structure_row_hashes = [0] * self.ARENA_SIZE
     
     def __getitem__(self, location):
-        if len(location) == 2 and self.in_arena_bounds(location):
-            x,y = location
-            return self.__map[x][y]
+        if len(location) == 2:
+            x, y = location
+            if 0 <= x < ARENA_SIZE and 0 <= y < ARENA_SIZE:
+                # Coordinates may arrive as floats, such as 13.0, which cannot index the table
+                x, y = int(x), int(y)
+                if IN_ARENA[y * ARENA_SIZE + x]:
+                    return self.__map[x][y]
         self._invalid_coordinates(location)
 
     def __setitem__(self, location, val):
-        if type(location) == tuple and len(location) == 2 and self.in_arena_bounds(location):
-            self.__map[location[0]][location[1]] = val
+        if type(location) == tuple and len(location) == 2 and location in _ARENA_LOCATION_SET:
+            x, y = location
+            for unit in self.__map[x][y]:
+                self.__untrack_unit(unit, x, y)
+            self.__map[x][y] = val
+            for unit in val:
+                self.__track_unit(unit, x, y)
             return
         self._invalid_coordinates(location)
 
     def __iter__(self):
-        self.__start = [13,0]
-        return self
-    
-    def __next__(self):
-        location = self.__start
-        if location == [15,27]:
-            raise StopIteration
-        new_location = [location[0]+1, location[1]]
-        while not self.in_arena_bounds(new_location) and not location == [14,27]:
-            if new_location[0] == self.ARENA_SIZE:
-                new_location = [0, new_location[1]+1]
-            else:
-                new_location = [new_location[0]+1, new_location[1]]
-        self.__start = new_location
-        return location 
+        return ([x, y] for x, y in _ARENA_LOCATIONS)
+
+    def locations(self):
+        """Gets every location on the board, row by row from the bottom
+
+        Returns:
+            A tuple of (x, y) tuples. It is shared, so it is cheaper than iterating over the map, but it must not be modified.
+
+        """
+        return _ARENA_LOCATIONS
 
     def __empty_grid(self):
         grid = []
@@ -75,6 +179,53 @@ class GameMap:
                 grid[x].append([])
         return grid
 
+    def __zobrist_key(self, unit, x, y):
+        cell = y * ARENA_SIZE + x
+        owner = 1 if unit.player_index == 1 else 0
+        upgraded = 1 if unit.upgraded else 0
+        return self.__zobrist_keys[((cell * self.__zobrist_unit_types + self.__type_index[unit.unit_type]) * 2 + owner) * 2 + upgraded]
+
+    def __track_unit(self, unit, x, y):
+        """Adds a unit placed at x, y to the board hashes and the unit index
+        """
+        # Structures never share a location, so they are XORed in. Mobile units stack, so they are
+        # summed instead, otherwise two identical units on one location would cancel out.
+        if unit.stationary:
+            key = self.__zobrist_key(unit, x, y)
+            self.structure_hash ^= key
+            self.structure_row_hashes[y] ^= key
+        else:
+            self.mobile_hash = (self.mobile_hash + self.__zobrist_key(unit, x, y)) & _HASH_MASK
+        rows = self.__unit_index.get((unit.player_index, unit.unit_type))
+        if rows is None:
+            rows = self.__unit_index[unit.player_index, unit.unit_type] = [{} for _ in range(self.ARENA_SIZE)]
+        rows[y].setdefault(x, []).append(unit)
+
+    def __untrack_unit(self, unit, x, y):
+        """Removes a unit placed at x, y from the board hashes and the unit index
+        """
+        if unit.stationary:
+            key = self.__zobrist_key(unit, x, y)
+            self.structure_hash ^= key
+            self.structure_row_hashes[y] ^= key
+        else:
+            self.mobile_hash = (self.mobile_hash - self.__zobrist_key(unit, x, y)) & _HASH_MASK
+        row = self.__unit_index[unit.player_index, unit.unit_type][y]
+        units = row[x]
+        for index, indexed_unit in enumerate(units):
+            if indexed_unit is unit:
+                del units[index]
+                break
+        if not units:
+            del row[x]
+
+    def _place_unit(self, unit):
+        """Adds an existing GameUnit to the location given by its x and y, keeping the hashes up to date.
+        Used by GameState when parsing the units of a turn.
+        """
+        self.__map[unit.x][unit.y].append(unit)
+        self.__track_unit(unit, unit.x, unit.y)
+
     def _invalid_coordinates(self, location):
         self.warn("{} is out of bounds.".format(str(location)))
 
@@ -89,19 +240,7 @@ class GameMap:
         
         """
         x, y = location
-        half_board = self.HALF_ARENA
-
-        row_size = y + 1
-        startx = half_board - row_size
-        endx = startx + (2 * row_size) - 1
-        top_half_check = (y < self.HALF_ARENA and x >= startx and x <= endx)
-
-        row_size = (self.ARENA_SIZE - 1 - y) + 1
-        startx = half_board - row_size
-        endx = startx + (2 * row_size) - 1
-        bottom_half_check = (y >= self.HALF_ARENA and x >= startx and x <= endx)
-
-        return bottom_half_check or top_half_check
+        return 0 <= x < ARENA_SIZE and 0 <= y < ARENA_SIZE and IN_ARENA[int(y) * ARENA_SIZE + int(x)] == 1
 
     def get_edge_locations(self, quadrant_description):
         """Takes in an edge description and returns a list of locations.
@@ -171,7 +310,10 @@ class GameMap:
         if not new_unit.stationary:
             self.__map[x][y].append(new_unit)
         else:
+            for unit in self.__map[x][y]:
+                self.__untrack_unit(unit, x, y)
             self.__map[x][y] = [new_unit]
+        self.__track_unit(new_unit, x, y)
 
     def remove_unit(self, location):
         """Remove all units on the map in the given location.
@@ -186,8 +328,94 @@ class GameMap:
             self._invalid_coordinates(location)
         
         x, y = location
+        for unit in self.__map[x][y]:
+            self.__untrack_unit(unit, x, y)
         self.__map[x][y] = []
 
+    def upgrade_unit(self, location):
+        """Upgrade the structure in the given location.
+
+        Args:
+            location: The location of the structure to upgrade
+
+        Returns:
+            The upgraded GameUnit, or None if there is no structure at the location
+
+        Like add_unit, this function only changes the data stored in GameMap. Use GameState.attempt_upgrade to upgrade as part of your turn.
+        """
+        if not self.in_arena_bounds(location):
+            self._invalid_coordinates(location)
+            return
+
+        x, y = location
+        for unit in self.__map[x][y]:
+            if unit.stationary:
+                self.__untrack_unit(unit, x, y)
+                unit.upgrade()
+                self.__track_unit(unit, x, y)
+                return unit
+
+    def units_by(self, player_index=None, unit_type=None, rows=None, columns=None):
+        """Gets units by owner, type and region, using an index kept up to date as units are added and removed.
+        The cost grows with the number of units found and rows searched, not with the size of the board.
+
+        Args:
+            player_index: The owner of the units, 0 for you 1 for the enemy. None for both players.
+            unit_type: A unit type, a list of unit types, or None for every type
+            rows: The y coordinates to search, for example range(14, 17). None for every row.
+            columns: The x coordinates to search. None for every column.
+
+        Returns:
+            A list of the matching GameUnits
+
+        """
+        if isinstance(unit_type, str):
+            unit_type = [unit_type]
+        if rows is None:
+            rows = range(self.ARENA_SIZE)
+        if columns is not None and not isinstance(columns, (range, set, frozenset)):
+            columns = set(columns)
+
+        found = []
+        for (owner, indexed_type), indexed_rows in self.__unit_index.items():
+            if (player_index is not None and owner != player_index) or (unit_type is not None and indexed_type not in unit_type):
+                continue
+            for y in rows:
+                if not 0 <= y < self.ARENA_SIZE:
+                    continue
+                for x, units in indexed_rows[y].items():
+                    if columns is None or x in columns:
+                        found.extend(units)
+        return found
+
+    def count_units(self, player_index=None, unit_type=None, rows=None, columns=None):
+        """Counts units by owner, type and region. Takes the same arguments as units_by.
+
+        Returns:
+            The number of matching GameUnits
+
+        """
+        return len(self.units_by(player_index, unit_type, rows, columns))
+
+    def structure_locations(self, player_index=None):
+        """Gets the locations of every structure, using the unit index
+
+        Args:
+            player_index: The owner of the structures, 0 for you 1 for the enemy. None for both players.
+
+        Returns:
+            A list of (x, y) tuples
+
+        """
+        locations = []
+        for (owner, indexed_type), indexed_rows in self.__unit_index.items():
+            if indexed_type not in self.__structure_types or (player_index is not None and owner != player_index):
+                continue
+            for y, row in enumerate(indexed_rows):
+                for x in row:
+                    locations.append((x, y))
+        return locations
+
     def get_locations_in_range(self, location, radius):
         """Gets locations in a circular area around a location
 
@@ -2,10 +2,16 @@ import math
 import json
 import sys
 
-from .navigation import ShortestPathFinder
-from .util import send_command, debug_write
+from .navigation import ShortestPathFinder, SpawnPathPrediction
+from .util import debug_write
 from .unit import GameUnit
-from .game_map import GameMap
+from .game_map import GameMap, ARENA_SIZE, range_offsets
+from .cache import QueryCache
+from .delta import BoardSnapshot, BoardDelta, BoardSnapshots
+from .income import income_table
+# The analysis modules (wave, chokepoints, standoff, intercept, simulator) are imported by the methods that use them,
+# so an algo that never calls them does not pay for importing them, or NumPy, at startup. The watchdog, and its
+# threads, are imported on the first submitted turn.
 
 def is_stationary(unit_type):
     """
@@ -44,20 +50,28 @@ class GameState:
         * my_time (int): The time you took to submit your previous turn
         * enemy_health (int): Your opponents current remaining health
         * enemy_time (int): Your opponents current remaining time
+        * query_cache (:obj: QueryCache): Cache for path and attacker queries, keyed by the board hashes
+        * snapshot (:obj: BoardSnapshot): The structures of this turn, compared by board_delta
 
     """
 
-    def __init__(self, config, serialized_string):
+    def __init__(self, config, serialized_string, query_cache=None, board_snapshots=None):
         """ Setup a turns variables using arguments passed
 
         Args:
             * config (JSON): A json object containing information about the game
             * serialized_string (string): A string containing information about the game state at the start of this turn
+            * query_cache (:obj: QueryCache): A cache shared between turns, usually AlgoCore.query_cache. 
+              If None, results are only cached for this GameState.
+            * board_snapshots (:obj: BoardSnapshots): The snapshots of the last turns, usually AlgoCore.board_snapshots. 
+              This turn's snapshot is added to it, so board_delta can compare with the turn before. If None, only explicit comparisons are made.
 
         """
         self.serialized_string = serialized_string
         self.config = config
         self.enable_warnings = True
+        self.query_cache = query_cache if query_cache is not None else QueryCache(maxsize=1024)
+        self.board_snapshots = board_snapshots
 
         global WALL, SUPPORT, TURRET, SCOUT, DEMOLISHER, INTERCEPTOR, REMOVE, UPGRADE, STRUCTURE_TYPES, ALL_UNITS, UNIT_TYPE_TO_INDEX
         UNIT_TYPE_TO_INDEX = {}
@@ -126,6 +140,9 @@ class GameState:
         self.__create_parsed_units(p1units, 0)
         self.__create_parsed_units(p2units, 1)
 
+        self.snapshot = BoardSnapshot.from_units(self.turn_number, self.game_map.structure_row_hashes, [p1units, p2units])
+        self._previous_snapshot = self.board_snapshots.remember(self.snapshot) if self.board_snapshots is not None else None
+
     def __create_parsed_units(self, units, player_number):
         """
         Helper function for __parse_state to add units to the map.
@@ -144,10 +161,10 @@ class GameState:
                         self.game_map[x,y][0].pending_removal = True
                 elif unit_type == UPGRADE:
                     if self.contains_stationary_unit([x,y]):
-                        self.game_map[x,y][0].upgrade()
+                        self.game_map.upgrade_unit([x,y])
                 else:
                     unit = GameUnit(unit_type, self.config, player_number, hp, x, y)
-                    self.game_map[x,y].append(unit)
+                    self.game_map._place_unit(unit)
 
     def __resource_required(self, unit_type):
         return self.SP if is_stationary(unit_type) else self.MP
@@ -174,11 +191,21 @@ class GameState:
     def submit_turn(self):
         """Submit and end your turn.
             Must be called at the end of your turn or the algo will hang.
+            If AlgoCore's watchdog already submitted a fallback turn because the deadline passed, this turn is discarded.
+
+        Returns:
+            True if the turn was sent, False if it was discarded
+
         """
-        build_string = json.dumps(self._build_stack)
-        deploy_string = json.dumps(self._deploy_stack)
-        send_command(build_string)
-        send_command(deploy_string)
+        from .watchdog import submit_turn
+        return submit_turn(self._build_stack, self._deploy_stack)
+
+    def checkpoint(self):
+        """Offers the turn planned so far to AlgoCore's watchdog, to be submitted if the turn runs out of time.
+            Call it whenever the planned builds and deploys are worth keeping, before starting a slower search.
+        """
+        from .watchdog import offer_turn
+        offer_turn(self._build_stack, self._deploy_stack)
 
     def get_resource(self, resource_type, player_index = 0):
         """Gets a players resources
@@ -271,16 +298,7 @@ class GameState:
             self.warn("Invalid current MP ({}). Current MP cannot be negative.".format(current_MP))
 
         MP = self.get_resource(self.MP, player_index) if not current_MP else current_MP
-        for increment in range(1, turns_in_future + 1):
-            current_turn = self.turn_number + increment
-            MP *= (1 - self.config["resources"]["bitDecayPerRound"])
-            MP_per_round = self.config["resources"]["bitsPerRound"]
-            MP_ramp_ups = current_turn // self.config["resources"]["turnIntervalForBitSchedule"]
-            MP_per_round_growth = self.config["resources"]["bitGrowthRate"]
-            MP_gained = MP_per_round + (MP_per_round_growth * MP_ramp_ups)
-            MP += MP_gained
-            MP = round(MP, 1)
-        return MP
+        return income_table(self.config).project_MP(MP, self.turn_number, turns_in_future)
 
     def type_cost(self, unit_type, upgrade=False):
         """Gets the cost of a unit based on its type
@@ -445,7 +463,7 @@ class GameState:
                     if resources[SP] >= costs[SP] and resources[MP] >= costs[MP]:
                         self.__set_resource(SP, 0 - costs[SP])
                         self.__set_resource(MP, 0 - costs[MP])
-                        existing_unit.upgrade()
+                        self.game_map.upgrade_unit([x, y])
                         self._build_stack.append((UPGRADE, x, y))
                         spawned_units += 1
             else:
@@ -495,8 +513,216 @@ class GameState:
         if target_edge is None:
             target_edge = self.get_target_edge(start_location)
 
-        end_points = self.game_map.get_edge_locations(target_edge)
-        return self._shortest_path_finder.navigate_multiple_endpoints(start_location, end_points, self)
+        key = ("path", self.game_map.structure_hash, start_location[0], start_location[1], target_edge)
+        path = self.query_cache.get(key)
+        if path is None:
+            end_points = self.game_map.get_edge_locations(target_edge)
+            path = self._shortest_path_finder.navigate_multiple_endpoints(start_location, end_points, self)
+            self.query_cache.put(key, tuple(map(tuple, path)))
+            return path
+        return [list(location) for location in path]
+
+    def predict_spawn_paths(self, player_index=1):
+        """Gets the paths units would take from every spawn location of a player.
+        All spawn locations sharing a target edge are pathed together in one pass over the board,
+        and the result is remembered for each structure layout, so calling this again on a turn
+        where no structures changed costs nothing.
+
+        Args:
+            player_index: The player whose spawn locations are pathed, 0 for you 1 for the enemy
+
+        Returns:
+            A SpawnPathPrediction holding the path from each unblocked spawn location and
+            the number of those paths crossing each location
+
+        """
+        if not player_index == 0 and not player_index == 1:
+            self._invalid_player_index(player_index)
+            return
+
+        key = ("spawn_paths", self.game_map.structure_hash, player_index)
+        prediction = self.query_cache.get(key)
+        if prediction is not None:
+            return prediction
+
+        if player_index == 0:
+            spawn_edges = [self.game_map.BOTTOM_LEFT, self.game_map.BOTTOM_RIGHT]
+        else:
+            spawn_edges = [self.game_map.TOP_LEFT, self.game_map.TOP_RIGHT]
+        paths = {}
+        for spawn_edge in spawn_edges:
+            start_points = self.game_map.get_edge_locations(spawn_edge)
+            end_points = self.game_map.get_edge_locations(self.get_target_edge(start_points[0]))
+            edge_paths = self._shortest_path_finder.navigate_multiple_starts(start_points, end_points, self)
+            for start, path in zip(start_points, edge_paths):
+                if path is not None:
+                    paths[tuple(start)] = path
+
+        prediction = SpawnPathPrediction(player_index, paths)
+        self.query_cache.put(key, prediction)
+        return prediction
+
+    def predict_wave(self, wave=None, player_index=0, destroyed=None, max_frames=500):
+        """Predicts the paths, structure damage and breaches of a wave of mobile units.
+        Unlike find_path_to_edge, units re-path as the structures blocking them are destroyed 
+        during the action phase. See wave.predict_wave.
+
+        Args:
+            * wave: A list of (unit_type, [x, y], count) entries. If None, the mobile units you have 
+              deployed this turn are used.
+            * player_index: The player spawning the wave, 0 for you 1 for the enemy
+            * destroyed: An optional dict mapping locations (x, y) to the frame the structure there is destroyed by something else
+            * max_frames: The number of frames to simulate before giving up
+
+        Returns:
+            A WaveTimeline
+
+        """
+        if not player_index == 0 and not player_index == 1:
+            self._invalid_player_index(player_index)
+            return
+        if wave is None:
+            wave = self._deployed_stacks()
+        from .wave import predict_wave
+        return predict_wave(self, wave, player_index, destroyed, max_frames)
+
+    def predict_self_destructs(self, plan=None, player_index=0):
+        """Flags the stacks of a spawn plan whose path ends away from their target edge, 
+        and predicts when they self destruct and the damage dealt to nearby enemy structures.
+        See wave.predict_self_destructs.
+
+        Args:
+            * plan: A list of (unit_type, [x, y], count) entries. If None, the mobile units you have 
+              deployed this turn are used.
+            * player_index: The player spawning the units, 0 for you 1 for the enemy
+
+        Returns:
+            A list of SelfDestructPrediction, one per entry of the plan
+
+        """
+        if not player_index == 0 and not player_index == 1:
+            self._invalid_player_index(player_index)
+            return
+        if plan is None:
+            plan = self._deployed_stacks()
+        from .wave import predict_self_destructs
+        return predict_self_destructs(self, plan, player_index)
+
+    def plan_demolisher_standoffs(self, count=None, player_index=0, spawn_locations=None):
+        """Ranks spawn locations for a stack of demolishers, favouring paths where they can hit 
+        enemy structures from outside turret range. See standoff.plan_standoffs.
+
+        Args:
+            * count: The number of demolishers in the stack. If None, as many as you can afford, at least one.
+            * player_index: The player spawning the stack, 0 for you 1 for the enemy
+            * spawn_locations: The locations to consider. If None, every open location on the player's spawn edges.
+
+        Returns:
+            A list of StandoffOption, best first
+
+        """
+        if not player_index == 0 and not player_index == 1:
+            self._invalid_player_index(player_index)
+            return
+        if count is None:
+            count = max(1, int(self.get_resource(MP, player_index) // self.type_cost(DEMOLISHER)[MP]))
+        from .standoff import plan_standoffs
+        return plan_standoffs(self, count, player_index, DEMOLISHER, spawn_locations)
+
+    def plan_intercepts(self, enemy_options=None, player_index=0):
+        """Finds where interceptors spawned on each of your edge cells would meet predicted enemy stacks,
+        with the frames each pair is in range. See intercept.plan_intercepts.
+
+        Args:
+            * enemy_options: A list of (unit_type, [x, y], weight) entries for the enemy stacks you expect, 
+              weighted by likelihood. If None, a scout from each enemy spawn location, all equally likely.
+            * player_index: The player spawning the interceptors, 0 for you 1 for the enemy
+
+        Returns:
+            An InterceptPlan
+
+        """
+        if not player_index == 0 and not player_index == 1:
+            self._invalid_player_index(player_index)
+            return
+        if enemy_options is None:
+            enemy_locations = sorted(self.predict_spawn_paths(1 - player_index).paths)
+            if not enemy_locations:
+                # Every cell the opponent could spawn on is blocked, so there is nothing to intercept
+                from .intercept import InterceptPlan
+                return InterceptPlan([], [])
+            enemy_options = [(SCOUT, list(location), 1 / len(enemy_locations)) for location in enemy_locations]
+        from .intercept import plan_intercepts
+        return plan_intercepts(self, enemy_options, INTERCEPTOR, player_index)
+
+    def simulate_plans(self, plans, player_index=0, max_frames=200):
+        """Simulates many deploy plans at once on this board, stepping all of them together as NumPy arrays.
+        Requires numpy. See simulator.BatchSimulator; to run several batches on the same board, keep a BatchSimulator instead.
+
+        Args:
+            * plans: A list of plans, each a list of (unit_type, [x, y], count) entries
+            * player_index: The player deploying the plans, 0 for you 1 for the enemy
+            * max_frames: The number of frames to simulate at most
+
+        Returns:
+            A BatchResult with one entry per plan
+
+        """
+        if not player_index == 0 and not player_index == 1:
+            self._invalid_player_index(player_index)
+            return
+        from .simulator import BatchSimulator
+        return BatchSimulator(self, player_index).run(plans, max_frames)
+
+    def _deployed_stacks(self):
+        """The mobile units deployed this turn as (unit_type, [x, y], count) entries, one per type and location
+        """
+        counts = {}
+        for unit_type, x, y in self._deploy_stack:
+            counts[unit_type, x, y] = counts.get((unit_type, x, y), 0) + 1
+        return [(unit_type, [x, y], count) for (unit_type, x, y), count in counts.items()]
+
+    def find_chokepoints(self, player_index=1):
+        """Finds the cells where structures would seal or squeeze a player's routes to their target edges.
+        The result is remembered for each structure layout. See chokepoints.analyze_chokepoints.
+
+        Args:
+            player_index: The player whose routes are analyzed, 0 for you 1 for the enemy. 
+              The default finds where you could build to block your opponent.
+
+        Returns:
+            A ChokepointAnalysis
+
+        """
+        if not player_index == 0 and not player_index == 1:
+            self._invalid_player_index(player_index)
+            return
+        from .chokepoints import analyze_chokepoints
+        return analyze_chokepoints(self, player_index)
+
+    def board_delta(self, previous=None):
+        """Finds the structures added, removed, upgraded and marked for removal since an earlier turn.
+        Only the rows whose structure hashes changed are compared. The result is remembered for each pair of boards.
+
+        Args:
+            previous: The earlier GameState or BoardSnapshot. If None, the turn before in board_snapshots.
+
+        Returns:
+            A BoardDelta, or None if no earlier turn is known
+
+        """
+        if previous is None:
+            previous = self._previous_snapshot
+        elif isinstance(previous, GameState):
+            previous = previous.snapshot
+        if previous is None:
+            return None
+        key = ("board_delta", previous.turn_number, self.turn_number, previous.row_hashes, previous.removing, self.snapshot.row_hashes, self.snapshot.removing)
+        delta = self.query_cache.get(key)
+        if delta is None:
+            delta = BoardDelta(previous, self.snapshot)
+            self.query_cache.put(key, delta)
+        return delta
 
     def contains_stationary_unit(self, location):
         """Check if a location is blocked, return structures unit if it is
@@ -614,6 +840,60 @@ class GameState:
                     target_x_distance = unit_x_distance
         return target
 
+    def get_targets(self, attacking_units=None):
+        """Gets the target of many attacking units at once, with the same priority and results as get_target.
+
+        The units on the board are put in per cell buckets once, with their priority values computed 
+        up front, and each attacker then walks a precomputed table of the cells in its range.
+
+        Args:
+            attacking_units: A list of GameUnits. If None, every unit on the board that can attack is used.
+
+        Returns:
+            A list of (attacking unit, target) pairs in the order of attacking_units. The target is None if nothing is in range.
+
+        """
+        game_map = self.game_map
+        center = self.HALF_ARENA - 0.5
+        buckets = {}
+        for unit in game_map.units_by():
+            cell = unit.y * ARENA_SIZE + unit.x
+            if cell not in buckets:
+                buckets[cell] = [(unit, unit.stationary, unit.health, unit.y, abs(center - unit.x)) for unit in game_map[unit.x, unit.y]]
+        if attacking_units is None:
+            attacking_units = [entry[0] for cell in sorted(buckets) for entry in buckets[cell] if entry[0].attackRange > 0 and entry[0].damage_f + entry[0].damage_i > 0]
+
+        hit_radius = self.config["unitInformation"][0]['getHitRadius']
+        targets = []
+        for attacking_unit in attacking_units:
+            if not isinstance(attacking_unit, GameUnit):
+                self.warn("Passed a {} to get_targets as attacking_unit. Expected a GameUnit.".format(type(attacking_unit)))
+                targets.append((attacking_unit, None))
+                continue
+            x, y = attacking_unit.x, attacking_unit.y
+            player_index = attacking_unit.player_index
+            hits_structures = attacking_unit.damage_f != 0
+            hits_mobile = attacking_unit.damage_i != 0
+            # Lower y is better for your units and higher y for the enemy's
+            height_sign = 1 if player_index == 0 else -1
+            target, target_key = None, None
+            for dx, dy, distance in range_offsets(attacking_unit.attackRange, hit_radius):
+                target_x, target_y = x + dx, y + dy
+                if not (0 <= target_x < ARENA_SIZE and 0 <= target_y < ARENA_SIZE):
+                    continue
+                bucket = buckets.get(target_y * ARENA_SIZE + target_x)
+                if bucket is None:
+                    continue
+                for unit, stationary, health, unit_y, x_distance in bucket:
+                    if unit.player_index == player_index or (stationary and not hits_structures) or (not stationary and not hits_mobile):
+                        continue
+                    # Infantry > Nearest Unit > Lowest Health > Lowest Y position > Closest to edge, the first unit found wins ties
+                    key = (stationary, distance, health, height_sign * unit_y, -x_distance)
+                    if target_key is None or key < target_key:
+                        target, target_key = unit, key
+            targets.append((attacking_unit, target))
+        return targets
+
     def get_attackers(self, location, player_index):
         """Gets the stationary units threatening a given location
 
@@ -631,7 +911,16 @@ class GameState:
         if not self.game_map.in_arena_bounds(location):
             self.warn("Location {} is not in the arena bounds.".format(location))
 
+        # Mobile units can attack too, so the mobile hash is part of the key. The mobile hash does not
+        # depend on the order units are stacked in, so the cache only stores where the attackers stand,
+        # and the units at those locations are filtered again on this turn's map.
+        key = ("attackers", self.game_map.structure_hash, self.game_map.mobile_hash, location[0], location[1], player_index)
+        cached = self.query_cache.get(key)
+        if cached is not None:
+            return [unit for x, y in cached for unit in self.game_map[x, y] if self.__attacks(unit, location, [x, y], player_index)]
+
         attackers = []
+        positions = []
         """
         Get locations in the range of TURRET units
         """
@@ -641,7 +930,18 @@ class GameState:
                 max_range = unit.get('attackRange', 0)
         possible_locations= self.game_map.get_locations_in_range(location, max_range)
         for location_unit in possible_locations:
+            found = False
             for unit in self.game_map[location_unit]:
-                if unit.damage_i + unit.damage_f > 0 and unit.player_index != player_index and self.game_map.distance_between_locations(location, location_unit) <= unit.attackRange:
+                if self.__attacks(unit, location, location_unit, player_index):
                     attackers.append(unit)
+                    found = True
+            if found:
+                positions.append((location_unit[0], location_unit[1]))
+        self.query_cache.put(key, tuple(positions))
         return attackers
+
+    def __attacks(self, unit, location, unit_location, player_index):
+        """
+        Helper function for get_attackers: True if the unit standing at unit_location can attack a unit of player_index at location.
+        """
+        return unit.damage_i + unit.damage_f > 0 and unit.player_index != player_index and self.game_map.distance_between_locations(location, unit_location) <= unit.attackRange
@@ -0,0 +1,211 @@
+from array import array
+
+from .action_phase import UNIT_TYPE_COUNT, STRUCTURE_TYPE_COUNT
+from .game_map import ARENA_SIZE
+
+_HALF_ARENA = ARENA_SIZE // 2
+# Raw unit list index of the upgrade markers
+_UPGRADE_INDEX = 7
+
+
+class RingBuffer:
+    """The last capacity values of a series, kept in a preallocated array so memory does not grow with the game.
+
+    Indexing follows lists counted from the end: buffer[-1] is the newest value and buffer[0] the oldest one kept.
+
+    Attributes :
+        * capacity (int): The number of values kept
+        * appended (int): The number of values appended since the last clear, including those overwritten
+
+    """
+    def __init__(self, capacity, typecode="d"):
+        self.capacity = capacity
+        self.appended = 0
+        self._values = array(typecode, bytes(array(typecode).itemsize * capacity))
+
+    def __len__(self):
+        return min(self.appended, self.capacity)
+
+    def _slot(self, index):
+        size = len(self)
+        if index < 0:
+            index += size
+        if not 0 <= index < size:
+            raise IndexError("RingBuffer index out of range")
+        return (self.appended - size + index) % self.capacity
+
+    def __getitem__(self, index):
+        return self._values[self._slot(index)]
+
+    def __setitem__(self, index, value):
+        self._values[self._slot(index)] = value
+
+    def append(self, value):
+        """Adds a value, overwriting the oldest one once the buffer is full
+        """
+        self._values[self.appended % self.capacity] = value
+        self.appended += 1
+
+    def clear(self):
+        self.appended = 0
+
+    def last(self, count=None, skip=0):
+        """The newest count values before the newest skip ones, oldest first. All kept values if count is None.
+        """
+        end = len(self) - skip
+        start = 0 if count is None else max(end - count, 0)
+        return [self[index] for index in range(start, end)]
+
+
+class OpponentHistory:
+    """Per turn history of one player's resources, builds, spawns and damage, in fixed size ring buffers.
+
+    AlgoCore fills it from every turn state and action frame. Each turn state starts a new row holding the
+    player's health, MP and SP at the start of the turn. The structures the player built or upgraded that
+    turn are added once the next turn state shows them, and the units spawned and damage taken during the
+    action phase are added as the frames arrive. The row of the turn in progress is therefore incomplete,
+    so windowed queries cover the finished turns only; read the turn in progress with current.
+
+    Metrics are named by strings: "health", "MP", "SP", "built", "upgraded", "spawned", "damage_taken" and
+    "breaches", plus "built:{type}" and "spawned:{type}" by unit type number and "spawned_edge:{edge}" by
+    edge number, as in GameMap.get_edge_locations.
+
+    Attributes :
+        * player_index (int): The player tracked, 0 for you 1 for the enemy
+        * capacity (int): The number of turns kept
+        * turns (RingBuffer): The turn number of each row
+
+    """
+    def __init__(self, player_index=1, capacity=64):
+        self.player_index = player_index
+        self.capacity = capacity
+        self.turns = RingBuffer(capacity, "l")
+        names = ["health", "MP", "SP", "built", "upgraded", "spawned", "damage_taken", "breaches"]
+        names += ["built:{}".format(unit_type) for unit_type in range(STRUCTURE_TYPE_COUNT)]
+        names += ["spawned:{}".format(unit_type) for unit_type in range(STRUCTURE_TYPE_COUNT, UNIT_TYPE_COUNT)]
+        names += ["spawned_edge:{}".format(edge) for edge in range(4)]
+        self._metrics = {name: RingBuffer(capacity) for name in names}
+        self._structure_ids = set()
+        self._upgraded = set()
+
+    def metrics(self):
+        """The names of every metric
+        """
+        return list(self._metrics)
+
+    def reset(self):
+        """Clears the history, for a new game
+        """
+        self.turns.clear()
+        for buffer in self._metrics.values():
+            buffer.clear()
+        self._structure_ids = set()
+        self._upgraded = set()
+
+    def begin_turn(self, state):
+        """Finishes the previous row with the structures the state shows were built, and starts the row of the state's turn
+
+        Args:
+            state: The parsed JSON of the turn
+
+        """
+        stats = state["p1Stats" if self.player_index == 0 else "p2Stats"]
+        units = state["p1Units" if self.player_index == 0 else "p2Units"]
+        structure_ids = set()
+        built = [0] * STRUCTURE_TYPE_COUNT
+        for unit_type in range(STRUCTURE_TYPE_COUNT):
+            for unit in units[unit_type]:
+                structure_ids.add(unit[3])
+                if unit[3] not in self._structure_ids:
+                    built[unit_type] += 1
+        upgraded = set(unit[3] for unit in units[_UPGRADE_INDEX]) if len(units) > _UPGRADE_INDEX else set()
+        if len(self.turns):
+            for unit_type, count in enumerate(built):
+                self._add("built:{}".format(unit_type), count)
+            self._add("built", sum(built))
+            self._add("upgraded", len(upgraded - self._upgraded))
+        self._structure_ids = structure_ids
+        self._upgraded = upgraded
+
+        self.turns.append(int(state["turnInfo"][1]))
+        for buffer in self._metrics.values():
+            buffer.append(0.0)
+        self._metrics["health"][-1] = float(stats[0])
+        self._metrics["SP"][-1] = float(stats[1])
+        self._metrics["MP"][-1] = float(stats[2])
+
+    def record(self, frame):
+        """Adds the spawns, damage and breaches of one parsed action frame to the turn in progress
+        """
+        if not len(self.turns):
+            return
+        owner = self.player_index + 1
+        events = frame.get("events", {})
+        for spawn in events.get("spawn", ()):
+            (x, y), unit_type, _, spawn_owner = spawn[:4]
+            if spawn_owner == owner and STRUCTURE_TYPE_COUNT <= unit_type < UNIT_TYPE_COUNT:
+                self._add("spawned", 1)
+                self._add("spawned:{}".format(unit_type), 1)
+                self._add("spawned_edge:{}".format(_spawn_edge(x, y)), 1)
+        for damage in events.get("damage", ()):
+            if damage[4] == owner:
+                self._add("damage_taken", damage[1])
+        for breach in events.get("breach", ()):
+            if breach[4] == owner:
+                self._add("breaches", 1)
+
+    def _add(self, name, amount):
+        buffer = self._metrics[name]
+        buffer[-1] += amount
+
+    def _buffer(self, metric):
+        try:
+            return self._metrics[metric]
+        except KeyError:
+            raise KeyError("Unknown history metric {!r}, expected one of {}".format(metric, self.metrics())) from None
+
+    def current(self, metric):
+        """The value of a metric in the turn in progress, or None before the first turn
+        """
+        buffer = self._buffer(metric)
+        return buffer[-1] if len(buffer) else None
+
+    def finished_turns(self):
+        """The number of finished turns kept
+        """
+        return max(len(self.turns) - 1, 0)
+
+    def values(self, metric, window=None):
+        """The values of a metric over the last window finished turns, oldest first. All finished turns kept if window is None.
+        """
+        return self._buffer(metric).last(window, skip=1 if len(self.turns) else 0)
+
+    def total(self, metric, window=None):
+        """The sum of a metric over the last window finished turns
+        """
+        return sum(self.values(metric, window))
+
+    def mean(self, metric, window=None, where=None):
+        """The mean of a metric over the last window finished turns, or None if no turn counts
+
+        Args:
+            * metric: The metric averaged
+            * window: The number of finished turns looked at. If None, every finished turn kept.
+            * where: Another metric. If given, only the turns where it is nonzero count,
+              so mean("MP", 10, where="spawned") is the mean MP on the turns the player attacked.
+
+        """
+        values = self.values(metric, window)
+        if where is not None:
+            values = [value for value, condition in zip(values, self.values(where, window)) if condition]
+        if not values:
+            return None
+        return sum(values) / len(values)
+
+
+def _spawn_edge(x, y):
+    """The number of the edge a unit spawned at x, y starts on, as in GameMap.get_edge_locations
+    """
+    if y >= _HALF_ARENA:
+        return 0 if x >= _HALF_ARENA else 1
+    return 3 if x >= _HALF_ARENA else 2
@@ -0,0 +1,196 @@
+import heapq
+
+from .action_phase import STRUCTURE_TYPE_COUNT
+
+
+class ImportanceIndex:
+    """Keys ranked by a score, kept in a heap so updates cost O(log n) and the best keys are found without sorting.
+
+    Updating a key pushes a new heap entry and leaves the old one in place; old entries are recognized
+    by their sequence number and skipped when they reach the top. The heap is rebuilt from the live
+    scores once stale entries outnumber them, so it stays within a constant factor of the number of keys.
+
+    Attributes :
+        * largest_first (bool): True if the highest scores rank first, False if the lowest do
+
+    """
+    def __init__(self, largest_first=True):
+        self.largest_first = largest_first
+        self._scores = {}
+        self._sequences = {}
+        self._heap = []
+        self._sequence = 0
+
+    def __len__(self):
+        return len(self._scores)
+
+    def __contains__(self, key):
+        return key in self._scores
+
+    def score(self, key, default=None):
+        """The score of a key, or default if it is not indexed
+        """
+        return self._scores.get(key, default)
+
+    def set(self, key, score):
+        """Sets the score of a key, adding the key if needed
+        """
+        self._sequence += 1
+        self._scores[key] = score
+        self._sequences[key] = self._sequence
+        heapq.heappush(self._heap, (-score if self.largest_first else score, self._sequence, key))
+        if len(self._heap) > 2 * len(self._scores) + 32:
+            self._compact()
+
+    def add(self, key, amount):
+        """Adds an amount to the score of a key, starting from 0 for a new key
+        """
+        self.set(key, self._scores.get(key, 0) + amount)
+
+    def remove(self, key):
+        """Drops a key. Its heap entries become stale.
+        """
+        if key in self._scores:
+            del self._scores[key]
+            del self._sequences[key]
+
+    def clear(self):
+        self._scores.clear()
+        self._sequences.clear()
+        self._heap = []
+
+    def _compact(self):
+        self._heap = [(-score if self.largest_first else score, self._sequences[key], key) for key, score in self._scores.items()]
+        heapq.heapify(self._heap)
+
+    def _pop_valid(self):
+        """Pops the best live entry, dropping the stale ones above it, or returns None if there is none
+        """
+        heap = self._heap
+        while heap:
+            entry = heapq.heappop(heap)
+            if self._sequences.get(entry[2]) == entry[1]:
+                return entry
+        return None
+
+    def _ranked_while(self, keep):
+        """Pops live entries best first while keep(entry) is true, then pushes them back
+        """
+        taken = []
+        while True:
+            entry = self._pop_valid()
+            if entry is None:
+                break
+            if not keep(entry, len(taken)):
+                heapq.heappush(self._heap, entry)
+                break
+            taken.append(entry)
+        for entry in taken:
+            heapq.heappush(self._heap, entry)
+        return [(key, self._scores[key]) for _, _, key in taken]
+
+    def top(self, k):
+        """The k best keys, best first, as (key, score). Costs O(k log n).
+        """
+        return self._ranked_while(lambda entry, count: count < k)
+
+    def threshold(self, limit):
+        """Every key whose score is at least limit, or at most limit when the lowest scores rank first, best first, as (key, score).
+        Costs O(m log n) for m results.
+        """
+        if self.largest_first:
+            return self._ranked_while(lambda entry, count: -entry[0] >= limit)
+        return self._ranked_while(lambda entry, count: entry[0] <= limit)
+
+    def ranked(self):
+        """Yields every key best first, as (key, score). Only the entries consumed are ordered,
+        so stopping early costs O(n) for the copy plus O(log n) per key read.
+        """
+        heap = [(-score if self.largest_first else score, self._sequences[key], key) for key, score in self._scores.items()]
+        heapq.heapify(heap)
+        while heap:
+            _, _, key = heapq.heappop(heap)
+            yield key, self._scores[key]
+
+
+class StructureImportance:
+    """Importance metrics of one player's structures, by (x, y), kept in ImportanceIndex heaps.
+
+    Damage dealt and damage taken are added up from the action frames as they arrive and are kept
+    for the whole game, by location. The health fraction of every standing structure is refreshed
+    from the turn's game state, touching only the structures whose health changed.
+
+    Attributes :
+        * player_index (int): The player whose structures are tracked, 0 for you 1 for the enemy
+        * damage_dealt (ImportanceIndex): Damage dealt by the structures at each location, highest first
+        * damage_taken (ImportanceIndex): Damage taken by the structures at each location, highest first
+        * health (ImportanceIndex): Health over maximum health of each standing structure, lowest first
+
+    """
+    def __init__(self, player_index=0):
+        self.player_index = player_index
+        self.damage_dealt = ImportanceIndex()
+        self.damage_taken = ImportanceIndex()
+        self.health = ImportanceIndex(largest_first=False)
+        self._unit_types = {}
+
+    def reset(self):
+        """Clears every metric, for a new game
+        """
+        self.damage_dealt.clear()
+        self.damage_taken.clear()
+        self.health.clear()
+        self._unit_types = {}
+
+    def record(self, frame):
+        """Adds the damage and deaths of one parsed action frame
+        """
+        owner = self.player_index + 1
+        events = frame.get("events", {})
+        for attack in events.get("attack", ()):
+            if attack[6] == owner and attack[3] < STRUCTURE_TYPE_COUNT:
+                self.damage_dealt.add(tuple(attack[0]), attack[2])
+        for damage in events.get("damage", ()):
+            if damage[4] == owner and damage[2] < STRUCTURE_TYPE_COUNT:
+                self.damage_taken.add(tuple(damage[0]), damage[1])
+        for death in events.get("death", ()):
+            if death[3] == owner and death[1] < STRUCTURE_TYPE_COUNT:
+                location = tuple(death[0])
+                self.health.remove(location)
+                self._unit_types.pop(location, None)
+
+    def update_health(self, state, config):
+        """Refreshes the health fractions from a parsed turn state
+
+        Args:
+            * state: The parsed JSON of the turn
+            * config: The game config, for the maximum health of each structure
+
+        """
+        units = state["p1Units" if self.player_index == 0 else "p2Units"]
+        upgraded = set((x, y) for x, y, *_ in units[7]) if len(units) > 7 else set()
+        standing = set()
+        for unit_type in range(STRUCTURE_TYPE_COUNT):
+            unit_info = config["unitInformation"][unit_type]
+            base_health = unit_info.get("startHealth", 1)
+            upgraded_health = unit_info.get("upgrade", {}).get("startHealth", base_health)
+            for x, y, health, *_ in units[unit_type]:
+                location = (x, y)
+                standing.add(location)
+                self._unit_types[location] = unit_type
+                fraction = health / (upgraded_health if location in upgraded else base_health)
+                if self.health.score(location) != fraction:
+                    self.health.set(location, fraction)
+        for location in [location for location in self._unit_types if location not in standing]:
+            self.health.remove(location)
+            del self._unit_types[location]
+
+    def unit_type(self, location):
+        """The unit type number of the standing structure at a location, or None
+        """
+        return self._unit_types.get(tuple(location))
+
+    def low_health(self, limit, unit_type=None):
+        """The [x, y] of the standing structures at or below a health fraction, lowest first, optionally of one unit type number
+        """
+        return [list(location) for location, _ in self.health.threshold(limit) if unit_type is None or self._unit_types[location] == unit_type]
@@ -0,0 +1,72 @@
+from array import array
+
+# Income tables already built, by the resource settings of the config they were built from
+_TABLES = {}
+
+
+class IncomeTable:
+    """The MP and SP each player gains at the start of every turn, computed once from config["resources"].
+
+    Both players follow the same schedule. SP gained for damaging the opponent (coresForPlayerDamage) depends on
+    the action phase and is not included.
+
+    Attributes :
+        * turns (int): The number of turns tabled. Later turns are computed from the schedule when asked for.
+        * MP_decay (float): The fraction of MP lost at the start of every turn
+        * MP_income (array): The MP gained at the start of each turn, by turn number
+        * SP_income (array): The SP gained at the start of each turn, by turn number
+        * SP_totals (array): SP_totals[t] is the SP gained from turn 1 up to and including turn t - 1
+
+    """
+    def __init__(self, resources, turns=200):
+        self.turns = turns
+        self.MP_decay = resources["bitDecayPerRound"]
+        self._MP_per_round = resources["bitsPerRound"]
+        self._MP_growth = resources["bitGrowthRate"]
+        self._MP_interval = resources["turnIntervalForBitSchedule"]
+        self._SP_per_round = resources["coresPerRound"]
+        self.MP_income = array("d", (self._scheduled_MP(turn) for turn in range(turns)))
+        self.SP_income = array("d", [self._SP_per_round] * turns)
+        self.SP_totals = array("d", [0.0] * (turns + 1))
+        for turn in range(1, turns):
+            self.SP_totals[turn + 1] = self.SP_totals[turn] + self.SP_income[turn]
+
+    def _scheduled_MP(self, turn):
+        return self._MP_per_round + self._MP_growth * (turn // self._MP_interval)
+
+    def MP_gained(self, turn):
+        """The MP gained at the start of a turn
+        """
+        return self.MP_income[turn] if turn < self.turns else self._scheduled_MP(turn)
+
+    def project_MP(self, MP, turn_number, turns_in_future=1):
+        """The MP a player holding MP on turn_number will have turns_in_future turns later if they spend none.
+        Rounded to one decimal every turn, like the engine.
+        """
+        decay = 1 - self.MP_decay
+        income = self.MP_income
+        last = turn_number + turns_in_future
+        for turn in range(turn_number + 1, min(last, self.turns - 1) + 1):
+            MP = round(MP * decay + income[turn], 1)
+        for turn in range(max(turn_number + 1, self.turns), last + 1):
+            MP = round(MP * decay + self._scheduled_MP(turn), 1)
+        return MP
+
+    def project_SP(self, SP, turn_number, turns_in_future=1):
+        """The SP a player holding SP on turn_number will have turns_in_future turns later if they spend none
+        """
+        last = turn_number + turns_in_future
+        if last < self.turns:
+            return SP + self.SP_totals[last + 1] - self.SP_totals[turn_number + 1]
+        return SP + self._SP_per_round * turns_in_future
+
+
+def income_table(config):
+    """The IncomeTable of a config, built the first time it is asked for
+    """
+    resources = config["resources"]
+    key = tuple(sorted(resources.items()))
+    table = _TABLES.get(key)
+    if table is None:
+        table = _TABLES[key] = IncomeTable(resources)
+    return table
@@ -0,0 +1,145 @@
+from .game_map import ARENA_SIZE
+from .standoff import range_masks, mask_cells
+from .unit import GameUnit
+
+
+class Engagement:
+    """When and where an interceptor stack can fire on one predicted enemy stack
+
+    Attributes :
+        * first_frame (int): The first frame the enemy stack is in range
+        * last_frame (int): The last frame the enemy stack is in range
+        * interceptor_location (list): Where the interceptors stand on the first frame
+        * enemy_location (list): Where the enemy stack stands on the first frame
+
+    """
+    def __init__(self, first_frame, interceptor_location, enemy_location):
+        self.first_frame = first_frame
+        self.last_frame = first_frame
+        self.interceptor_location = interceptor_location
+        self.enemy_location = enemy_location
+
+    def frames(self):
+        """The length of the engagement window, in frames
+        """
+        return self.last_frame - self.first_frame + 1
+
+
+class InterceptPlan:
+    """The engagements between interceptors spawned on each of your edge cells and each predicted enemy stack
+
+    Attributes :
+        * spawn_locations (list): The [x, y] spawn location of each interceptor option
+        * enemy_options (list): The (unit_type, [x, y], weight) of each predicted enemy stack
+        * engagements (dict): Maps (spawn index, enemy index) to an Engagement, for the pairs that meet
+        * coverage (list): For each spawn location, the summed weight of the enemy stacks its interceptors engage
+        * expected_damage (list): For each spawn location, the damage per interceptor expected over every engagement window, weighted by likelihood
+
+    """
+    def __init__(self, spawn_locations, enemy_options):
+        self.spawn_locations = spawn_locations
+        self.enemy_options = enemy_options
+        self.engagements = {}
+        self.coverage = [0] * len(spawn_locations)
+        self.expected_damage = [0] * len(spawn_locations)
+
+    def ranked(self):
+        """The spawn locations ordered by coverage and then expected damage, best first, as (location, coverage, expected damage)
+        """
+        order = sorted(range(len(self.spawn_locations)), key=lambda index: (-self.coverage[index], -self.expected_damage[index]))
+        return [(self.spawn_locations[index], self.coverage[index], self.expected_damage[index]) for index in order]
+
+    def best_location(self):
+        """The spawn location that engages the most likely enemy stacks, or None if none of them can be engaged
+        """
+        ranked = self.ranked()
+        if not ranked or ranked[0][1] == 0:
+            return None
+        return ranked[0][0]
+
+
+def _position_at(path, frames_per_move, frame):
+    """The location of a unit on its path at a frame, or None once it has left the board
+    """
+    step = frame // frames_per_move
+    return path[step] if step < len(path) else None
+
+
+def plan_intercepts(game_state, enemy_options, unit_type, player_index=0):
+    """Finds where and when interceptors spawned on each of your edge cells meet each predicted enemy stack.
+
+    Positions come from the cached spawn path predictions of both players. All interceptor options are
+    evaluated together: for each step of the interceptors, every cell in range of at least one of
+    them holds a bitmask with one bit per spawn location. Each enemy stack then needs one mask lookup per
+    frame to find every interceptor option able to fire on it, and per pair work is only done the first
+    and last time a bit appears. Units are assumed to survive and to move at their config speed.
+
+    Args:
+        * game_state: The GameState to plan on
+        * enemy_options: A list of (unit_type, [x, y], weight) entries, the weight being the likelihood of that stack
+        * unit_type: The interceptor unit type
+        * player_index: The player spawning the interceptors, 0 for you 1 for the enemy
+
+    Returns:
+        An InterceptPlan
+
+    """
+    config = game_state.config
+    hit_radius = config["unitInformation"][0]["getHitRadius"]
+    friendly_paths = game_state.predict_spawn_paths(player_index).paths
+    enemy_paths = game_state.predict_spawn_paths(1 - player_index).paths
+    spawn_locations = [list(location) for location in sorted(friendly_paths, key=lambda location: (location[1], location[0]))]
+    options = [(option_type, list(location), weight) for option_type, location, weight in enemy_options if tuple(location) in enemy_paths]
+    plan = InterceptPlan(spawn_locations, options)
+    if not spawn_locations or not options:
+        return plan
+
+    interceptor = GameUnit(unit_type, config, player_index)
+    masks = range_masks(interceptor.attackRange, hit_radius)
+    frames_per_move = max(1, round(1 / interceptor.speed)) if interceptor.speed else 1
+    paths = [friendly_paths[tuple(location)] for location in spawn_locations]
+
+    # coverage_by_step[step] maps a cell index to the bitmask of interceptor options that can fire on it
+    coverage_by_step = []
+    for step in range(max(len(path) for path in paths)):
+        coverage = {}
+        for index, path in enumerate(paths):
+            if step >= len(path):
+                continue
+            x, y = path[step]
+            bit = 1 << index
+            for cell in mask_cells(masks[y * ARENA_SIZE + x]):
+                coverage[cell] = coverage.get(cell, 0) | bit
+        coverage_by_step.append(coverage)
+
+    for enemy_index, (enemy_type, location, weight) in enumerate(options):
+        enemy_path = enemy_paths[tuple(location)]
+        enemy = GameUnit(enemy_type, config, 1 - player_index)
+        enemy_frames_per_move = max(1, round(1 / enemy.speed)) if enemy.speed else 1
+        last_frame = min(len(enemy_path) * enemy_frames_per_move, len(coverage_by_step) * frames_per_move)
+        in_range_by_frame = []
+        for frame in range(last_frame):
+            x, y = _position_at(enemy_path, enemy_frames_per_move, frame)
+            in_range_by_frame.append(coverage_by_step[frame // frames_per_move].get(y * ARENA_SIZE + x, 0))
+
+        # First and last frame of every pair, touching each pair only when its bit first appears
+        seen = 0
+        for frame, in_range in enumerate(in_range_by_frame):
+            new = in_range & ~seen
+            if new:
+                seen |= new
+                for index in mask_cells(new):
+                    plan.engagements[index, enemy_index] = Engagement(frame, _position_at(paths[index], frames_per_move, frame), _position_at(enemy_path, enemy_frames_per_move, frame))
+        remaining = seen
+        for frame in range(len(in_range_by_frame) - 1, -1, -1):
+            done = in_range_by_frame[frame] & remaining
+            if done:
+                remaining ^= done
+                for index in mask_cells(done):
+                    plan.engagements[index, enemy_index].last_frame = frame
+            if not remaining:
+                break
+        for index in mask_cells(seen):
+            plan.coverage[index] += weight
+            plan.expected_damage[index] += weight * interceptor.damage_i * plan.engagements[index, enemy_index].frames()
+    return plan
@@ -1,24 +1,387 @@
-import heapq
-import math
 import sys
-import queue
 from .util import debug_write
+from .game_map import ARENA_SIZE, CELL_COUNT, ARENA_CELLS, NEIGHBORS, cell_index, cell_location
 
-class Node:
-    """A path-finding node
+HORIZONTAL = 1
+VERTICAL = 2
+
+# The x and y coordinate of every cell index
+_CELL_X = tuple(index % ARENA_SIZE for index in range(CELL_COUNT))
+_CELL_Y = tuple(index // ARENA_SIZE for index in range(CELL_COUNT))
+# Idealness tables by set of endpoints, shared by every path search
+_ENDPOINT_TABLES = {}
+
+
+class EndpointTable:
+    """The idealness of every cell for one set of endpoints, built once per set of endpoints
 
     Attributes :
-        * visited_idealness (bool): Have we visited this node during the idealness search step?
-        * visited_validate (bool): Have we visited this node during the validation step?
-        * blocked (bool): Is there a structures at this node's location
-        * pathlength: The distance between this node and the target location
+        * cells (tuple): The cell indices of the endpoints
+        * is_end_point (bytearray): 1 for the cells that are endpoints
+        * idealness (list): The idealness of every cell. Endpoints are perfectly ideal.
+        * direction (list): The direction [x, y] of the edge, [1, 1] for the top right and [-1, 1] for the top left
 
     """
-    def __init__(self):
-        self.visited_idealness = False
-        self.visited_validate = False
-        self.blocked = False
-        self.pathlength = -1
+    def __init__(self, cells, direction):
+        self.cells = cells
+        self.direction = direction
+        self.is_end_point = bytearray(CELL_COUNT)
+        for index in cells:
+            if 0 <= index < CELL_COUNT:
+                self.is_end_point[index] = 1
+        self.idealness = []
+        for index in range(CELL_COUNT):
+            if self.is_end_point[index]:
+                self.idealness.append(sys.maxsize)
+                continue
+            x, y = _CELL_X[index], _CELL_Y[index]
+            value = 28 * y if direction[1] == 1 else 28 * (27 - y)
+            value += x if direction[0] == 1 else 27 - x
+            self.idealness.append(value)
+
+
+def endpoint_table(end_points):
+    """Gets the shared EndpointTable for a list of endpoints
+    """
+    key = tuple(cell_index(location) for location in end_points)
+    table = _ENDPOINT_TABLES.get(key)
+    if table is None:
+        x, y = end_points[0]
+        direction = [1 if x >= ARENA_SIZE // 2 else -1, 1 if y >= ARENA_SIZE // 2 else -1]
+        table = _ENDPOINT_TABLES[key] = EndpointTable(key, direction)
+    return table
+
+
+class PathRegions:
+    """The connected regions of pathable space for one structure layout.
+
+    The board is labeled once. The ideal tile of each region and the distance field towards
+    each set of endpoints are computed the first time they are needed and then kept, so a path
+    query from any start is a region lookup plus a walk down the distance field.
+    Every region that reaches the endpoints shares one field, seeded from all the endpoints,
+    and every other region gets its own field seeded from its ideal self destruct tile.
+    Because regions never overlap, all of these live in a single array per set of endpoints.
+
+    GameState keeps one PathRegions per structure layout in its query cache, so it is
+    shared between path queries, turns and hypothetical game states with the same structures.
+
+    A copy can be edited with remove_structure, which updates the labels and distance fields
+    in place as structures are destroyed, touching only the cells whose values change.
+
+    Attributes :
+        * blocked (bytearray): 1 for cells holding a structure
+        * labels (list): The region of every cell, -1 for blocked cells and cells off the board
+        * regions (list): The cells of each region. Regions merged away by remove_structure are left empty.
+
+    """
+    def __init__(self, blocked):
+        self.blocked = bytearray(blocked)
+        self.labels = [-1] * CELL_COUNT
+        self.regions = []
+        self._ideal_tiles = {}
+        self._fields = {}
+        labels = self.labels
+        for start in ARENA_CELLS:
+            if self.blocked[start] or labels[start] != -1:
+                continue
+            region = len(self.regions)
+            labels[start] = region
+            cells = [start]
+            head = 0
+            while head < len(cells):
+                for neighbor in NEIGHBORS[cells[head]]:
+                    if not self.blocked[neighbor] and labels[neighbor] == -1:
+                        labels[neighbor] = region
+                        cells.append(neighbor)
+                head += 1
+            self.regions.append(cells)
+
+    def region_of(self, location):
+        """Gets the region holding a location
+
+        Returns:
+            The region index, or -1 if the location is blocked
+
+        """
+        x, y = location
+        if not (0 <= x < ARENA_SIZE and 0 <= y < ARENA_SIZE):
+            return -1
+        return self.labels[cell_index(location)]
+
+    def ideal_tile(self, region, table):
+        """Gets the cell a unit in the region will try to reach, an endpoint if the region touches one
+        """
+        key = (region, table.cells)
+        ideal = self._ideal_tiles.get(key)
+        if ideal is None:
+            # Idealness is unique for every cell that is not an endpoint, so the most ideal
+            # cell does not depend on the order the region is searched in.
+            idealness = table.idealness
+            ideal = max(self.regions[region], key=idealness.__getitem__)
+            self._ideal_tiles[key] = ideal
+        return ideal
+
+    def reaches_end_points(self, region, table):
+        """True if units in the region can reach the endpoints, False if they would self destruct
+        """
+        return table.is_end_point[self.ideal_tile(region, table)] == 1
+
+    def distance_field(self, region, table):
+        """Gets the pathlength of every cell towards the target of the region, computing it if needed.
+        The returned list is shared between regions and must not be modified. Cells outside of regions pathed so far hold -1.
+        """
+        field, filled, _ = self._fields.get(table.cells, (None, None, None))
+        if field is None:
+            field, filled = [-1] * CELL_COUNT, set()
+            self._fields[table.cells] = (field, filled, table)
+        reaches_end_points = self.reaches_end_points(region, table)
+        if (-1 if reaches_end_points else region) not in filled:
+            if reaches_end_points:
+                self._fill_field(field, table.cells)
+                filled.add(-1)
+            else:
+                self._fill_field(field, [self.ideal_tile(region, table)])
+                filled.add(region)
+        return field
+
+    def copy(self):
+        """Gets an independent copy that can be edited with remove_structure
+        """
+        other = PathRegions.__new__(PathRegions)
+        other.blocked = bytearray(self.blocked)
+        other.labels = list(self.labels)
+        other.regions = [list(cells) for cells in self.regions]
+        other._ideal_tiles = dict(self._ideal_tiles)
+        other._fields = {key: (list(field), set(filled), table) for key, (field, filled, table) in self._fields.items()}
+        return other
+
+    def remove_structure(self, location):
+        """Unblocks a location, as if the structure on it was destroyed.
+
+        The regions next to the location are merged into the largest of them, and every distance
+        field built so far is updated. If the merged region reaches the endpoints and already had
+        a field, only the cells whose pathlength drops are visited. A merged self destruct region
+        is refilled from its new ideal tile. Nothing outside the merged region is touched.
+
+        Args:
+            location: The location of the destroyed structure
+
+        """
+        cell = cell_index(location)
+        if not self.blocked[cell]:
+            return
+        labels = self.labels
+        merged = []
+        for neighbor in NEIGHBORS[cell]:
+            region = labels[neighbor]
+            if region != -1 and region not in merged:
+                merged.append(region)
+        # Which of the merged regions reached each set of endpoints before the merge
+        reached = {key: [region for region in merged if self.reaches_end_points(region, table)] for key, (_, _, table) in self._fields.items()}
+        # The kept region's list grows in place, so remember how many cells each region had
+        old_cells = {region: (self.regions[region], len(self.regions[region])) for region in merged}
+
+        self.blocked[cell] = 0
+        if merged:
+            kept = max(merged, key=lambda region: len(self.regions[region]))
+        else:
+            kept = len(self.regions)
+            self.regions.append([])
+        for region in merged:
+            if region != kept:
+                for merged_cell in self.regions[region]:
+                    labels[merged_cell] = kept
+                self.regions[kept].extend(self.regions[region])
+                self.regions[region] = []
+        labels[cell] = kept
+        self.regions[kept].append(cell)
+        for key in [key for key in self._ideal_tiles if key[0] in merged]:
+            del self._ideal_tiles[key]
+
+        for key, (field, filled, table) in self._fields.items():
+            if self.reaches_end_points(kept, table):
+                # Self destruct pathlengths of regions joining the endpoints are no longer valid
+                for region in merged:
+                    if region not in reached[key]:
+                        if region in filled:
+                            cells, size = old_cells[region]
+                            for stale_cell in cells[:size]:
+                                field[stale_cell] = -1
+                            filled.discard(region)
+                if -1 in filled:
+                    self._relax_field(field, cell, table)
+            elif any(region in filled for region in merged):
+                for region_cell in self.regions[kept]:
+                    field[region_cell] = -1
+                for region in merged:
+                    filled.discard(region)
+                self._fill_field(field, [self.ideal_tile(kept, table)])
+                filled.add(kept)
+
+    def _relax_field(self, field, cell, table):
+        """Sets the pathlength of a newly opened cell and lowers the pathlengths that now route through it
+        """
+        blocked = self.blocked
+        if table.is_end_point[cell]:
+            pathlength = 0
+        else:
+            pathlength = min(field[neighbor] for neighbor in NEIGHBORS[cell] if not blocked[neighbor] and field[neighbor] != -1) + 1
+        if field[cell] == -1 or field[cell] > pathlength:
+            field[cell] = pathlength
+        # Every improved pathlength goes through the opened cell, so a breadth first search from it finds them in order.
+        # Blocked endpoints were seeded without expanding, so the search starts even if the cell itself kept its value
+        frontier = [cell]
+        head = 0
+        while head < len(frontier):
+            current_location = frontier[head]
+            head += 1
+            next_pathlength = field[current_location] + 1
+            for neighbor in NEIGHBORS[current_location]:
+                if not blocked[neighbor] and (field[neighbor] == -1 or field[neighbor] > next_pathlength):
+                    field[neighbor] = next_pathlength
+                    frontier.append(neighbor)
+
+    def _fill_field(self, field, sources):
+        """Breadth first search from the sources, setting the pathlength of every cell reached
+        """
+        blocked = self.blocked
+        frontier = []
+        for location in sources:
+            if 0 <= location < CELL_COUNT and field[location] == -1:
+                field[location] = 0
+                frontier.append(location)
+        head = 0
+        while head < len(frontier):
+            current_location = frontier[head]
+            head += 1
+            # Blocked end points are seeded, but nothing can path through them
+            if blocked[current_location]:
+                continue
+            next_pathlength = field[current_location] + 1
+            for neighbor in NEIGHBORS[current_location]:
+                if not blocked[neighbor] and field[neighbor] == -1:
+                    field[neighbor] = next_pathlength
+                    frontier.append(neighbor)
+
+    def path(self, start_point, table):
+        """Gets the path from a start point towards a set of endpoints
+
+        Args:
+            * start_point: The starting location of the unit
+            * table: The EndpointTable of the endpoints
+
+        Returns:
+            The path as a list of [x, y] locations starting with start_point, or None if start_point is blocked
+
+        """
+        x, y = start_point
+        if not (0 <= x < ARENA_SIZE and 0 <= y < ARENA_SIZE) or self.labels[cell_index(start_point)] == -1:
+            return None
+        region = self.labels[cell_index(start_point)]
+        return descend(start_point, self.distance_field(region, table), self.blocked, table.direction)
+
+
+def descend(start_point, field, blocked, direction, move_direction=0):
+    """Walks down a distance field from a start point until it reaches a cell with pathlength 0
+
+    Args:
+        * start_point: The starting location of the unit
+        * field: The pathlength of every cell
+        * blocked: 1 for cells holding a structure
+        * direction: The direction of the target edge, see EndpointTable
+        * move_direction: The direction of the unit's last move, HORIZONTAL, VERTICAL or 0 if it has not moved
+
+    Returns:
+        The path as a list of [x, y] locations, starting with start_point
+
+    """
+    path = [start_point]
+    current = cell_index(start_point)
+    while not field[current] == 0:
+        next_move = choose_next_move(current, move_direction, field, blocked, direction)
+        if _CELL_X[current] == _CELL_X[next_move]:
+            move_direction = VERTICAL
+        else:
+            move_direction = HORIZONTAL
+        path.append([_CELL_X[next_move], _CELL_Y[next_move]])
+        current = next_move
+    return path
+
+
+def choose_next_move(current_point, previous_move_direction, field, blocked, direction):
+    """Given the current cell and the distance field, return the best 'next step' for a unit to take
+    """
+    ideal_neighbor = current_point
+    best_pathlength = field[current_point]
+    for neighbor in NEIGHBORS[current_point]:
+        if blocked[neighbor]:
+            continue
+        current_pathlength = field[neighbor]
+        #Filter by pathlength
+        if current_pathlength > best_pathlength:
+            continue
+        #Filter by direction based on prev move
+        if not current_pathlength < best_pathlength and not _better_direction(current_point, neighbor, ideal_neighbor, previous_move_direction, direction):
+            continue
+        ideal_neighbor = neighbor
+        best_pathlength = current_pathlength
+    return ideal_neighbor
+
+
+def _better_direction(prev_tile, new_tile, prev_best, previous_move_direction, direction):
+    """Compare two cells and return True if the unit would rather move to the new one
+    """
+    #True if we are moving in a different direction than prev move and prev is not
+    #If we previously moved horizontal, and now one of our options has a different x position then the other (the two options are not up/down)
+    if previous_move_direction == HORIZONTAL and not _CELL_X[new_tile] == _CELL_X[prev_best]:
+        #We want to go up now. If we have not changed our y, we are not going up
+        return not _CELL_Y[prev_tile] == _CELL_Y[new_tile]
+    if previous_move_direction == VERTICAL and not _CELL_Y[new_tile] == _CELL_Y[prev_best]:
+        return not _CELL_X[prev_tile] == _CELL_X[new_tile]
+    if previous_move_direction == 0: 
+        return not _CELL_Y[prev_tile] == _CELL_Y[new_tile]
+    
+    #To make it here, both moves are on the same axis 
+    if _CELL_Y[new_tile] == _CELL_Y[prev_best]: #If they both moved horizontal...
+        if direction[0] == 1 and _CELL_X[new_tile] > _CELL_X[prev_best]: #If we moved right and right is our direction, we moved towards our direction
+            return True 
+        if direction[0] == -1 and _CELL_X[new_tile] < _CELL_X[prev_best]: #If we moved left and left is our direction, we moved towards our direction
+            return True 
+        return False 
+    if _CELL_X[new_tile] == _CELL_X[prev_best]: #If they both moved vertical...
+        if direction[1] == 1 and _CELL_Y[new_tile] > _CELL_Y[prev_best]: #If we moved up and up is our direction, we moved towards our direction
+            return True
+        if direction[1] == -1 and _CELL_Y[new_tile] < _CELL_Y[prev_best]: #If we moved down and down is our direction, we moved towards our direction
+            return True
+        return False
+    return True
+
+
+class SpawnPathPrediction:
+    """The paths units spawned on every edge cell of one player would take
+
+    Instances are memoized by GameState.predict_spawn_paths and shared between calls,
+    so treat them as read only.
+
+    Attributes :
+        * player_index (int): The player whose spawn cells were pathed, 0 for you 1 for the enemy
+        * paths (dict): Maps each unblocked spawn location (x, y) to the path a unit spawned there would take
+        * traffic (dict): Maps each location (x, y) to the number of predicted paths that cross it
+
+    """
+    def __init__(self, player_index, paths):
+        self.player_index = player_index
+        self.paths = paths
+        self.traffic = {}
+        for path in paths.values():
+            for x, y in path:
+                self.traffic[x, y] = self.traffic.get((x, y), 0) + 1
+
+    def cells_crossed(self, start_location):
+        """The locations crossed by the unit spawned at start_location, or an empty set if it cannot spawn there
+        """
+        path = self.paths.get(tuple(start_location))
+        return set(map(tuple, path)) if path else set()
 
 """
 This class helps with pathfinding. We guarantee the results will
@@ -28,18 +391,24 @@ code to maximise time efficiency
 class ShortestPathFinder:
     """Handles path-finding
 
+    The searches work on integer cell indices (see game_map.cell_index) through a PathRegions 
+    object for the current structure layout, taken from the game state's query cache.
+    Paths from any number of start points then cost one flood per region, not one per start.
+
     Attributes :
         * HORIZONTAL (int): A constant representing a horizontal movement
         * VERTICAL (int): A constant representing a vertical movement
 
         * game_state (:obj: GameState): The current gamestate
-        * game_map (:obj: GameMap): The current gamemap
+        * regions (:obj: PathRegions): The pathable regions of the current structure layout
 
     """
     def __init__(self):
-        self.HORIZONTAL = 1
-        self.VERTICAL = 2
+        self.HORIZONTAL = HORIZONTAL
+        self.VERTICAL = VERTICAL
         self.initialized = False
+        self.regions = None
+        self._last_field = None
 
     def initialize_map(self, game_state):
         """Initializes the map
@@ -47,10 +416,9 @@ class ShortestPathFinder:
         Args:
             game_state: A GameState object representing the gamestate we want to traverse
         """
-        #Initialize map 
         self.initialized = True
         self.game_state = game_state
-        self.game_map = [[Node() for x in range(self.game_state.ARENA_SIZE)] for y in range(self.game_state.ARENA_SIZE)]
+        self.regions = get_path_regions(game_state)
 
     def navigate_multiple_endpoints(self, start_point, end_points, game_state):
         """Finds the path a unit would take to reach a set of endpoints
@@ -68,46 +436,33 @@ class ShortestPathFinder:
         if game_state.contains_stationary_unit(start_point):
             return
 
-        #Initialize map 
         self.initialize_map(game_state)
-        #Fill in walls
-        for location in self.game_state.game_map:
-            if self.game_state.contains_stationary_unit(location):
-                self.game_map[location[0]][location[1]].blocked = True
-        #Do pathfinding
-        ideal_endpoints = self._idealness_search(start_point, end_points)
-        self._validate(ideal_endpoints, end_points)
-        return self._get_path(start_point, end_points)
-
-    def _idealness_search(self, start, end_points):
-        """
-        Finds the most ideal tile in our 'pocket' of pathable space. 
-        The edge if it is available, or the best self destruct location otherwise
-        """
-        current = queue.Queue()
-        current.put(start)
-        best_idealness = self._get_idealness(start, end_points)
-        self.game_map[start[0]][start[1]].visited_idealness = True
-        most_ideal = start
+        table = endpoint_table(end_points)
+        path = self.regions.path(start_point, table)
+        if path is not None:
+            self._last_field = self.regions.distance_field(self.regions.region_of(start_point), table)
+        return path
 
-        while not current.empty():
-            search_location = current.get()
-            for neighbor in self._get_neighbors(search_location):
-                if not self.game_state.game_map.in_arena_bounds(neighbor) or self.game_map[neighbor[0]][neighbor[1]].blocked:
-                    continue
+    def navigate_multiple_starts(self, start_points, end_points, game_state):
+        """Finds the paths units at several start points would take to reach the same set of endpoints
 
-                x, y = neighbor
-                current_idealness = self._get_idealness(neighbor, end_points)
+        Start points that share a region of pathable space share its ideal tile and distance field,
+        so the cost is one flood per region rather than one per start point.
 
-                if current_idealness > best_idealness:
-                    best_idealness = current_idealness
-                    most_ideal = neighbor
+        Args:
+            * start_points: The starting locations of the units
+            * end_points: The end points of the units, should be a list of edge locations
+            * game_state: The current game state
 
-                if not self.game_map[x][y].visited_idealness and not self.game_map[x][y].blocked:
-                    self.game_map[x][y].visited_idealness = True
-                    current.put(neighbor)
+        Returns:
+            A list holding the path for each start point, in the same order as start_points.
+            Start points that are blocked or out of bounds get None instead of a path.
 
-        return most_ideal
+        """
+        self.initialize_map(game_state)
+        table = endpoint_table(end_points)
+        in_arena_bounds = game_state.game_map.in_arena_bounds
+        return [self.regions.path(list(start), table) if in_arena_bounds(start) else None for start in start_points]
 
     def _get_neighbors(self, location):
         """Get the locations adjacent to a location
@@ -125,14 +480,7 @@ class ShortestPathFinder:
             A direction [x,y] representing the edge. For example, [1,1] for the top right and [-1, 1] for the top left
 
         """
-        point = end_points[0]
-        x, y = point
-        direction = [1, 1]
-        if x < self.game_state.HALF_ARENA:
-           direction[0] = -1
-        if y < self.game_state.HALF_ARENA:
-            direction[1] = -1
-        return direction
+        return list(endpoint_table(end_points).direction)
 
     def _get_idealness(self, location, end_points):
         """Get the idealness of a tile, the reachable tile the unit most wants to path to.
@@ -141,167 +489,21 @@ class ShortestPathFinder:
         Returns:
             A location the unit will attempt to reach
         """
-        if location in end_points:
-            return sys.maxsize
-
-        direction = self._get_direction_from_endpoints(end_points)
-
-        idealness = 0
-        if direction[1] == 1:
-            idealness += 28 * location[1]
-        else: 
-            idealness += 28 * (27 - location[1])
-        if direction[0] == 1:
-            idealness += location[0]
-        else: 
-            idealness += (27 - location[0])
-
-        return idealness
-
-    def _validate(self, ideal_tile, end_points):
-        """Breadth first search of the grid, setting the pathlengths of each node
-
-        """
-        #VALIDATION
-        #Add our most ideal tiles to current
-        current = queue.Queue()
-        if ideal_tile in end_points:
-            for location in end_points:
-               current.put(location)
-               #Set current pathlength to 0
-               self.game_map[location[0]][location[1]].pathlength = 0
-               self.game_map[location[0]][location[1]].visited_validate = True
-        else:
-            current.put(ideal_tile)
-            self.game_map[ideal_tile[0]][ideal_tile[1]].pathlength = 0
-            self.game_map[ideal_tile[0]][ideal_tile[1]].visited_validate = True
-
-        #While current is not empty
-        while not current.empty():
-            current_location = current.get()
-            current_node = self.game_map[current_location[0]][current_location[1]]
-            for neighbor in self._get_neighbors(current_location):
-                if not self.game_state.game_map.in_arena_bounds(neighbor) or self.game_map[neighbor[0]][neighbor[1]].blocked:
-                    continue
-
-                neighbor_node = self.game_map[neighbor[0]][neighbor[1]]
-                if not neighbor_node.visited_validate and not current_node.blocked:
-                    neighbor_node.pathlength = current_node.pathlength + 1
-                    neighbor_node.visited_validate = True
-                    current.put(neighbor)
-
-        #debug_write("Print after validate")
-        #self.print_map()
-        return
-
-    def _get_path(self, start_point, end_points):
-        """Once all nodes are validated, and a target is found, the unit can path to its target
-
-        """
-        #GET THE PATH
-        path = [start_point]
-        current = start_point
-        move_direction = 0
-
-        while not self.game_map[current[0]][current[1]].pathlength == 0:
-            #debug_write("current tile {} has cost {}".format(current, self.game_map[current[0]][current[1]].pathlength))
-            next_move = self._choose_next_move(current, move_direction, end_points)
-            #debug_write(next_move)
-
-            if current[0] == next_move[0]:
-                move_direction = self.VERTICAL
-            else:
-                move_direction = self.HORIZONTAL
-            path.append(next_move)
-            current = next_move
-        
-        #debug_write(path)
-        return path
-  
-    def _choose_next_move(self, current_point, previous_move_direction, end_points):
-        """Given the current location and adjacent locations, return the best 'next step' for a given unit to take
-        """
-        neighbors = self._get_neighbors(current_point)
-        #debug_write("Unit at {} previously moved {} and has these neighbors {}".format(current_point, previous_move_direction, neighbors))
-
-        ideal_neighbor = current_point
-        best_pathlength = self.game_map[current_point[0]][current_point[1]].pathlength
-        for neighbor in neighbors:
-            #debug_write("Comparing champ {} and contender {}".format(ideal_neighbor, neighbor))
-            if not self.game_state.game_map.in_arena_bounds(neighbor) or self.game_map[neighbor[0]][neighbor[1]].blocked:
-                continue
-
-            new_best = False
-            x, y = neighbor
-            current_pathlength = self.game_map[x][y].pathlength
-
-            #Filter by pathlength
-            if current_pathlength > best_pathlength:
-                continue
-            elif current_pathlength < best_pathlength:
-                #debug_write("Contender has better pathlength at {} vs champs {}".format(current_pathlength, best_pathlength))
-                new_best = True
-
-            #Filter by direction based on prev move
-            if not new_best and not self._better_direction(current_point, neighbor, ideal_neighbor, previous_move_direction, end_points):
-                continue
-
-            ideal_neighbor = neighbor
-            best_pathlength = current_pathlength
-
-        #debug_write("Gave unit at {} new tile {}".format(current_point, ideal_neighbor))
-        return ideal_neighbor
-
-    def _better_direction(self, prev_tile, new_tile, prev_best, previous_move_direction, end_points):
-        """Compare two tiles and return True if the unit would rather move to the new one
-
-        """
-        #True if we are moving in a different direction than prev move and prev is not
-        #If we previously moved horizontal, and now one of our options has a different x position then the other (the two options are not up/down)
-        if previous_move_direction == self.HORIZONTAL and not new_tile[0] == prev_best[0]:
-            #We want to go up now. If we have not changed our y, we are not going up
-            if prev_tile[1] == new_tile[1]:
-                return False 
-            return True
-        if previous_move_direction == self.VERTICAL and not new_tile[1] == prev_best[1]:
-            if prev_tile[0] == new_tile[0]:
-                #debug_write("contender {} has the same x coord as prev tile {} so we will keep best move {}".format(new_tile, prev_tile, prev_best))
-                return False
-            return True
-        if previous_move_direction == 0: 
-            if prev_tile[1] == new_tile[1]: 
-                return False
-            return True
-        
-        #To make it here, both moves are on the same axis 
-        direction = self._get_direction_from_endpoints(end_points)
-        if new_tile[1] == prev_best[1]: #If they both moved horizontal...
-            if direction[0] == 1 and new_tile[0] > prev_best[0]: #If we moved right and right is our direction, we moved towards our direction
-                return True 
-            if direction[0] == -1 and new_tile[0] < prev_best[0]: #If we moved left and left is our direction, we moved towards our direction
-                return True 
-            return False 
-        if new_tile[0] == prev_best[0]: #If they both moved vertical...
-            if direction[1] == 1 and new_tile[1] > prev_best[1]: #If we moved up and up is our direction, we moved towards our direction
-                return True
-            if direction[1] == -1 and new_tile[1] < prev_best[1]: #If we moved down and down is our direction, we moved towards our direction
-                return True
-            return False
-        return True
+        return endpoint_table(end_points).idealness[cell_index(location)]
 
     def print_map(self):
-        """Prints an ASCII version of the current game map for debug purposes
+        """Prints an ASCII version of the distance field used by the last path for debug purposes
 
         """
-        if not self.initialized:
-            debug_write("Attempted to print_map before pathfinder initialization. Use 'this_object.initialize_map(game_state)' to initialize the map first")
+        if not self.initialized or self._last_field is None:
+            debug_write("Attempted to print_map before pathfinder initialization. Use 'this_object.navigate_multiple_endpoints(...)' to path first")
             return
 
         for y in range(28):
             for x in range(28):
-                node = self.game_map[x][28 - y - 1]
-                if not node.blocked and not node.pathlength == -1:
-                    self._print_justified(node.pathlength)
+                index = (28 - y - 1) * ARENA_SIZE + x
+                if not self.regions.blocked[index] and not self._last_field[index] == -1:
+                    self._print_justified(self._last_field[index])
                 else:
                     sys.stderr.write("   ")
             debug_write("")
@@ -314,3 +516,25 @@ class ShortestPathFinder:
             sys.stderr.write(" ")
         sys.stderr.write(str(number))
         sys.stderr.write(" ")
+
+
+def get_path_regions(game_state):
+    """Gets the PathRegions of a game state's structure layout, shared through its query cache
+
+    Args:
+        game_state: The game state whose structures block pathing
+
+    Returns:
+        The PathRegions for the current structures
+
+    """
+    game_map = game_state.game_map
+    key = ("path_regions", game_map.structure_hash)
+    regions = game_state.query_cache.get(key)
+    if regions is None:
+        blocked = bytearray(CELL_COUNT)
+        for x, y in game_map.structure_locations():
+            blocked[y * ARENA_SIZE + x] = 1
+        regions = PathRegions(blocked)
+        game_state.query_cache.put(key, regions)
+    return regions
@@ -0,0 +1,215 @@
+import hashlib
+import json
+import mmap
+import os
+import struct
+
+from .game_map import ARENA_SIZE, CELL_COUNT
+from .util import debug_write
+
+# Bump whenever the layout or the contents of a table change, so older files are rebuilt
+_VERSION = 3
+_MAGIC = b"GLPC"
+# Magic, version, config key, number of sections
+_HEADER = struct.Struct("<4sH32sH")
+# Section name, offset and length in bytes
+_SECTION = struct.Struct("<32sQQ")
+_MASK_BYTES = (CELL_COUNT + 7) // 8
+# The cache whose range masks standoff.range_masks reads, see PrecomputeCache.install
+_installed = None
+
+
+def config_key(config):
+    """A digest of everything the precomputed tables depend on: the unit information and the arena size
+    """
+    text = json.dumps([config["unitInformation"], ARENA_SIZE], sort_keys=True)
+    return hashlib.sha256(text.encode("utf-8")).digest()
+
+
+def _radii(config):
+    """Every distinct range used by a unit of the config, upgraded or not
+    """
+    radii = set()
+    for unit_info in config["unitInformation"]:
+        for info in (unit_info, unit_info.get("upgrade", {})):
+            for name in ("attackRange", "shieldRange", "selfDestructRange"):
+                if info.get(name, 0) > 0:
+                    radii.add(float(info[name]))
+    return sorted(radii)
+
+
+def _build_sections(config):
+    """Computes every table, as a list of (name, bytes)
+    """
+    # standoff is only needed to build a missing file, so it is not imported with gamelib
+    from .standoff import range_masks
+    hit_radius = config["unitInformation"][0].get("getHitRadius", 0)
+    sections = []
+    for radius in _radii(config):
+        masks = range_masks(radius, hit_radius)
+        sections.append(("range:{!r}".format(radius), b"".join(mask.to_bytes(_MASK_BYTES, "little") for mask in masks)))
+    return sections
+
+
+def _encode(key, sections):
+    table_size = _HEADER.size + _SECTION.size * len(sections)
+    parts = [_HEADER.pack(_MAGIC, _VERSION, key, len(sections))]
+    offset = table_size
+    for name, data in sections:
+        parts.append(_SECTION.pack(name.encode("ascii"), offset, len(data)))
+        offset += len(data)
+    parts.extend(data for _, data in sections)
+    return b"".join(parts)
+
+
+def _decode(buffer, key):
+    """Maps section names to (offset, length), or returns None if the buffer is not a valid file for the key
+    """
+    if len(buffer) < _HEADER.size:
+        return None
+    magic, version, file_key, count = _HEADER.unpack_from(buffer, 0)
+    if magic != _MAGIC or version != _VERSION or file_key != key:
+        return None
+    if len(buffer) < _HEADER.size + _SECTION.size * count:
+        return None
+    sections = {}
+    for number in range(count):
+        name, offset, length = _SECTION.unpack_from(buffer, _HEADER.size + _SECTION.size * number)
+        if offset + length > len(buffer):
+            return None
+        sections[name.rstrip(b"\0").decode("ascii")] = (offset, length)
+    return sections
+
+
+class PrecomputeCache:
+    """Tables that depend only on the game config, kept in a memory mapped file in the algo folder.
+
+    The file is named after a hash of config["unitInformation"] and the arena size, and holds a
+    version number so a changed table layout is never read by mistake. The first game with a config
+    computes the tables and writes the file atomically; every later game maps it, so startup does not
+    grow with the amount of precomputed data. Tables are read straight from the mapping and decoded
+    only when asked for. If the folder cannot be written, the tables are computed and kept in memory.
+
+    The cached tables are the range masks of every range in the config, see range_masks.
+
+    Attributes :
+        * path (str): The cache file, or None if the tables are only kept in memory
+        * key (bytes): The config digest the tables were built for
+        * loaded (bool): True if the tables were read from an existing file rather than computed
+
+    """
+    def __init__(self, config, directory=None):
+        """Maps the cache file for the config, building it first if it is missing or stale
+
+        Args:
+            * config: The game config
+            * directory: The folder holding the file. If None, the algo folder that contains gamelib.
+
+        """
+        if directory is None:
+            directory = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+        self.key = config_key(config)
+        self.path = os.path.join(directory, "precompute_{}.bin".format(self.key.hex()[:16]))
+        self.loaded = False
+        self._config = config
+        self._mmap = None
+        self._buffer = None
+        self._sections = None
+        self._masks = {}
+
+        if self._map():
+            self.loaded = True
+            return
+        data = _encode(self.key, _build_sections(config))
+        try:
+            self._write(directory, data)
+        except OSError as error:
+            debug_write("Could not write the precompute cache {}: {}".format(self.path, error))
+        if not self._map():
+            self.path = None
+            self._buffer = memoryview(data)
+            self._sections = _decode(self._buffer, self.key)
+
+    def _map(self):
+        try:
+            with open(self.path, "rb") as file:
+                mapping = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+        except (OSError, ValueError):
+            return False
+        buffer = memoryview(mapping)
+        sections = _decode(buffer, self.key)
+        if sections is None:
+            buffer.release()
+            mapping.close()
+            return False
+        self._mmap, self._buffer, self._sections = mapping, buffer, sections
+        return True
+
+    def _write(self, directory, data):
+        # Written to a temporary file and renamed, so concurrent games never map a partial file.
+        # tempfile is only needed on the first game with a config, so it is not imported at startup.
+        import tempfile
+        handle, temporary = tempfile.mkstemp(prefix=".precompute_", dir=directory)
+        try:
+            with os.fdopen(handle, "wb") as file:
+                file.write(data)
+            os.replace(temporary, self.path)
+        except OSError:
+            try:
+                os.unlink(temporary)
+            except OSError:
+                pass
+            raise
+
+    def section(self, name):
+        """The raw bytes of a table as a memoryview, or None if the table is not cached
+        """
+        entry = self._sections.get(name)
+        if entry is None:
+            return None
+        offset, length = entry
+        return self._buffer[offset:offset + length]
+
+    def cached_range_masks(self, radius, hit_radius):
+        """The range masks of a radius decoded from the file, the first time they are asked for, or None if they are not cached
+        """
+        key = (radius, hit_radius)
+        masks = self._masks.get(key)
+        if masks is None:
+            data = self.section("range:{!r}".format(float(radius)))
+            if data is None or hit_radius != self._config["unitInformation"][0].get("getHitRadius", 0):
+                return None
+            masks = self._masks[key] = tuple(int.from_bytes(data[cell * _MASK_BYTES:(cell + 1) * _MASK_BYTES], "little") for cell in range(CELL_COUNT))
+        return masks
+
+    def range_masks(self, radius, hit_radius=None):
+        """The range masks of a radius, as range_masks returns them. Decoded from the file the first time,
+        or computed if the radius is not one of the config's ranges.
+        """
+        if hit_radius is None:
+            hit_radius = self._config["unitInformation"][0].get("getHitRadius", 0)
+        masks = self.cached_range_masks(radius, hit_radius)
+        if masks is None:
+            from .standoff import range_masks
+            masks = range_masks(radius, hit_radius)
+        return masks
+
+    def install(self):
+        """Makes range_masks read the cached masks, so nothing is recomputed during the game.
+        Nothing is decoded here: each radius is decoded the first time range_masks misses it.
+        """
+        global _installed
+        _installed = self
+        return self
+
+
+def cached_range_masks(radius, hit_radius):
+    """The range masks of a radius from the installed precompute cache, or None if there is none or it does not hold them
+    """
+    return _installed.cached_range_masks(radius, hit_radius) if _installed is not None else None
+
+
+def load_precompute(config, directory=None):
+    """Maps or builds the precompute cache for the config and installs its tables. Called by AlgoCore before on_game_start.
+    """
+    return PrecomputeCache(config, directory).install()
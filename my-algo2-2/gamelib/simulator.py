@@ -0,0 +1,255 @@
+import math
+
+from .game_map import ARENA_SIZE, CELL_COUNT, cell_index
+from .navigation import endpoint_table, get_path_regions
+from .unit import GameUnit
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+# Weights that fold a lexicographic targeting key into one float: the static rank of a target
+# is worth more than any health, and any health difference is worth more than the static tie break
+_RANK_WEIGHT = 1e9
+_HEALTH_WEIGHT = 1e3
+
+
+def _require_numpy():
+    if np is None:
+        raise ImportError("BatchSimulator requires numpy, which is not installed. Use predict_wave to simulate one plan at a time.")
+
+
+class BatchResult:
+    """The outcome of every scenario run by a BatchSimulator, one entry per plan
+
+    Attributes :
+        * breaches (ndarray): The number of units that reached their target edge
+        * structure_damage (ndarray): The damage dealt to the defending structures
+        * structures_destroyed (ndarray): The number of defending structures destroyed
+        * units_lost (ndarray): The number of units destroyed by turrets or by self destructing
+        * structure_health (ndarray): The health left in each defending structure, shape (plans, structures)
+        * frames (int): The number of frames simulated
+
+    """
+    def __init__(self, breaches, structure_damage, structures_destroyed, units_lost, structure_health, frames):
+        self.breaches = breaches
+        self.structure_damage = structure_damage
+        self.structures_destroyed = structures_destroyed
+        self.units_lost = units_lost
+        self.structure_health = structure_health
+        self.frames = frames
+
+    def best(self, breach_weight=1.0, damage_weight=0.0):
+        """The index of the plan with the highest breach_weight * breaches + damage_weight * structure damage
+        """
+        return int(np.argmax(breach_weight * self.breaches + damage_weight * self.structure_damage))
+
+
+class BatchSimulator:
+    """Simulates many deploy plans on the same board at once.
+
+    Every plan is a scenario, and the stacks of all scenarios are stored as stacked NumPy arrays of
+    path positions, healths and alive masks, shape (plans, stacks). All scenarios are stepped frame by
+    frame together, so the cost of a frame grows with the array width rather than with Python loops.
+    The structure layout, the paths and the range and targeting tables are built once per simulator
+    and shared by every scenario and every call to run.
+
+    The mechanics follow predict_wave: stacks move at their speed, attack the defending structure in range
+    with the best targeting key, self destruct at the end of a blocked path, and defending turrets fire on
+    the nearest stack. Unlike predict_wave, paths are fixed at the start: destroyed structures do not
+    open new routes. Shields and defending mobile units are ignored.
+
+    Attributes :
+        * player_index (int): The player deploying the plans, 0 for you 1 for the enemy
+        * structure_locations (list): The (x, y) of each defending structure, in the order of the structure arrays
+
+    """
+    def __init__(self, game_state, player_index=0):
+        _require_numpy()
+        self.player_index = player_index
+        self._game_state = game_state
+        game_map = game_state.game_map
+        config = game_state.config
+        self._config = config
+        self._hit_radius = config["unitInformation"][0]["getHitRadius"]
+        self._regions = get_path_regions(game_state)
+
+        structures = []
+        for x, y in game_map.structure_locations(1 - player_index):
+            for unit in game_map[x, y]:
+                if unit.stationary:
+                    structures.append((x, y, unit))
+        structures.sort(key=lambda entry: cell_index(entry[:2]))
+        self.structure_locations = [(x, y) for x, y, _ in structures]
+        self._structure_health = np.array([unit.health for _, _, unit in structures], dtype=float)
+        cells = np.arange(CELL_COUNT)
+        cell_x, cell_y = cells % ARENA_SIZE, cells // ARENA_SIZE
+        structure_x = np.array([x for x, _, _ in structures], dtype=float)
+        structure_y = np.array([y for _, y, _ in structures], dtype=float)
+        # Distance from every cell to every structure, shape (cells, structures)
+        self._distance = np.sqrt((cell_x[:, None] - structure_x[None, :]) ** 2 + (cell_y[:, None] - structure_y[None, :]) ** 2)
+        height = structure_y if player_index == 0 else -structure_y
+        x_distance = np.abs(game_map.HALF_ARENA - 0.5 - structure_x)
+        # Ties after distance and health: lowest height first, then furthest from the center
+        tie_break = np.lexsort((-x_distance, height)).argsort() if structures else np.zeros(0)
+        self._tie_break = tie_break.astype(float)
+
+        turrets = [index for index, (_, _, unit) in enumerate(structures) if unit.damage_i > 0]
+        self._turrets = np.array(turrets, dtype=int)
+        self._turret_damage = np.array([structures[index][2].damage_i for index in turrets], dtype=float)
+        turret_range = np.array([structures[index][2].attackRange for index in turrets], dtype=float)
+        # Whether each turret reaches each cell, and the distance, shape (turrets, cells)
+        self._turret_distance = self._distance[:, self._turrets].T
+        self._turret_reach = self._turret_distance <= turret_range[:, None]
+
+        self._types = []
+        self._type_tables = []
+        self._paths = {}
+        self._path_cells = []
+        self._path_ends_on_edge = []
+
+    def _type_index(self, unit_type):
+        """Builds the per unit type tables the first time a type is used: reach, targeting ranks and blast masks
+        """
+        if unit_type in self._types:
+            return self._types.index(unit_type)
+        unit = GameUnit(unit_type, self._config, self.player_index)
+        unit_def = next(entry for entry in self._config["unitInformation"] if entry.get("shorthand") == unit_type)
+        reach = self._distance < unit.attackRange + self._hit_radius
+        # Rank of each structure's distance among the distinct distances, so equal distances tie exactly
+        distances, rank = np.unique(np.round(self._distance, 9), return_inverse=True)
+        rank = rank.reshape(self._distance.shape)
+        static_key = np.where(reach, rank * _RANK_WEIGHT + self._tie_break[None, :], np.inf)
+        if not unit.damage_f:
+            static_key[:] = np.inf
+        blast = self._distance < unit_def.get("selfDestructRange", 0) + self._hit_radius
+        self._types.append(unit_type)
+        self._type_tables.append({
+            "unit": unit,
+            "frames_per_move": max(1, round(1 / unit.speed)) if unit.speed else 0,
+            "static_key": static_key,
+            "blast": blast,
+            "blast_damage": unit_def.get("selfDestructDamageTower", 0),
+            "blast_steps": unit_def.get("selfDestructStepsRequired", 0),
+        })
+        return len(self._types) - 1
+
+    def _path_index(self, location):
+        """Paths are computed once per spawn location and shared by every scenario
+        """
+        location = (location[0], location[1])
+        if location not in self._paths:
+            game_map = self._game_state.game_map
+            table = endpoint_table(game_map.get_edge_locations(self._game_state.get_target_edge(location)))
+            path = self._regions.path(list(location), table)
+            if path is None:
+                self._paths[location] = -1
+            else:
+                self._paths[location] = len(self._path_cells)
+                self._path_cells.append([cell_index(step) for step in path])
+                self._path_ends_on_edge.append(bool(table.is_end_point[cell_index(path[-1])]))
+        return self._paths[location]
+
+    def run(self, plans, max_frames=200):
+        """Simulates every plan at once
+
+        Args:
+            * plans: A list of plans, each a list of (unit_type, [x, y], count) entries
+            * max_frames: The number of frames to simulate at most
+
+        Returns:
+            A BatchResult
+
+        """
+        plan_count = len(plans)
+        stack_count = max([len(plan) for plan in plans] + [1])
+        structure_count = len(self.structure_locations)
+        path_index = np.full((plan_count, stack_count), -1, dtype=int)
+        type_index = np.zeros((plan_count, stack_count), dtype=int)
+        count = np.zeros((plan_count, stack_count), dtype=int)
+        for plan_number, plan in enumerate(plans):
+            for stack_number, (unit_type, location, units) in enumerate(plan):
+                type_index[plan_number, stack_number] = self._type_index(unit_type)
+                path_index[plan_number, stack_number] = self._path_index(location)
+                count[plan_number, stack_number] = units
+
+        longest = max([len(cells) for cells in self._path_cells] + [1])
+        path_cells = np.zeros((len(self._path_cells) + 1, longest), dtype=int)
+        path_length = np.ones(len(self._path_cells) + 1, dtype=int)
+        for index, cells in enumerate(self._path_cells):
+            path_cells[index, :len(cells)] = cells
+            path_cells[index, len(cells):] = cells[-1]
+            path_length[index] = len(cells)
+        ends_on_edge = np.array(self._path_ends_on_edge + [False], dtype=bool)
+
+        tables = self._type_tables
+        max_health = np.array([table["unit"].max_health for table in tables])[type_index]
+        damage = np.array([table["unit"].damage_f for table in tables], dtype=float)[type_index]
+        frames_per_move = np.array([table["frames_per_move"] for table in tables])[type_index]
+        blast_damage = np.array([table["blast_damage"] for table in tables], dtype=float)[type_index]
+        blast_steps = np.array([table["blast_steps"] for table in tables])[type_index]
+        static_keys = np.stack([table["static_key"] for table in tables])
+        blasts = np.stack([table["blast"] for table in tables])
+
+        alive = (path_index >= 0) & (count > 0) & (frames_per_move > 0)
+        health = max_health * count
+        step = np.zeros((plan_count, stack_count), dtype=int)
+        breaches = np.zeros(plan_count)
+        units_lost = np.zeros(plan_count)
+        structure_health = np.tile(self._structure_health, (plan_count, 1))
+        structure_damage = np.zeros(plan_count)
+        plans_axis = np.arange(plan_count)[:, None].repeat(stack_count, axis=1)
+
+        frame = 0
+        while frame < max_frames and alive.any():
+            frame += 1
+            # Movement
+            moving = alive & (frame % np.maximum(frames_per_move, 1) == 0)
+            at_end = step >= path_length[path_index] - 1
+            exploding = moving & at_end
+            step = np.where(moving & ~at_end, step + 1, step)
+            cells = path_cells[path_index, step]
+            scored = moving & ~at_end & (step == path_length[path_index] - 1) & ends_on_edge[path_index]
+            breaches += (count * scored).sum(axis=1)
+            alive &= ~scored
+            if exploding.any():
+                detonating = exploding & (step >= blast_steps)
+                blast = blasts[type_index, cells] & detonating[:, :, None]
+                blast_total = (blast * (blast_damage * count)[:, :, None]).sum(axis=1)
+                dealt = np.minimum(blast_total, np.maximum(structure_health, 0))
+                structure_damage += dealt.sum(axis=1)
+                structure_health -= blast_total
+                units_lost += (count * exploding).sum(axis=1)
+                alive &= ~exploding
+            structure_alive = structure_health > 0
+
+            # The stacks attack the defending structures
+            if structure_count:
+                keys = static_keys[type_index, cells] + _HEALTH_WEIGHT * structure_health[:, None, :]
+                keys = np.where(structure_alive[:, None, :], keys, np.inf)
+                target = keys.argmin(axis=2)
+                attacking = alive & np.isfinite(keys.min(axis=2))
+                hits = np.zeros((plan_count, structure_count))
+                np.add.at(hits, (plans_axis[attacking], target[attacking]), (damage * np.ceil(health / max_health))[attacking])
+                dealt = np.minimum(hits, np.maximum(structure_health, 0))
+                structure_damage += dealt.sum(axis=1)
+                structure_health -= hits
+                structure_alive = structure_health > 0
+
+            # The defending turrets attack the stacks
+            if len(self._turrets):
+                reach = self._turret_reach[:, cells].transpose(1, 0, 2) & alive[:, None, :] & structure_alive[:, self._turrets][:, :, None]
+                keys = np.where(reach, self._turret_distance[:, cells].transpose(1, 0, 2) * _RANK_WEIGHT + health[:, None, :], np.inf)
+                target = keys.argmin(axis=2)
+                firing = reach.any(axis=2)
+                taken = np.zeros((plan_count, stack_count))
+                turret_plans = np.arange(plan_count)[:, None].repeat(len(self._turrets), axis=1)
+                np.add.at(taken, (turret_plans[firing], target[firing]), np.broadcast_to(self._turret_damage, firing.shape)[firing])
+                health = health - taken
+                survivors = np.where(health > 0, np.ceil(np.maximum(health, 0) / max_health), 0).astype(int)
+                units_lost += ((count - survivors) * alive).sum(axis=1)
+                count = np.where(alive, survivors, count)
+                alive &= health > 0
+
+        return BatchResult(breaches, structure_damage, (structure_health <= 0).sum(axis=1), units_lost, structure_health, frame)
@@ -0,0 +1,169 @@
+import math
+
+from .game_map import ARENA_SIZE, CELL_COUNT, ARENA_CELLS, cell_index, range_offsets
+from .navigation import endpoint_table, get_path_regions
+from .unit import GameUnit
+from .precompute import cached_range_masks
+
+# The cells in range of every cell, as bitmasks over cell indices, by (radius, hit radius)
+_RANGE_MASKS = {}
+
+try:
+    _popcount = int.bit_count
+except AttributeError:
+    def _popcount(mask):
+        return bin(mask).count("1")
+
+
+def range_masks(radius, hit_radius):
+    """Gets a bitmask of the cells in range of each cell, indexed by cell index.
+    Bit i of a mask is set if cell i is on the board and in range. Range is symmetric, so the
+    mask of a cell also holds every cell whose units can reach it with the same range.
+    Masks are built once per radius and shared, or read from the installed PrecomputeCache when it holds them.
+    """
+    key = (radius, hit_radius)
+    masks = _RANGE_MASKS.get(key)
+    if masks is None:
+        masks = cached_range_masks(radius, hit_radius)
+        if masks is not None:
+            _RANGE_MASKS[key] = masks
+            return masks
+        offsets = range_offsets(radius, hit_radius)
+        on_board = 0
+        for cell in ARENA_CELLS:
+            on_board |= 1 << cell
+        masks = [0] * CELL_COUNT
+        for cell in ARENA_CELLS:
+            x, y = cell % ARENA_SIZE, cell // ARENA_SIZE
+            mask = 0
+            for dx, dy, _ in offsets:
+                if 0 <= x + dx < ARENA_SIZE and 0 <= y + dy < ARENA_SIZE:
+                    mask |= 1 << ((y + dy) * ARENA_SIZE + x + dx)
+            masks[cell] = mask & on_board
+        masks = _RANGE_MASKS[key] = tuple(masks)
+    return masks
+
+
+def mask_cells(mask):
+    """The cell indices of the set bits of a mask, lowest first
+    """
+    cells = []
+    while mask:
+        low_bit = mask & -mask
+        cells.append(low_bit.bit_length() - 1)
+        mask ^= low_bit
+    return cells
+
+
+class StandoffOption:
+    """The predicted outcome of sending one stack of demolishers from a spawn location
+
+    Attributes :
+        * spawn_location (list): Where the stack is spawned
+        * path (list): The path the stack takes
+        * standoff_cells (list): The [x, y] cells of the path where the stack can hit enemy structures while no turret can hit it
+        * exposure (float): The turret damage the stack takes along its path, until it is destroyed
+        * expected_damage (float): The damage the stack deals to enemy structures, capped by their health
+        * survivors (int): The number of units left at the end of the path
+        * targets (list): The (x, y) of the enemy structures the stack can hit from its path
+
+    """
+    def __init__(self, spawn_location, path):
+        self.spawn_location = [spawn_location[0], spawn_location[1]]
+        self.path = path
+        self.standoff_cells = []
+        self.exposure = 0
+        self.expected_damage = 0
+        self.survivors = 0
+        self.targets = []
+
+
+def plan_standoffs(game_state, count=1, player_index=0, unit_type=None, spawn_locations=None):
+    """Ranks spawn locations for a stack of demolishers by the structure damage they are expected to deal.
+
+    The enemy structures and turrets are stored as bitmasks over cell indices. For each cell of a path,
+    the structures in reach are the cell's range mask ANDed with the structure mask, and the turrets
+    firing at it are counted by ANDing its mask with the mask of each group of turrets sharing a range.
+    The stack deals its damage every frame it spends on a cell and loses units as turret fire adds up.
+    Shields, enemy mobile units and re-pathing after a structure is destroyed are ignored, see predict_wave for those.
+
+    Args:
+        * game_state: The GameState to plan on
+        * count: The number of units in the stack
+        * player_index: The player spawning the stack, 0 for you 1 for the enemy
+        * unit_type: The mobile unit type, the demolisher if None
+        * spawn_locations: The locations to consider. If None, every open location on the player's spawn edges.
+
+    Returns:
+        A list of StandoffOption, best first: highest expected damage, then least exposure
+
+    """
+    game_map = game_state.game_map
+    config = game_state.config
+    if unit_type is None:
+        unit_type = config["unitInformation"][4]["shorthand"]
+    unit = GameUnit(unit_type, config, player_index)
+    hit_radius = config["unitInformation"][0]["getHitRadius"]
+    regions = get_path_regions(game_state)
+    if spawn_locations is None:
+        if player_index == 0:
+            edges = [game_map.BOTTOM_LEFT, game_map.BOTTOM_RIGHT]
+        else:
+            edges = [game_map.TOP_LEFT, game_map.TOP_RIGHT]
+        spawn_locations = [location for edge in edges for location in game_map.get_edge_locations(edge)]
+
+    structure_mask = 0
+    health = {}
+    turret_groups = {}
+    for x, y in game_map.structure_locations(1 - player_index):
+        for structure in game_map[x, y]:
+            if not structure.stationary:
+                continue
+            cell = cell_index([x, y])
+            structure_mask |= 1 << cell
+            health[cell] = structure.health
+            if structure.damage_i > 0:
+                group = (structure.attackRange, structure.damage_i)
+                turret_groups[group] = turret_groups.get(group, 0) | (1 << cell)
+    reach_masks = range_masks(unit.attackRange, hit_radius)
+    turret_masks = [(range_masks(attack_range, hit_radius), damage, mask) for (attack_range, damage), mask in turret_groups.items()]
+    frames_per_move = max(1, round(1 / unit.speed)) if unit.speed else 1
+
+    options = []
+    for location in spawn_locations:
+        if regions.region_of(location) == -1:
+            continue
+        table = endpoint_table(game_map.get_edge_locations(game_state.get_target_edge(location)))
+        option = StandoffOption(location, regions.path(location, table))
+        remaining = dict(health)
+        pool = unit.max_health * count
+        reached = 0
+        for x, y in option.path:
+            cell = y * ARENA_SIZE + x
+            in_reach = reach_masks[cell] & structure_mask
+            fire = 0
+            for masks, damage, mask in turret_masks:
+                fire += _popcount(masks[cell] & mask) * damage
+            if in_reach and not fire:
+                option.standoff_cells.append([x, y])
+            reached |= in_reach
+            # Damage is dealt to the structures in reach, lowest cell index first, every frame spent on the cell
+            budget = unit.damage_f * math.ceil(pool / unit.max_health) * frames_per_move
+            for target in mask_cells(in_reach):
+                if budget <= 0:
+                    break
+                dealt = min(budget, remaining[target])
+                if dealt > 0:
+                    remaining[target] -= dealt
+                    budget -= dealt
+                    option.expected_damage += dealt
+            taken = min(fire * frames_per_move, pool)
+            option.exposure += taken
+            pool -= taken
+            if pool <= 0:
+                break
+        option.survivors = max(0, math.ceil(pool / unit.max_health))
+        option.targets = [(cell % ARENA_SIZE, cell // ARENA_SIZE) for cell in mask_cells(reached)]
+        options.append(option)
+    options.sort(key=lambda option: (-option.expected_damage, option.exposure))
+    return options
@@ -1,7 +1,263 @@
 import unittest
+import io
+import os
+import tempfile
 import json
+import queue
+import random
+import subprocess
+import sys
+import socket
+import time
 from .game_state import GameState
 from .unit import GameUnit
+from .cache import QueryCache
+from .game_map import GameMap, ARENA_SIZE, IN_ARENA, NEIGHBORS, cell_index, cell_location
+from .chokepoints import _cut_cells
+from .standoff import range_masks
+from .workers import WorkerPool, _read_snapshot
+from .simulator import BatchSimulator, np
+from .util import Logger, DEBUG, INFO, WARNING
+from . import util as util_module
+from .watchdog import Watchdog
+from .precompute import PrecomputeCache, cached_range_masks
+from . import precompute as precompute_module
+from .algocore import AlgoCore
+from .action_phase import ActionPhaseRecorder
+from .importance import ImportanceIndex, StructureImportance
+from .delta import BoardDelta, BoardSnapshots
+from .history import OpponentHistory, RingBuffer
+from .income import IncomeTable
+from .forecast import AttackPredictor
+from .util import bind_streams
+from . import watchdog as watchdog_module
+from .navigation import PathRegions, descend, endpoint_table, get_path_regions
+
+
+# The starter kit's original queue based path finder, kept unchanged as the reference
+# that ShortestPathFinder must match exactly.
+class ReferenceNode:
+    def __init__(self):
+        self.visited_idealness = False
+        self.visited_validate = False
+        self.blocked = False
+        self.pathlength = -1
+
+class ReferencePathFinder:
+    def __init__(self):
+        self.HORIZONTAL = 1
+        self.VERTICAL = 2
+        self.initialized = False
+
+    def initialize_map(self, game_state):
+        #Initialize map 
+        self.initialized = True
+        self.game_state = game_state
+        self.game_map = [[ReferenceNode() for x in range(self.game_state.ARENA_SIZE)] for y in range(self.game_state.ARENA_SIZE)]
+
+    def navigate_multiple_endpoints(self, start_point, end_points, game_state):
+        if game_state.contains_stationary_unit(start_point):
+            return
+
+        #Initialize map 
+        self.initialize_map(game_state)
+        #Fill in walls
+        for location in self.game_state.game_map:
+            if self.game_state.contains_stationary_unit(location):
+                self.game_map[location[0]][location[1]].blocked = True
+        #Do pathfinding
+        ideal_endpoints = self._idealness_search(start_point, end_points)
+        self._validate(ideal_endpoints, end_points)
+        return self._get_path(start_point, end_points)
+
+    def _idealness_search(self, start, end_points):
+        current = queue.Queue()
+        current.put(start)
+        best_idealness = self._get_idealness(start, end_points)
+        self.game_map[start[0]][start[1]].visited_idealness = True
+        most_ideal = start
+
+        while not current.empty():
+            search_location = current.get()
+            for neighbor in self._get_neighbors(search_location):
+                if not self.game_state.game_map.in_arena_bounds(neighbor) or self.game_map[neighbor[0]][neighbor[1]].blocked:
+                    continue
+
+                x, y = neighbor
+                current_idealness = self._get_idealness(neighbor, end_points)
+
+                if current_idealness > best_idealness:
+                    best_idealness = current_idealness
+                    most_ideal = neighbor
+
+                if not self.game_map[x][y].visited_idealness and not self.game_map[x][y].blocked:
+                    self.game_map[x][y].visited_idealness = True
+                    current.put(neighbor)
+
+        return most_ideal
+
+    def _get_neighbors(self, location):
+        x, y = location
+        return [[x, y + 1], [x, y - 1], [x + 1, y], [x - 1, y]]
+
+    def _get_direction_from_endpoints(self, end_points):
+        point = end_points[0]
+        x, y = point
+        direction = [1, 1]
+        if x < self.game_state.HALF_ARENA:
+           direction[0] = -1
+        if y < self.game_state.HALF_ARENA:
+            direction[1] = -1
+        return direction
+
+    def _get_idealness(self, location, end_points):
+        if location in end_points:
+            return sys.maxsize
+
+        direction = self._get_direction_from_endpoints(end_points)
+
+        idealness = 0
+        if direction[1] == 1:
+            idealness += 28 * location[1]
+        else: 
+            idealness += 28 * (27 - location[1])
+        if direction[0] == 1:
+            idealness += location[0]
+        else: 
+            idealness += (27 - location[0])
+
+        return idealness
+
+    def _validate(self, ideal_tile, end_points):
+        #VALIDATION
+        #Add our most ideal tiles to current
+        current = queue.Queue()
+        if ideal_tile in end_points:
+            for location in end_points:
+               current.put(location)
+               #Set current pathlength to 0
+               self.game_map[location[0]][location[1]].pathlength = 0
+               self.game_map[location[0]][location[1]].visited_validate = True
+        else:
+            current.put(ideal_tile)
+            self.game_map[ideal_tile[0]][ideal_tile[1]].pathlength = 0
+            self.game_map[ideal_tile[0]][ideal_tile[1]].visited_validate = True
+
+        #While current is not empty
+        while not current.empty():
+            current_location = current.get()
+            current_node = self.game_map[current_location[0]][current_location[1]]
+            for neighbor in self._get_neighbors(current_location):
+                if not self.game_state.game_map.in_arena_bounds(neighbor) or self.game_map[neighbor[0]][neighbor[1]].blocked:
+                    continue
+
+                neighbor_node = self.game_map[neighbor[0]][neighbor[1]]
+                if not neighbor_node.visited_validate and not current_node.blocked:
+                    neighbor_node.pathlength = current_node.pathlength + 1
+                    neighbor_node.visited_validate = True
+                    current.put(neighbor)
+
+        return
+
+    def _get_path(self, start_point, end_points):
+        #GET THE PATH
+        path = [start_point]
+        current = start_point
+        move_direction = 0
+
+        while not self.game_map[current[0]][current[1]].pathlength == 0:
+            next_move = self._choose_next_move(current, move_direction, end_points)
+
+            if current[0] == next_move[0]:
+                move_direction = self.VERTICAL
+            else:
+                move_direction = self.HORIZONTAL
+            path.append(next_move)
+            current = next_move
+        
+        return path
+  
+    def _choose_next_move(self, current_point, previous_move_direction, end_points):
+        neighbors = self._get_neighbors(current_point)
+
+        ideal_neighbor = current_point
+        best_pathlength = self.game_map[current_point[0]][current_point[1]].pathlength
+        for neighbor in neighbors:
+            if not self.game_state.game_map.in_arena_bounds(neighbor) or self.game_map[neighbor[0]][neighbor[1]].blocked:
+                continue
+
+            new_best = False
+            x, y = neighbor
+            current_pathlength = self.game_map[x][y].pathlength
+
+            #Filter by pathlength
+            if current_pathlength > best_pathlength:
+                continue
+            elif current_pathlength < best_pathlength:
+                new_best = True
+
+            #Filter by direction based on prev move
+            if not new_best and not self._better_direction(current_point, neighbor, ideal_neighbor, previous_move_direction, end_points):
+                continue
+
+            ideal_neighbor = neighbor
+            best_pathlength = current_pathlength
+
+        return ideal_neighbor
+
+    def _better_direction(self, prev_tile, new_tile, prev_best, previous_move_direction, end_points):
+        #True if we are moving in a different direction than prev move and prev is not
+        #If we previously moved horizontal, and now one of our options has a different x position then the other (the two options are not up/down)
+        if previous_move_direction == self.HORIZONTAL and not new_tile[0] == prev_best[0]:
+            #We want to go up now. If we have not changed our y, we are not going up
+            if prev_tile[1] == new_tile[1]:
+                return False 
+            return True
+        if previous_move_direction == self.VERTICAL and not new_tile[1] == prev_best[1]:
+            if prev_tile[0] == new_tile[0]:
+                return False
+            return True
+        if previous_move_direction == 0: 
+            if prev_tile[1] == new_tile[1]: 
+                return False
+            return True
+        
+        #To make it here, both moves are on the same axis 
+        direction = self._get_direction_from_endpoints(end_points)
+        if new_tile[1] == prev_best[1]: #If they both moved horizontal...
+            if direction[0] == 1 and new_tile[0] > prev_best[0]: #If we moved right and right is our direction, we moved towards our direction
+                return True 
+            if direction[0] == -1 and new_tile[0] < prev_best[0]: #If we moved left and left is our direction, we moved towards our direction
+                return True 
+            return False 
+        if new_tile[0] == prev_best[0]: #If they both moved vertical...
+            if direction[1] == 1 and new_tile[1] > prev_best[1]: #If we moved up and up is our direction, we moved towards our direction
+                return True
+            if direction[1] == -1 and new_tile[1] < prev_best[1]: #If we moved down and down is our direction, we moved towards our direction
+                return True
+            return False
+        return True
+
+
+def count_structures(game_state, player_index):
+    # A worker pool task: it must be defined at module level
+    return len(game_state.game_map.structure_locations(player_index))
+
+def spawn_and_report(game_state, location):
+    # Tasks get a fresh game state, so spawning here does not leak into other tasks
+    print("worker output must not reach stdout")
+    spawned = game_state.attempt_spawn("PI", location)
+    return spawned, len(game_state._deploy_stack), sys.stdout is sys.stderr
+
+def sleep_and_count(game_state, seconds):
+    time.sleep(seconds)
+    return count_structures(game_state, 0)
+
+def fail_on_odd(game_state, number):
+    if number % 2:
+        raise ValueError(number)
+    return number
+
 
 class BasicTests(unittest.TestCase):
 
@@ -275,3 +531,975 @@ class BasicTests(unittest.TestCase):
         actual = game.project_future_MP(turns)
         self.assertAlmostEqual(actual, expected, 0, "Expected {} MP {} turns from now, got {}".format(expected, turns, actual))
 
+
+    def test_predict_spawn_paths(self):
+        game = self.make_turn_0_map()
+        for location in [[10, 17], [11, 17], [12, 17], [15, 17], [16, 17], [17, 17], [13, 20], [14, 20], [8, 8], [20, 9]]:
+            game.game_map.add_unit("FF", location, 1 if location[1] >= game.HALF_ARENA else 0)
+        game.game_map.add_unit("FF", [13, 27], 1)
+
+        for player_index, spawn_edges in [(1, [game.game_map.TOP_LEFT, game.game_map.TOP_RIGHT]), (0, [game.game_map.BOTTOM_LEFT, game.game_map.BOTTOM_RIGHT])]:
+            prediction = game.predict_spawn_paths(player_index)
+            traffic = {}
+            for spawn_edge in spawn_edges:
+                for start in game.game_map.get_edge_locations(spawn_edge):
+                    expected = game.find_path_to_edge(start)
+                    self.assertEqual(expected, prediction.paths.get(tuple(start)), "Predicted path from {} differs from find_path_to_edge".format(start))
+                    for x, y in expected or []:
+                        traffic[x, y] = traffic.get((x, y), 0) + 1
+            self.assertEqual(traffic, prediction.traffic, "Traffic counts do not match the predicted paths")
+
+        self.assertNotIn((13, 27), game.predict_spawn_paths(1).paths, "A blocked spawn location should have no path")
+        self.assertIs(game.predict_spawn_paths(1), game.predict_spawn_paths(1), "Unchanged structures should reuse the prediction")
+        before = game.predict_spawn_paths(1)
+        game.game_map.add_unit("FF", [13, 14], 1)
+        self.assertIsNot(before, game.predict_spawn_paths(1), "New structures should invalidate the prediction")
+
+    def test_board_hashes(self):
+        game = self.make_turn_0_map()
+        game_map = game.game_map
+        self.assertEqual((0, 0), (game_map.structure_hash, game_map.mobile_hash), "An empty map should hash to zero")
+
+        game_map.add_unit("FF", [13, 13], 0)
+        game_map.add_unit("DF", [14, 14], 1)
+        other = self.make_turn_0_map().game_map
+        other.add_unit("DF", [14, 14], 1)
+        other.add_unit("FF", [13, 13], 0)
+        self.assertEqual(game_map.structure_hash, other.structure_hash, "The hash should not depend on placement order")
+
+        other.add_unit("FF", [13, 13], 1)
+        self.assertNotEqual(game_map.structure_hash, other.structure_hash, "The hash should depend on the owner")
+        other.add_unit("FF", [13, 13], 0)
+        other.upgrade_unit([13, 13])
+        self.assertNotEqual(game_map.structure_hash, other.structure_hash, "The hash should depend on upgrades")
+        other.remove_unit([13, 13])
+        other.add_unit("FF", [13, 13], 0)
+        self.assertEqual(game_map.structure_hash, other.structure_hash, "Removing a unit should restore the hash")
+
+        for _ in range(2):
+            game_map.add_unit("PI", [13, 0], 0)
+        self.assertNotEqual(0, game_map.mobile_hash, "Stacked mobile units should not cancel out")
+        structure_hash = game_map.structure_hash
+        game_map.remove_unit([13, 0])
+        self.assertEqual((structure_hash, 0), (game_map.structure_hash, game_map.mobile_hash), "Mobile units should only change the mobile hash")
+
+    def test_board_hash_from_state(self):
+        game = self.make_turn_0_map()
+        parsed = GameState(game.config, """{"p2Units":[[[13,20,75.0,"1"]],[],[[14,20,90.0,"2"]],[],[],[],[],[[14,20,90.0,"3"]]],"turnInfo":[0,1,-1],"p1Stats":[30.0,25.0,5.0,0],"p1Units":[[[13,3,75.0,"4"]],[],[],[],[],[],[],[]],"p2Stats":[30.0,25.0,5.0,0],"events":{}}""")
+        game.game_map.add_unit("FF", [13, 20], 1)
+        game.game_map.add_unit("DF", [14, 20], 1)
+        game.game_map.add_unit("FF", [13, 3], 0)
+        self.assertNotEqual(parsed.game_map.structure_hash, game.game_map.structure_hash, "The parsed turret is upgraded")
+        game.game_map.upgrade_unit([14, 20])
+        self.assertEqual(parsed.game_map.structure_hash, game.game_map.structure_hash, "Parsed and placed boards should hash the same")
+
+    def test_query_cache(self):
+        cache = QueryCache(maxsize=2)
+        cache.put("a", 1)
+        cache.put("b", 2)
+        self.assertEqual(1, cache.get("a"), "Cached value not found")
+        cache.put("c", 3)
+        self.assertNotIn("b", cache, "The least recently used entry should be evicted")
+        self.assertIn("a", cache, "A recently used entry was evicted")
+        self.assertIsNone(cache.get("b"), "Evicted entries should miss")
+        self.assertEqual((1, 1), (cache.hits, cache.misses), "Hits and misses are miscounted")
+
+    def test_query_cache_across_turns(self):
+        cache = QueryCache()
+        first = self.make_turn_0_map()
+        first.query_cache = cache
+        first.game_map.add_unit("DF", [13, 15], 1)
+        first.game_map.add_unit("FF", [12, 14], 1)
+        path = first.find_path_to_edge([13, 0])
+        attackers = first.get_attackers([13, 13], 0)
+        self.assertEqual(0, cache.hits, "Nothing should be cached yet")
+
+        second = self.make_turn_0_map()
+        second.query_cache = cache
+        second.game_map.add_unit("FF", [12, 14], 1)
+        second.game_map.add_unit("DF", [13, 15], 1)
+        self.assertEqual(path, second.find_path_to_edge([13, 0]), "Cached path differs")
+        second_attackers = second.get_attackers([13, 13], 0)
+        self.assertEqual(2, cache.hits, "The same board should hit the cache")
+        self.assertEqual(1, len(second_attackers), "Cached attackers differ")
+        self.assertIs(second.game_map[13, 15][0], second_attackers[0], "Cached attackers should be units of the current map")
+        self.assertIsNot(attackers[0], second_attackers[0], "Cached attackers should be units of the current map")
+
+        second.find_path_to_edge([13, 0])[0][0] = -1
+        self.assertEqual(path, second.find_path_to_edge([13, 0]), "Modifying a returned path should not change the cache")
+        second.game_map.add_unit("FF", [13, 14], 1)
+        misses = cache.misses
+        second.find_path_to_edge([13, 0])
+        self.assertLess(misses, cache.misses, "A changed board should miss the cache")
+
+    def test_query_cache_attackers_stack_order(self):
+        cache = QueryCache()
+        for stack in (["PI", "EI"], ["EI", "PI"]):
+            game = self.make_turn_0_map()
+            game.query_cache = cache
+            for unit_type in stack:
+                game.game_map.add_unit(unit_type, [13, 17], 1)
+            expected = [unit for unit in game.game_map[13, 17]
+                        if game.game_map.distance_between_locations([13, 13], [13, 17]) <= unit.attackRange]
+            attackers = game.get_attackers([13, 13], 0)
+            self.assertEqual(1, len(expected), "Only one of the stacked units should reach")
+            self.assertEqual(len(expected), len(attackers), "Wrong number of attackers for stack {}".format(stack))
+            self.assertIs(expected[0], attackers[0], "Wrong attacker for stack {}".format(stack))
+        self.assertEqual(1, cache.hits, "The second stack order should hit the cache")
+
+    def test_map_iteration(self):
+        game = self.make_turn_0_map()
+        locations = list(game.game_map)
+        self.assertEqual(420, len(locations), "The board should have 420 locations")
+        self.assertEqual([13, 0], locations[0], "Iteration should start at the bottom")
+        self.assertEqual([14, 27], locations[-1], "Iteration should end at the top")
+        self.assertTrue(all(game.game_map.in_arena_bounds(location) for location in locations), "Iterated over a location off the board")
+        self.assertEqual(sorted(locations, key=lambda location: (location[1], location[0])), locations, "Locations should be ordered row by row")
+        self.assertEqual(locations, list(map(list, game.game_map.locations())), "locations() should match iteration")
+
+    def test_units_by(self):
+        game = self.make_turn_0_map()
+        game_map = game.game_map
+        game_map.add_unit("DF", [13, 14], 1)
+        game_map.add_unit("DF", [20, 16], 1)
+        game_map.add_unit("DF", [13, 20], 1)
+        game_map.add_unit("FF", [14, 15], 1)
+        game_map.add_unit("DF", [13, 10], 0)
+        for _ in range(2):
+            game_map.add_unit("PI", [13, 0], 0)
+
+        self.assertEqual(3, game_map.count_units(1, "DF"), "Wrong number of enemy turrets")
+        self.assertEqual(2, game_map.count_units(1, "DF", rows=range(14, 17)), "Wrong number of enemy turrets in rows 14 to 16")
+        self.assertEqual(1, game_map.count_units(1, "DF", rows=range(14, 17), columns=[20]), "Wrong number of enemy turrets in column 20")
+        self.assertEqual(3, game_map.count_units(1, "DF", rows=range(14, 17)) + game_map.count_units(1, ["FF", "DF"], rows=[20]), "Unit type lists are not matched")
+        self.assertEqual(2, game_map.count_units(0, "PI"), "Stacked mobile units should all be found")
+        self.assertEqual(7, game_map.count_units(), "Every unit should be indexed")
+
+        game_map.remove_unit([13, 14])
+        game_map.add_unit("FF", [20, 16], 1)
+        self.assertEqual(1, game_map.count_units(1, "DF"), "Removed and replaced units should leave the index")
+        self.assertEqual([game_map[20, 16][0]], game_map.units_by(1, "FF", rows=[16]), "Replacing a structure should index the new one")
+
+    def test_arena_bounds_table(self):
+        game = self.make_turn_0_map()
+        half_board = game.HALF_ARENA
+        for x in range(-3, ARENA_SIZE + 3):
+            for y in range(-3, ARENA_SIZE + 3):
+                row_size = y + 1 if y < half_board else ARENA_SIZE - y
+                expected = 0 <= y < ARENA_SIZE and half_board - row_size <= x < half_board + row_size
+                self.assertEqual(expected, game.game_map.in_arena_bounds([x, y]), "Wrong bounds check at {}".format([x, y]))
+                if 0 <= x < ARENA_SIZE and 0 <= y < ARENA_SIZE:
+                    index = cell_index([x, y])
+                    self.assertEqual([x, y], cell_location(index), "Cell index encoding does not round trip")
+                    self.assertEqual(expected, bool(IN_ARENA[index]), "Wrong bounds table at {}".format([x, y]))
+
+        self.assertTrue(game.game_map.in_arena_bounds([13.0, 13.0]), "Float coordinates should be accepted")
+        self.assertFalse(game.game_map.in_arena_bounds([0.0, 0.0]), "Float coordinates off the board should be out of bounds")
+        game.game_map.add_unit("FF", [13, 13], 0)
+        self.assertIs(game.game_map[13, 13], game.game_map[13.0, 13.0], "Float coordinates should index the same cell")
+
+        for location in game.game_map:
+            expected = [cell_index(neighbor) for neighbor in game._shortest_path_finder._get_neighbors(location) if game.game_map.in_arena_bounds(neighbor)]
+            self.assertEqual(expected, list(NEIGHBORS[cell_index(location)]), "Wrong neighbors for {}".format(location))
+
+    def test_path_finder_matches_reference(self):
+        rng = random.Random(31)
+        game = self.make_turn_0_map()
+        path_finder = game._shortest_path_finder
+        edges = game.game_map.get_edges()
+        for board in range(25):
+            game = self.make_turn_0_map()
+            density = rng.choice([0.05, 0.2, 0.35, 0.5])
+            for location in game.game_map:
+                if rng.random() < density:
+                    game.game_map.add_unit(rng.choice(["FF", "EF", "DF"]), location, rng.randint(0, 1))
+
+            starts = rng.sample([location for edge in edges for location in edge], 12) + [list(location) for location in rng.sample(game.game_map.locations(), 8)]
+            for start in starts:
+                if game.contains_stationary_unit(start):
+                    continue
+                for target_edge in [game.get_target_edge(start), rng.randint(0, 3)]:
+                    expected = ReferencePathFinder().navigate_multiple_endpoints(start, edges[target_edge], game)
+                    actual = path_finder.navigate_multiple_endpoints(start, edges[target_edge], game)
+                    self.assertEqual(expected, actual, "Path from {} to edge {} differs from the reference on board {}".format(start, target_edge, board))
+
+            for target_edge in rng.sample(range(4), 2):
+                actual = path_finder.navigate_multiple_starts(starts, edges[target_edge], game)
+                for start, path in zip(starts, actual):
+                    expected = ReferencePathFinder().navigate_multiple_endpoints(start, edges[target_edge], game)
+                    self.assertEqual(expected, path, "Batched path from {} to edge {} differs from the reference on board {}".format(start, target_edge, board))
+
+    def test_path_regions(self):
+        game = self.make_turn_0_map()
+        # Seal off the bottom left corner, leaving a pocket of [11, 2], [12, 1], [12, 2], [13, 0], [13, 1] and [13, 2]
+        for location in [[10, 3], [11, 3], [12, 3], [13, 3], [14, 2], [14, 1], [14, 0], [11, 1], [10, 2]]:
+            game.game_map.add_unit("FF", location, 0)
+        regions = get_path_regions(game)
+        self.assertIs(regions, get_path_regions(game), "Regions should be shared while the structures do not change")
+        self.assertEqual(2, len(regions.regions), "Expected the open board and one sealed pocket")
+
+        pocket = regions.region_of([13, 0])
+        self.assertEqual(pocket, regions.region_of([11, 2]), "Cells of the pocket should share a region")
+        self.assertNotEqual(pocket, regions.region_of([15, 0]), "The pocket should be separate from the rest of the board")
+        self.assertEqual(-1, regions.region_of([14, 0]), "Blocked cells should have no region")
+
+        table = endpoint_table(game.game_map.get_edge_locations(game.game_map.TOP_RIGHT))
+        self.assertFalse(regions.reaches_end_points(pocket, table), "The pocket cannot reach the top right edge")
+        self.assertTrue(regions.reaches_end_points(regions.region_of([15, 0]), table), "The open board reaches the top right edge")
+        self.assertEqual(cell_index([13, 2]), regions.ideal_tile(pocket, table), "The pocket should self destruct as close to the top right as it can")
+        self.assertEqual([[13, 0], [13, 1], [13, 2]], game.find_path_to_edge([13, 0], game.game_map.TOP_RIGHT), "Wrong self destruct path")
+        self.assertEqual([[11, 2], [12, 2], [13, 2]], game.find_path_to_edge([11, 2], game.game_map.TOP_RIGHT), "Starts in the pocket should share its ideal tile")
+        self.assertIsNone(regions.path([30, 2], table), "Paths cannot start off the board")
+    def test_remove_structure_matches_rebuild(self):
+        rng = random.Random(33)
+        for board in range(10):
+            game = self.make_turn_0_map()
+            density = rng.choice([0.2, 0.35, 0.5])
+            for location in game.game_map:
+                if rng.random() < density:
+                    game.game_map.add_unit("FF", location, 0)
+            tables = [endpoint_table(edge) for edge in game.game_map.get_edges()]
+            regions = get_path_regions(game).copy()
+            starts = [location for location in game.game_map if rng.random() < 0.1]
+            for start in starts:
+                if regions.region_of(start) != -1:
+                    regions.path(start, rng.choice(tables))
+            structures = game.game_map.structure_locations()
+            rng.shuffle(structures)
+            for location in structures[:20]:
+                regions.remove_structure(location)
+                rebuilt = PathRegions(regions.blocked)
+                for start in rng.sample(starts, min(5, len(starts))):
+                    if rebuilt.region_of(start) == -1:
+                        continue
+                    for table in tables:
+                        self.assertEqual(rebuilt.path(start, table), regions.path(start, table), "Incremental update differs from a rebuild on board {}".format(board))
+            self.assertIsNot(regions, get_path_regions(game), "The shared regions should not be edited")
+
+    def test_predict_wave(self):
+        game = self.make_turn_0_map()
+        # An enemy wall across the board with one gap on the far left
+        for x in range(28):
+            if x != 1:
+                game.game_map.add_unit("FF", [x, 14], 1)
+        static_path = game.find_path_to_edge([13, 0])
+        self.assertIn([1, 14], static_path, "The only way through should be the gap")
+
+        timeline = game.predict_wave([("PI", [13, 0], 1)], destroyed={(14, 14): 5})
+        self.assertEqual([[14, 14]], [location for _, location in timeline.destroyed], "The scheduled structure should be destroyed")
+        self.assertEqual(1, len(timeline.repaths), "The scout should re-path once when the wall opens")
+        path = timeline.path_of(0)
+        self.assertNotIn([1, 14], path, "The scout should take the new opening")
+        self.assertIn([14, 14], path, "The scout should take the new opening")
+        self.assertEqual("breach", timeline.groups[0].outcome, "Nothing shoots the scout, so it should score")
+        self.assertEqual(1, timeline.breaches)
+
+        # Without the scheduled destruction the wave follows the static path
+        timeline = game.predict_wave([("PI", [13, 0], 1)])
+        self.assertEqual(static_path, timeline.path_of(0), "Without destroyed structures the wave should follow find_path_to_edge")
+
+        # Deployed units are grouped into one stack per location
+        spawned = game.attempt_spawn("EI", [13, 0], 3)
+        timeline = game.predict_wave()
+        self.assertEqual(1, len(timeline.groups))
+        self.assertEqual(spawned, timeline.groups[0].count, "Nothing shoots the demolishers, so none should be lost")
+        self.assertGreater(timeline.total_structure_damage(), 0, "Demolishers should damage the wall on their way")
+
+    def _sealed(self, game, extra_blocked, sources, sinks):
+        # Brute force check that no open source reaches an open sink
+        blocked = set(map(tuple, extra_blocked))
+        is_open = lambda location: game.game_map.in_arena_bounds(location) and not game.contains_stationary_unit(location) and tuple(location) not in blocked
+        seen = set(tuple(location) for location in sources if is_open(location))
+        frontier = list(seen)
+        targets = set(tuple(location) for location in sinks)
+        while frontier:
+            x, y = frontier.pop()
+            if (x, y) in targets:
+                return False
+            for neighbor in [(x + 1, y), (x - 1, y), (x, y + 1), (x, y - 1)]:
+                if neighbor not in seen and is_open(list(neighbor)):
+                    seen.add(neighbor)
+                    frontier.append(neighbor)
+        return True
+
+    def test_chokepoints(self):
+        game = self.make_turn_0_map()
+        game_map = game.game_map
+        # A wall across your half with a single gap at [5, 11], closing the edge cells above it
+        for x in range(28):
+            if game_map.in_arena_bounds([x, 11]) and x != 5:
+                game_map.add_unit("FF", [x, 11], 0)
+        for location in [[0, 13], [1, 12], [26, 12], [27, 13]]:
+            game_map.add_unit("FF", location, 0)
+        analysis = game.find_chokepoints(1)
+        self.assertIs(analysis, game.find_chokepoints(1), "The analysis should be cached while the structures do not change")
+        for spawn_edge in [game_map.TOP_LEFT, game_map.TOP_RIGHT]:
+            self.assertFalse(analysis.sealed[spawn_edge])
+            self.assertIn((5, 11), analysis.cut_cells[spawn_edge], "The gap should seal the route")
+            self.assertEqual(1, len(analysis.min_cuts[spawn_edge]), "One structure should be enough to seal the route")
+            self.assertTrue(self._sealed(game, analysis.min_cuts[spawn_edge], game_map.get_edge_locations(spawn_edge), game_map.get_edge_locations(game.get_target_edge(game_map.get_edge_locations(spawn_edge)[0]))))
+        self.assertTrue(all(y < 14 for x, y in analysis.all_cut_cells()), "Only cells you can build on should be reported")
+
+        game_map.remove_unit([6, 11])
+        analysis = game.find_chokepoints(1)
+        self.assertEqual(2, len(analysis.min_cuts[game_map.TOP_RIGHT]), "Two gaps need two structures")
+        self.assertNotIn((5, 11), analysis.all_cut_cells(), "Neither gap seals the route alone")
+
+        game_map.add_unit("FF", [5, 11], 0)
+        game_map.add_unit("FF", [6, 11], 0)
+        analysis = game.find_chokepoints(1)
+        self.assertTrue(analysis.sealed[game_map.TOP_RIGHT])
+        self.assertEqual([], analysis.min_cuts[game_map.TOP_RIGHT])
+
+    def test_cut_cells_match_brute_force(self):
+        rng = random.Random(34)
+        for board in range(3):
+            game = self.make_turn_0_map()
+            for location in game.game_map:
+                if rng.random() < 0.4:
+                    game.game_map.add_unit("FF", location, 0)
+            edges = game.game_map.get_edges()
+            sources, sinks = edges[game.game_map.TOP_LEFT], edges[game.game_map.BOTTOM_RIGHT]
+            if self._sealed(game, [], sources, sinks):
+                continue
+            open_cells = bytearray(ARENA_SIZE * ARENA_SIZE)
+            for location in game.game_map:
+                open_cells[cell_index(location)] = not game.contains_stationary_unit(location)
+            cuts = _cut_cells(open_cells, [cell_index(location) for location in sources if open_cells[cell_index(location)]], [cell_index(location) for location in sinks if open_cells[cell_index(location)]])
+            expected = set(cell_index(location) for location in game.game_map if open_cells[cell_index(location)] and self._sealed(game, [location], sources, sinks))
+            self.assertEqual(expected, cuts, "Cut cells differ from brute force on board {}".format(board))
+
+    def test_get_targets_matches_get_target(self):
+        rng = random.Random(35)
+        for board in range(5):
+            game = self.make_turn_0_map()
+            for location in game.game_map:
+                roll = rng.random()
+                if roll < 0.15:
+                    game.game_map.add_unit(rng.choice(["FF", "EF", "DF"]), location, rng.randint(0, 1))
+                    if rng.random() < 0.3:
+                        game.game_map.upgrade_unit(location)
+                elif roll < 0.3 and not game.contains_stationary_unit(location):
+                    for _ in range(rng.randint(1, 3)):
+                        game.game_map.add_unit(rng.choice(["PI", "EI", "SI"]), location, rng.randint(0, 1))
+            for unit in game.game_map.units_by():
+                # Give ties on distance something to break them
+                unit.health = rng.choice([5, 10, unit.health])
+            targets = game.get_targets()
+            self.assertTrue(targets, "The board should have attackers")
+            for attacker, target in targets:
+                self.assertIs(game.get_target(attacker), target, "Batched target of {} differs on board {}".format(attacker, board))
+            attacker = targets[0][0]
+            self.assertEqual([(attacker, game.get_target(attacker))], game.get_targets([attacker]))
+
+    def test_predict_self_destructs(self):
+        game = self.make_turn_0_map()
+        # Seal off the bottom left corner as in test_path_regions, and put enemy structures past the wall
+        for location in [[10, 3], [11, 3], [12, 3], [13, 3], [14, 2], [14, 1], [14, 0], [11, 1], [10, 2]]:
+            game.game_map.add_unit("FF", location, 0)
+        game.game_map.add_unit("FF", [13, 4], 1)
+        game.game_map.add_unit("DF", [14, 3], 1)
+
+        short, far, free = game.predict_self_destructs([("PI", [13, 0], 2), ("PI", [11, 2], 1), ("PI", [15, 1], 1)])
+        self.assertTrue(short.self_destructs)
+        self.assertEqual([13, 2], short.location)
+        self.assertFalse(short.detonates, "Two steps are not enough to detonate")
+        self.assertEqual({}, short.damage)
+        self.assertEqual(3, short.frame, "Scouts move every frame and give up on the move after their last step")
+        self.assertFalse(free.self_destructs, "Units outside the pocket reach their edge")
+        self.assertIsNone(free.frame)
+
+        # Wall off the whole enemy half, so every unit of yours walks to [27, 13] and detonates there
+        game = self.make_turn_0_map()
+        for x in range(28):
+            game.game_map.add_unit("FF", [x, 14], 1)
+        weak, strong = game.predict_self_destructs([("PI", [13, 0], 3), ("PI", [13, 0], 5)])
+        self.assertTrue(weak.self_destructs and weak.detonates)
+        self.assertEqual([27, 13], weak.location)
+        self.assertEqual({(26, 14): 45, (27, 14): 45}, weak.damage, "The blast should reach the walls within range 1.5")
+        self.assertEqual([], weak.destroyed)
+        self.assertEqual([(26, 14), (27, 14)], sorted(strong.destroyed), "Five scouts deal 75 damage, enough to destroy a wall")
+        self.assertEqual(150, strong.total_damage())
+
+    def test_range_masks(self):
+        masks = range_masks(4.5, 0.01)
+        for location in [[13, 0], [0, 13], [20, 10]]:
+            expected = set(cell_index(cell) for cell in self.make_turn_0_map().game_map.get_locations_in_range(location, 4.5))
+            mask = masks[cell_index(location)]
+            self.assertEqual(expected, set(index for index in range(ARENA_SIZE * ARENA_SIZE) if mask >> index & 1))
+        self.assertIs(masks, range_masks(4.5, 0.01), "Masks should be built once per radius")
+
+    def test_demolisher_standoffs(self):
+        game = self.make_turn_0_map()
+        game_map = game.game_map
+        # Enemy walls in the middle of the board, and a turret guarding the right side
+        for x in range(4, 24):
+            game_map.add_unit("FF", [x, 15], 1)
+        game_map.add_unit("DF", [21, 17], 1)
+        options = game.plan_demolisher_standoffs(count=2)
+        self.assertEqual(len(options), len([location for location in game_map.get_edge_locations(game_map.BOTTOM_LEFT) + game_map.get_edge_locations(game_map.BOTTOM_RIGHT)]))
+        best = options[0]
+        self.assertGreater(best.expected_damage, 0)
+        self.assertTrue(best.standoff_cells, "Demolishers outrange the walls, so some cells should be safe")
+        for x, y in best.standoff_cells:
+            self.assertEqual([], game.get_attackers([x, y], 0), "Standoff cells should be out of turret range")
+        for option in options:
+            self.assertLessEqual(option.expected_damage, 75 * len(option.targets))
+        keys = [(-option.expected_damage, option.exposure) for option in options]
+        self.assertEqual(sorted(keys), keys, "Options should be ranked by damage, then exposure")
+
+    def test_plan_intercepts(self):
+        game = self.make_turn_0_map()
+        enemy_locations = sorted(game.predict_spawn_paths(1).paths)
+        plan = game.plan_intercepts([("PI", [13, 27], 0.75), ("PI", [27, 14], 0.25)])
+        self.assertEqual(len(game.predict_spawn_paths(0).paths), len(plan.spawn_locations))
+        self.assertTrue(plan.engagements, "Interceptors should meet scouts crossing an empty board")
+
+        # Check every pair against a frame by frame walk of both paths
+        masks = range_masks(4.5, 0.01)
+        for spawn_index, location in enumerate(plan.spawn_locations):
+            interceptor_path = game.predict_spawn_paths(0).paths[tuple(location)]
+            coverage = 0
+            for enemy_index, (_, enemy_location, weight) in enumerate(plan.enemy_options):
+                enemy_path = game.predict_spawn_paths(1).paths[tuple(enemy_location)]
+                frames = [frame for frame in range(min(len(enemy_path), len(interceptor_path) * 4)) 
+                          if masks[cell_index(interceptor_path[frame // 4])] >> cell_index(enemy_path[frame]) & 1]
+                engagement = plan.engagements.get((spawn_index, enemy_index))
+                if not frames:
+                    self.assertIsNone(engagement)
+                    continue
+                coverage += weight
+                self.assertEqual((frames[0], frames[-1]), (engagement.first_frame, engagement.last_frame))
+                self.assertEqual(enemy_path[frames[0]], engagement.enemy_location)
+            self.assertAlmostEqual(coverage, plan.coverage[spawn_index])
+
+        best = plan.best_location()
+        self.assertEqual(plan.ranked()[0][0], best)
+        self.assertEqual(max(plan.coverage), plan.ranked()[0][1])
+        self.assertAlmostEqual(1, sum(weight for _, _, weight in game.plan_intercepts().enemy_options), msg="Default enemy options should be equally likely")
+        self.assertEqual(len(enemy_locations), len(game.plan_intercepts().enemy_options))
+
+    def test_worker_pool(self):
+        game = self.make_turn_0_map()
+        state = json.loads(game.serialized_string)
+        state["p1Units"][0] = [[3, 12, 75.0, "1"], [4, 12, 75.0, "2"]]
+        state["p2Units"][2] = [[13, 20, 90.0, "3"]]
+        turn_string = json.dumps(state)
+        for processes in [2, 0]:
+            pool = WorkerPool(game.config, processes)
+            try:
+                self.assertEqual(processes == 0, pool.serial)
+                with self.assertRaises(ValueError):
+                    pool.map(count_structures, [0])
+                pool.set_snapshot(turn_string)
+                self.assertEqual([2, 1, 2], pool.map(count_structures, [0, 1, 0]))
+                results = pool.map(spawn_and_report, [[13, 0], [14, 0], [13, 0]])
+                self.assertEqual([1, 1, 1], [spawned for spawned, _, _ in results])
+                self.assertEqual([1, 1, 1], [deployed for _, deployed, _ in results], "Each task should get a fresh game state")
+                if not pool.serial:
+                    self.assertTrue(all(redirected for _, _, redirected in results), "Workers must write to stderr, not stdout")
+                self.assertEqual([0, "failed", 2, "failed"], pool.map(fail_on_odd, range(4), default="failed"))
+            finally:
+                pool.close()
+                pool.close()
+
+    @unittest.skipIf(np is None, "numpy is not installed")
+    def test_batch_simulator_matches_predict_wave(self):
+        rng = random.Random(40)
+        compared = 0
+        for board in range(4):
+            game = self.make_turn_0_map()
+            for location in game.game_map:
+                if location[1] >= 14 and rng.random() < 0.12:
+                    game.game_map.add_unit(rng.choice(["FF", "DF", "DF", "EF"]), location, 1)
+            simulator = BatchSimulator(game)
+            edges = game.game_map.get_edge_locations(game.game_map.BOTTOM_LEFT) + game.game_map.get_edge_locations(game.game_map.BOTTOM_RIGHT)
+            plans = [[(rng.choice(["PI", "EI", "SI"]), rng.choice(edges), rng.randint(1, 8))] for _ in range(10)]
+            result = simulator.run(plans, 300)
+            self.assertEqual(len(plans), len(result.breaches))
+            for index, plan in enumerate(plans):
+                timeline = game.predict_wave(plan, max_frames=300)
+                # Batched paths are fixed, so only compare plans that never re-path
+                if timeline.repaths:
+                    continue
+                compared += 1
+                self.assertEqual(timeline.breaches, result.breaches[index], "Breaches differ for {} on board {}".format(plan, board))
+                self.assertAlmostEqual(timeline.total_structure_damage(), result.structure_damage[index], msg="Damage differs for {} on board {}".format(plan, board))
+                self.assertEqual(len(timeline.destroyed), result.structures_destroyed[index])
+        self.assertGreater(compared, 20)
+
+        # Plans of different sizes share one batch, and empty or blocked stacks do nothing
+        game = self.make_turn_0_map()
+        game.game_map.add_unit("DF", [13, 16], 1)
+        game.game_map.add_unit("FF", [3, 10], 0)
+        result = game.simulate_plans([[("PI", [13, 0], 5), ("PI", [14, 0], 5)], [("PI", [13, 0], 5)], [("PI", [3, 10], 5)], []])
+        self.assertEqual([0, 0, 0, 0], list(result.units_lost[2:]) + list(result.breaches[2:]))
+        self.assertGreater(result.breaches[0], result.breaches[1])
+        self.assertEqual(0, result.best())
+
+    def test_logger(self):
+        stream = io.StringIO()
+        logger = Logger(level=INFO, rate_limit=2, stream=stream)
+
+        class Exploding:
+            def __format__(self, spec):
+                raise AssertionError("Disabled messages must not be formatted")
+
+            def __str__(self):
+                raise AssertionError("Disabled messages must not be formatted")
+
+        logger.debug("hidden {}", Exploding())
+        logger.info("turn {}", 3)
+        for index in range(5):
+            logger.warning("shield {}", index, key="shield")
+        self.assertEqual(stream.getvalue(), "", "Messages are buffered until the turn ends")
+        logger.end_turn()
+        self.assertEqual(stream.getvalue().splitlines(), ["turn 3", "shield 0", "shield 1", "shield: 3 more messages suppressed"])
+
+        stream.seek(0)
+        stream.truncate()
+        logger.level = DEBUG
+        logger.debug("shield {}", 5, key="shield")
+        logger.flush()
+        self.assertEqual(stream.getvalue(), "shield 5\n", "Rate limits reset every turn")
+
+        original = util_module.logger
+        util_module.logger = Logger(level=WARNING, stream=stream)
+        try:
+            stream.seek(0)
+            stream.truncate()
+            util_module.debug_write("hidden", Exploding())
+            util_module.logger.level = INFO
+            util_module.debug_write("shown", 1)
+            util_module.logger.flush()
+            self.assertEqual(stream.getvalue(), "shown, 1\n", "debug_write logs at INFO")
+        finally:
+            util_module.logger = original
+
+    def test_watchdog(self):
+        sent = []
+        original = watchdog_module.send_command
+        watchdog_module.send_command = sent.append
+        try:
+            game_state = self.make_turn_0_map()
+            watchdog = Watchdog(0.05, default_build=[["FF", 0, 13]])
+            watchdog.begin_turn()
+            self.assertTrue(game_state.submit_turn())
+            watchdog.end_turn()
+            self.assertEqual(sent, ["[]", "[]"], "A turn submitted in time is sent as is")
+
+            sent.clear()
+            watchdog.begin_turn()
+            watchdog._timer.join()
+            self.assertTrue(watchdog.expired())
+            self.assertEqual(sent, ['[["FF", 0, 13]]', "[]"], "The default turn is sent at the deadline")
+            game_state.attempt_spawn("PI", [13, 0])
+            self.assertFalse(game_state.submit_turn(), "A late turn is discarded")
+            watchdog.end_turn()
+            self.assertEqual(len(sent), 2)
+
+            sent.clear()
+            watchdog.begin_turn()
+            game_state.checkpoint()
+            game_state.attempt_spawn("PI", [14, 0])
+            watchdog._timer.join()
+            watchdog.end_turn()
+            self.assertEqual(sent, ["[]", '[["PI", 13, 0]]'], "The last checkpoint is sent at the deadline")
+        finally:
+            watchdog_module.send_command = original
+
+    def test_precompute_cache(self):
+        game_state = self.make_turn_0_map()
+        config = game_state.config
+        hit_radius = config["unitInformation"][0]["getHitRadius"]
+        with tempfile.TemporaryDirectory() as directory:
+            built = PrecomputeCache(config, directory)
+            self.assertFalse(built.loaded)
+            self.assertTrue(os.path.exists(built.path))
+            mapped = PrecomputeCache(config, directory)
+            self.assertTrue(mapped.loaded, "The second game maps the file instead of computing")
+            for radius in (1.5, 2.5, 3.5, 4.5):
+                self.assertEqual(mapped.range_masks(radius, hit_radius), range_masks(radius, hit_radius))
+            self.assertIsNone(mapped.section("edges"), "Only tables something reads are cached")
+
+            # Installing decodes nothing; standoff.range_masks decodes a radius the first time it misses it
+            installed = PrecomputeCache(config, directory).install()
+            self.assertEqual(installed._masks, {})
+            try:
+                self.assertEqual(cached_range_masks(3.5, hit_radius), range_masks(3.5, hit_radius))
+                self.assertEqual(list(installed._masks), [(3.5, hit_radius)])
+                self.assertIsNone(cached_range_masks(1.25, hit_radius), "Radii outside the config are not cached")
+            finally:
+                precompute_module._installed = None
+
+            # A different config or a damaged file is rebuilt rather than read
+            with open(built.path, "r+b") as file:
+                file.write(b"XXXX")
+            self.assertFalse(PrecomputeCache(config, directory).loaded)
+            changed = json.loads(json.dumps(config))
+            changed["unitInformation"][2]["attackRange"] = 3.0
+            self.assertNotEqual(PrecomputeCache(changed, directory).path, built.path)
+        unwritable = PrecomputeCache(config, os.path.join(directory, "missing"))
+        self.assertIsNone(unwritable.path, "Falls back to tables in memory")
+        self.assertEqual(unwritable.range_masks(2.5, hit_radius), range_masks(2.5, hit_radius))
+
+    def test_lazy_imports(self):
+        algo_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+        script = "import sys, gamelib; print(sorted(name for name in ('numpy', 'multiprocessing', 'threading', 'gamelib.simulator', 'gamelib.workers', 'gamelib.standoff', 'gamelib.watchdog', 'gamelib.precompute') if name in sys.modules)); gamelib.WorkerPool; print('gamelib.workers' in sys.modules)"
+        output = subprocess.run([sys.executable, "-c", script], cwd=algo_dir, stdout=subprocess.PIPE, universal_newlines=True, check=True).stdout
+        self.assertEqual(output.splitlines(), ["[]", "True"], "Optional modules load on first use only")
+
+    def test_serve_games_back_to_back(self):
+        config = self.make_turn_0_map().config
+        config["replaySave"] = 0
+        turn = {"p1Units": [[], [], [], [], [], [], [], []], "p2Units": [[], [], [], [], [], [], [], []], "turnInfo": [0, 0, -1],
+                "p1Stats": [30.0, 25.0, 5.0, 0], "p2Stats": [30.0, 25.0, 5.0, 0], "events": {}}
+        game = [json.dumps(config), json.dumps(turn), json.dumps({"turnInfo": [1, 0, 0]}), json.dumps({"turnInfo": [2, 0, -1]})]
+
+        class CountingAlgo(AlgoCore):
+            def __init__(self):
+                super().__init__()
+                self.games, self.frames = 0, 0
+
+            def on_game_start(self, config):
+                super().on_game_start(config)
+                self.games += 1
+                self.frames = 0
+
+            def on_action_frame(self, frame):
+                self.frames += 1
+
+        output = io.StringIO()
+        algo = CountingAlgo()
+        with tempfile.TemporaryDirectory() as directory:
+            algo.precompute = PrecomputeCache(config, directory)
+            precompute = algo.precompute
+            bind_streams(io.StringIO("\n".join(game * 3) + "\n"), output)
+            try:
+                algo.serve()
+            finally:
+                bind_streams()
+            self.assertIs(algo.precompute, precompute, "Games with the same config reuse the precompute cache")
+        self.assertEqual(algo.games, 3)
+        self.assertEqual(algo.frames, 1, "State is reset by every new config")
+        self.assertEqual(output.getvalue().splitlines(), ["[]", "[]"] * 3)
+
+    def test_connection_closes_worker_pool(self):
+        config = self.make_turn_0_map().config
+        config["replaySave"] = 0
+        turn = {"p1Units": [[], [], [], [], [], [], [], []], "p2Units": [[], [], [], [], [], [], [], []], "turnInfo": [0, 0, -1],
+                "p1Stats": [30.0, 25.0, 5.0, 0], "p2Stats": [30.0, 25.0, 5.0, 0], "events": {}}
+        game = [json.dumps(config), json.dumps(turn), json.dumps({"turnInfo": [2, 0, -1]})]
+
+        class PoolAlgo(AlgoCore):
+            def on_game_start(self, config):
+                super().on_game_start(config)
+                self.pool = self.start_worker_pool(1)
+
+        algo = PoolAlgo()
+        engine, connection = socket.socketpair()
+        with tempfile.TemporaryDirectory() as directory:
+            algo.precompute = PrecomputeCache(config, directory)
+            engine.sendall(("\n".join(game) + "\n").encode("utf-8"))
+            engine.shutdown(socket.SHUT_WR)
+            algo._play_connection(connection)
+        engine.close()
+        self.assertIsNone(algo.worker_pool, "The worker pool should not outlive the connection")
+        self.assertEqual([], algo.pool._workers, "The workers should be stopped when the connection ends")
+        self.assertIsNone(algo.pool._shared, "The shared snapshot block should be freed when the connection ends")
+
+    def test_action_phase_recorder(self):
+        def frame(attack=(), shield=(), breach=(), death=(), damage=()):
+            return {"turnInfo": [1, 0, 0], "events": {"attack": list(attack), "shield": list(shield), "breach": list(breach),
+                                                       "death": list(death), "damage": list(damage)}}
+
+        recorder = ActionPhaseRecorder(window=2)
+        recorder.record(frame(attack=[[[3, 12], [4, 14], 5, 2, "1", "2", 1], [[3, 12], [4, 14], 5, 2, "1", "2", 1], [[5, 15], [4, 12], 2, 3, "3", "4", 2]],
+                              shield=[[[13, 2], [13, 3], 3, 1, "5", "6", 1]]))
+        recorder.record(frame(breach=[[[0, 13], 1, 3, "7", 2], [[0, 13], 1, 3, "8", 2]], death=[[[3, 12], 2, "1", 1, False]],
+                              damage=[[[3, 12], 15, 2, "1", 1]]))
+        turn = recorder.end_turn()
+        self.assertEqual((turn.turns, turn.frames), (1, 2))
+        self.assertEqual(turn.cells(turn.damage_dealt[0]), {(3, 12): 10}, "Only structures are credited with damage")
+        self.assertEqual(turn.cells(turn.damage_dealt[1]), {})
+        self.assertEqual(turn.cells(turn.shield_given[0]), {(13, 2): 3})
+        self.assertEqual(turn.locations(turn.breaches[1]), [[0, 13]])
+        self.assertEqual(turn.cells(turn.breaches[1]), {(0, 13): 2})
+        self.assertEqual(turn.cells(turn.damage_taken[0]), {(3, 12): 15})
+        self.assertEqual(turn.structure_deaths(0), [([3, 12], 2)])
+
+        recorder.record(frame(attack=[[[3, 12], [4, 14], 1, 2, "1", "2", 1]]))
+        recorder.end_turn()
+        self.assertIsNone(recorder.end_turn(), "A turn without frames is not counted")
+        self.assertEqual(recorder.last_turn.structure_deaths(0), [])
+        recorder.record(frame(attack=[[[3, 12], [4, 14], 2, 2, "1", "2", 1]]))
+        recorder.end_turn()
+        self.assertEqual(recorder.game.turns, 3)
+        self.assertEqual(recorder.game.cells(recorder.game.damage_dealt[0]), {(3, 12): 13})
+        self.assertEqual(recorder.recent.turns, 2)
+        self.assertEqual(recorder.recent.cells(recorder.recent.damage_dealt[0]), {(3, 12): 3}, "The window drops the oldest turn")
+        self.assertEqual(recorder.recent.cells(recorder.recent.breaches[1]), {})
+        recorder.reset()
+        self.assertEqual(recorder.game.turns, 0)
+
+    def test_importance_index_matches_sorting(self):
+        rng = random.Random(7)
+        for largest_first in (True, False):
+            index = ImportanceIndex(largest_first)
+            scores = {}
+            for _ in range(2000):
+                key = (rng.randrange(28), rng.randrange(28))
+                roll = rng.random()
+                if roll < 0.1:
+                    index.remove(key)
+                    scores.pop(key, None)
+                elif roll < 0.6:
+                    amount = rng.randrange(1, 10)
+                    index.add(key, amount)
+                    scores[key] = scores.get(key, 0) + amount
+                else:
+                    index.set(key, rng.randrange(100))
+                    scores[key] = index.score(key)
+                if rng.random() < 0.05:
+                    ordered = sorted(scores.values(), reverse=largest_first)
+                    self.assertEqual([score for _, score in index.top(5)], ordered[:5])
+                    self.assertEqual([score for _, score in index.ranked()], ordered)
+                    limit = 50
+                    expected = [score for score in ordered if (score >= limit if largest_first else score <= limit)]
+                    self.assertEqual([score for _, score in index.threshold(limit)], expected)
+            self.assertEqual(len(index), len(scores))
+            self.assertLessEqual(len(index._heap), 2 * len(scores) + 33, "Stale entries are compacted")
+
+    def test_structure_importance(self):
+        config = self.make_turn_0_map().config
+        importance = StructureImportance()
+        state = {"p1Units": [[[0, 13, 60.0, "1"]], [], [[3, 12, 20.0, "2"], [4, 12, 70.0, "3"], [5, 12, 20.0, "4"]], [], [], [], [], [[5, 12, 0, "4"]]]}
+        importance.update_health(state, config)
+        turret_health = config["unitInformation"][2]["startHealth"]
+        upgraded_health = config["unitInformation"][2]["upgrade"].get("startHealth", turret_health)
+        self.assertEqual(importance.health.score((3, 12)), 20.0 / turret_health)
+        self.assertEqual(importance.health.score((5, 12)), 20.0 / upgraded_health)
+        low = [location for location in ([3, 12], [5, 12]) if importance.health.score(tuple(location)) <= 0.3]
+        self.assertEqual(sorted(importance.low_health(0.3, unit_type=2)), sorted(low))
+        self.assertEqual(importance.unit_type([0, 13]), 0)
+
+        importance.record({"events": {"attack": [[[4, 12], [4, 14], 6, 2, "3", "9", 1], [[3, 12], [3, 14], 6, 2, "2", "9", 1],
+                                                 [[4, 12], [4, 14], 6, 2, "3", "9", 1], [[4, 15], [4, 12], 3, 3, "9", "3", 2]],
+                                      "damage": [[[4, 12], 3, 2, "3", 1]],
+                                      "death": [[[3, 12], 2, "2", 1, False]]}})
+        self.assertEqual(importance.damage_dealt.top(2), [((4, 12), 12), ((3, 12), 6)])
+        self.assertEqual(importance.damage_taken.top(5), [((4, 12), 3)])
+        self.assertNotIn((3, 12), importance.health, "Destroyed structures leave the health index")
+        state["p1Units"][2] = [[4, 12, 70.0, "3"]]
+        importance.update_health(state, config)
+        self.assertEqual(len(importance.health), 2)
+
+    def test_board_delta(self):
+        config = self.make_turn_0_map().config
+        cache = QueryCache(maxsize=1)
+        snapshots = BoardSnapshots()
+        def state(turn, p1_units, p2_units):
+            return GameState(config, json.dumps({"p1Units": p1_units, "p2Units": p2_units, "turnInfo": [0, turn, -1],
+                                                 "p1Stats": [30.0, 25.0, 5.0, 0], "p2Stats": [30.0, 25.0, 5.0, 0], "events": {}}), cache, snapshots)
+
+        first = state(1, [[[13, 3, 75.0, "1"]], [], [], [], [], [], [], []],
+                      [[[13, 20, 75.0, "2"]], [], [[14, 20, 90.0, "3"]], [], [], [], [], []])
+        self.assertIsNone(first.board_delta(), "The first turn has nothing to compare with")
+        self.assertEqual(len(first.game_map.structure_row_hashes), ARENA_SIZE)
+        self.assertEqual((cache.hits, cache.misses, len(cache)), (0, 0, 0), "Remembering snapshots does not touch the query cache")
+        self.assertEqual(first.board_delta(first).changed_rows, [])
+
+        second = state(2, [[[13, 3, 75.0, "1"]], [], [], [], [], [], [], []],
+                       [[[13, 20, 75.0, "2"], [10, 24, 75.0, "4"]], [], [[14, 20, 90.0, "3"]], [], [], [], [[13, 20, 0, "2"]], [[14, 20, 0, "3"]]])
+        delta = second.board_delta()
+        self.assertIsInstance(delta, BoardDelta)
+        self.assertEqual((delta.previous_turn, delta.turn_number), (1, 2))
+        self.assertEqual(delta.added, [(10, 24, 0, 1)])
+        self.assertEqual(delta.upgraded, [(14, 20, 2, 1)])
+        self.assertEqual(delta.removing, [(13, 20, 0, 1)])
+        self.assertEqual(delta.removed, [])
+        self.assertEqual(sorted(delta.changed_rows), [20, 24], "Rows with unchanged hashes are skipped")
+        self.assertEqual(delta.for_player(0), {"added": [], "removed": [], "upgraded": [], "removing": []})
+        self.assertIs(second.board_delta(), delta, "Deltas are cached")
+
+        third = state(3, [[], [], [], [], [], [], [], []],
+                      [[[10, 24, 75.0, "4"]], [], [[14, 20, 90.0, "3"]], [], [], [], [], [[14, 20, 0, "3"]]])
+        delta = third.board_delta()
+        self.assertEqual(sorted(delta.removed), [(13, 3, 0, 0), (13, 20, 0, 1)])
+        self.assertEqual((delta.added, delta.upgraded), ([], []))
+        self.assertEqual(third.board_delta(first).added, [(10, 24, 0, 1)])
+        self.assertEqual(state(3, *[[[], [], [], [], [], [], [], []]] * 2).board_delta().previous_turn, 2, "A state parsed again for the same turn keeps the previous turn")
+        self.assertTrue(third.board_delta(third).is_empty())
+
+    def test_ring_buffer(self):
+        buffer = RingBuffer(3)
+        for value in range(5):
+            buffer.append(value)
+        self.assertEqual((len(buffer), buffer.appended), (3, 5))
+        self.assertEqual((buffer[0], buffer[-1]), (2, 4))
+        self.assertEqual(buffer.last(), [2, 3, 4])
+        self.assertEqual(buffer.last(2, skip=1), [2, 3])
+        buffer[-1] += 1
+        self.assertEqual(buffer[-1], 5)
+        with self.assertRaises(IndexError):
+            buffer[3]
+
+    def test_opponent_history(self):
+        history = OpponentHistory(capacity=4)
+        def turn(number, mp, walls, upgrades=()):
+            units = [[[x, 20, 60.0, str(x)] for x in walls], [], [], [], [], [], [], [[x, 20, 0, str(x)] for x in upgrades]]
+            history.begin_turn({"turnInfo": [0, number, -1], "p1Stats": [30.0, 10.0, 5.0, 0], "p2Stats": [25.0, 8.0, mp, 0],
+                                "p1Units": [[] for _ in range(8)], "p2Units": units})
+        def spawn(*spawns):
+            history.record({"events": {"spawn": [[location, unit_type, "9", 2] for location, unit_type in spawns],
+                                       "damage": [[[13, 20], 4.0, 0, "13", 2], [[13, 3], 5.0, 0, "1", 1]], "breach": []}})
+
+        turn(0, 5.0, [])
+        self.assertIsNone(history.mean("MP"))
+        spawn(([13, 20], 0))
+        turn(1, 8.0, [13, 14])
+        spawn(([10, 23], 3), ([10, 23], 3), ([20, 21], 5))
+        turn(2, 12.0, [13, 14], upgrades=[13])
+        self.assertEqual(history.current("MP"), 12.0)
+        self.assertEqual(history.values("built"), [2, 0])
+        self.assertEqual(history.values("upgraded"), [0, 1])
+        self.assertEqual(history.values("spawned"), [0, 3], "Structures do not count as spawns")
+        self.assertEqual((history.total("spawned:3"), history.total("spawned_edge:1"), history.total("spawned_edge:0")), (2, 2, 1))
+        self.assertEqual(history.values("damage_taken"), [4.0, 4.0], "Only the enemy's damage is recorded")
+        self.assertEqual(history.mean("MP", where="spawned"), 8.0)
+        self.assertEqual(history.mean("MP", 1), 8.0)
+
+        for number in range(3, 10):
+            turn(number, float(number), [13, 14])
+        self.assertEqual(history.finished_turns(), 3, "The history keeps capacity turns, including the one in progress")
+        self.assertEqual(history.values("MP"), [6.0, 7.0, 8.0])
+        self.assertEqual(history.turns[-1], 9)
+        with self.assertRaises(KeyError):
+            history.values("gold")
+        history.reset()
+        self.assertEqual((history.finished_turns(), history.current("MP")), (0, None))
+
+    def test_income_table(self):
+        config = self.make_turn_0_map().config
+        resources = config["resources"]
+        table = IncomeTable(resources, turns=30)
+        for turn_number in (0, 7, 25):
+            for turns_in_future in (1, 4, 12):
+                MP = 6.5
+                for turn in range(turn_number + 1, turn_number + turns_in_future + 1):
+                    MP *= (1 - resources["bitDecayPerRound"])
+                    MP += resources["bitsPerRound"] + resources["bitGrowthRate"] * (turn // resources["turnIntervalForBitSchedule"])
+                    MP = round(MP, 1)
+                self.assertEqual(table.project_MP(6.5, turn_number, turns_in_future), MP, "Turns past the table follow the same schedule")
+                self.assertAlmostEqual(table.project_SP(3.0, turn_number, turns_in_future), 3.0 + resources["coresPerRound"] * turns_in_future)
+
+    def test_attack_predictor(self):
+        game_state = self.make_turn_0_map()
+        history = OpponentHistory()
+        predictor = AttackPredictor(history, prior_MP=10)
+        self.assertEqual((predictor.probability(9), predictor.probability(10)), (0.0, 1.0), "The prior attacks at prior_MP")
+
+        def turn(number, MP, spawns=()):
+            history.begin_turn({"turnInfo": [0, number, -1], "p1Stats": [30.0, 10.0, 5.0, 0], "p2Stats": [30.0, 10.0, MP, 0],
+                                "p1Units": [[] for _ in range(8)], "p2Units": [[] for _ in range(8)]})
+            history.record({"events": {"spawn": [[[13, 27], unit_type, "1", 2] for unit_type in spawns]}})
+        for number, MP in enumerate([5.0, 7.0, 9.0]):
+            turn(number, MP)
+        turn(3, 11.0, [3, 3, 3, 4])
+        for number, MP in enumerate([5.0, 7.0, 9.0], start=4):
+            turn(number, MP)
+        turn(7, 11.0, [3, 3, 3, 4])
+        turn(8, 5.0)
+        self.assertEqual(predictor.probability(11.0), 1.0)
+        self.assertLess(predictor.probability(9.0), 0.5, "The enemy held 9 MP twice")
+        self.assertEqual(predictor.mix(), {3: 0.75, 4: 0.25})
+
+        forecasts = predictor.forecast(game_state, turns=3)
+        self.assertEqual([forecast.turn_number for forecast in forecasts], [0, 1, 2])
+        self.assertEqual(forecasts[1].MP, game_state.project_future_MP(1, 1))
+        self.assertLessEqual(sum(forecast.probability for forecast in forecasts), 1.0 + 1e-9)
+        predictor.reset()
+        history.reset()
+        self.assertEqual(predictor.probability(9), 0.0)
+
+    def test_worker_snapshot_rewritten_while_read(self):
+        game = self.make_turn_0_map()
+        pool = WorkerPool(game.config, 1)
+        if pool.serial:
+            pool.close()
+            self.skipTest("fork or shared memory is not available")
+        try:
+            pool.set_snapshot(game.serialized_string)
+            self.assertEqual(_read_snapshot(pool._shared.buf, 1), game.serialized_string)
+
+            class RewrittenWhileRead:
+                # Publishes the next turn's snapshot when the reader starts copying the body
+                def __init__(self, buffer):
+                    self.buffer = buffer
+                def __getitem__(self, key):
+                    if key.start:
+                        pool.set_snapshot("{}" + " " * 40)
+                    return self.buffer[key]
+            self.assertIsNone(_read_snapshot(RewrittenWhileRead(pool._shared.buf), 1), "A torn snapshot is rejected")
+            self.assertIsNone(_read_snapshot(pool._shared.buf, 1))
+
+            pool.set_snapshot(game.serialized_string)
+            self.assertEqual(pool.map(sleep_and_count, [0.4] * 4, timeout=0.1, default="late"), ["late"] * 4)
+            start = time.time()
+            self.assertEqual(pool.map(count_structures, [0], timeout=5), [0])
+            self.assertLess(time.time() - start, 0.9, "Queued tasks of a timed out batch are skipped")
+        finally:
+            pool.close()
+
+    def test_plan_intercepts_with_blocked_enemy_edges(self):
+        game = self.make_turn_0_map()
+        for edge in (game.game_map.TOP_LEFT, game.game_map.TOP_RIGHT):
+            for location in game.game_map.get_edge_locations(edge):
+                game.game_map.add_unit("FF", location, 1)
+        self.assertEqual(game.predict_spawn_paths(1).paths, {})
+        plan = game.plan_intercepts()
+        self.assertEqual((plan.enemy_options, plan.engagements), ([], {}))
+        self.assertIsNone(plan.best_location())
+
+    def test_action_phase_rollups_match_dense_sums(self):
+        rng = random.Random(46)
+        recorder = ActionPhaseRecorder(window=3)
+        turns = []
+        for _ in range(8):
+            turn = []
+            for _ in range(rng.randint(0, 4)):
+                location = [rng.randrange(ARENA_SIZE), rng.randrange(ARENA_SIZE)]
+                frame = {"events": {"damage": [[location, rng.choice([0.5, 1.0, 3.3]), 3, "1", rng.choice([1, 2])]],
+                                    "death": [[location, rng.randrange(6), "2", rng.choice([1, 2]), False]]}}
+                recorder.record(frame)
+                turn.append(frame)
+            recorder.end_turn()
+            if turn:
+                turns.append(turn)
+        recent = ActionPhaseRecorder()
+        for turn in turns[-3:]:
+            for frame in turn:
+                recent.record(frame)
+        dense = recent.current
+        for mine, expected in zip(recorder.recent._tables(), dense._tables()):
+            self.assertEqual([round(value, 6) for value in mine], [round(value, 6) for value in expected])
+        self.assertLessEqual(len(recorder.last_turn.touched), 4, "Only the cells of the turn's events are visited")
+
+    def test_board_hashes_with_extra_unit_types(self):
+        config = json.loads(json.dumps(self.make_turn_0_map().config))
+        for shorthand in ("XA", "XB", "XC"):
+            extra = dict(config["unitInformation"][3])
+            extra["shorthand"] = shorthand
+            config["unitInformation"].append(extra)
+        game_map = GameMap(config)
+        hashes = set()
+        # Both cells of the top row, so a key block too small for the config would make types of neighboring cells collide
+        for location in ([13, 27], [14, 27]):
+            for shorthand in ("PI", "EI", "SI", "XA", "XB", "XC"):
+                # GameState only registers the standard unit types, so the extra ones are set on a scout
+                unit = GameUnit("PI", config, 1, None, *location)
+                unit.unit_type = shorthand
+                game_map._place_unit(unit)
+                hashes.add(game_map.mobile_hash)
+                game_map.remove_unit(location)
+        self.assertEqual(len(hashes), 12, "Every unit type of the config gets its own keys")
@@ -1,19 +1,48 @@
+import atexit
+import os
 import sys
 
 
 BANNER_TEXT = "---------------- Starting Your Algo --------------------"
 
+DEBUG = 10
+INFO = 20
+WARNING = 30
+ERROR = 40
+_LEVEL_NAMES = {"DEBUG": DEBUG, "INFO": INFO, "WARNING": WARNING, "ERROR": ERROR}
 
-def get_command():
-    """Gets input from stdin
+
+# The streams commands are read from and written to, stdin and stdout if None. See bind_streams.
+_input_stream = None
+_output_stream = None
+
+
+def bind_streams(input_stream=None, output_stream=None):
+    """Makes get_command and send_command use other streams, such as a socket connection in server mode.
+    Pass None to go back to stdin and stdout.
+
+    """
+    global _input_stream, _output_stream
+    _input_stream = input_stream
+    _output_stream = output_stream
+
+def read_command():
+    """Gets input from the bound input stream, stdin by default
+
+    Returns:
+        The next line, or an empty string once the stream is closed
 
     """
     try:
-        ret = sys.stdin.readline()
+        return (_input_stream or sys.stdin).readline()
     except EOFError:
-        # Game parent process terminated so exit
-        debug_write("Got EOF, parent game process must have died, exiting for cleanup")
-        exit()
+        return ""
+
+def get_command():
+    """Gets input from stdin
+
+    """
+    ret = read_command()
     if ret == "":
         # Happens if parent game process dies, so exit for cleanup, 
         # Don't change or starter-algo process won't exit even though the game has closed
@@ -22,20 +51,131 @@ def get_command():
     return ret
 
 def send_command(cmd):
-    """Sends your turn to standard output.
+    """Sends your turn to standard output, or the bound output stream.
     Should usually only be called by 'GameState.submit_turn()'
 
     """
-    sys.stdout.write(cmd.strip() + "\n")
-    sys.stdout.flush()
+    stream = _output_stream or sys.stdout
+    stream.write(cmd.strip() + "\n")
+    stream.flush()
 
 def debug_write(*msg):
-    """Prints a message to the games debug output
+    """Prints a message to the games debug output, at the INFO level of util.logger.
+    It is shown by default and dropped, without being formatted, when ALGO_LOG_LEVEL is WARNING or ERROR.
 
     Args:
         msg: The message to output
 
     """
     #Printing to STDERR is okay and printed out by the game but doesn't effect turns.
-    sys.stderr.write(", ".join(map(str, msg)).strip() + "\n")
-    sys.stderr.flush()
+    if logger.enabled(INFO):
+        logger.write(", ".join(map(str, msg)).strip())
+
+
+class Logger:
+    """Leveled, buffered debug output.
+
+    Messages below the level are dropped before they are formatted, so a disabled debug line
+    only costs a comparison. Accepted messages are formatted and kept in a buffer that is written to
+    stderr with a single flush at the end of each turn, at exit, or once it holds buffer_size lines.
+    Messages logged with a key are rate limited: at most rate_limit of them are kept per turn and
+    the rest are counted and reported in one line when the turn ends.
+
+    The level defaults to the ALGO_LOG_LEVEL environment variable (DEBUG, INFO, WARNING or ERROR),
+    or INFO if it is not set, so debug lines cost close to nothing unless they are asked for.
+
+    Attributes :
+        * level (int): Messages below this level are dropped
+        * rate_limit (int): The number of messages kept per key per turn
+        * buffer_size (int): The number of buffered lines that triggers a flush
+        * buffered (bool): If False, every message is written as soon as it is logged
+        * stream (file): Where messages are written, stderr if None
+
+    """
+    def __init__(self, level=None, rate_limit=5, buffer_size=1000, stream=None):
+        if level is None:
+            level = _LEVEL_NAMES.get(os.environ.get("ALGO_LOG_LEVEL", "").upper(), INFO)
+        self.level = level
+        self.rate_limit = rate_limit
+        self.buffer_size = buffer_size
+        self.buffered = True
+        self.stream = stream
+        self._lines = []
+        self._counts = {}
+
+    def enabled(self, level):
+        """True if messages at the level are kept. Use it to skip building expensive arguments.
+        """
+        return level >= self.level
+
+    def log(self, level, message, *args, key=None):
+        """Logs message.format(*args) if the level is enabled and the key is under its rate limit
+
+        Args:
+            * level: The level of the message, one of DEBUG, INFO, WARNING or ERROR
+            * message: The message, formatted with args only if it is kept
+            * args: The format arguments
+            * key: Messages with the same key share one rate limit per turn. None for no limit.
+
+        """
+        if level < self.level:
+            return
+        if key is not None:
+            count = self._counts.get(key, 0) + 1
+            self._counts[key] = count
+            if count > self.rate_limit:
+                return
+        self.write(message.format(*args) if args else message)
+
+    def debug(self, message, *args, key=None):
+        self.log(DEBUG, message, *args, key=key)
+
+    def info(self, message, *args, key=None):
+        self.log(INFO, message, *args, key=key)
+
+    def warning(self, message, *args, key=None):
+        self.log(WARNING, message, *args, key=key)
+
+    def error(self, message, *args, key=None):
+        self.log(ERROR, message, *args, key=key)
+
+    def write(self, line):
+        """Buffers one already formatted line, regardless of level and rate limits
+        """
+        self._lines.append(line)
+        if not self.buffered or len(self._lines) >= self.buffer_size:
+            self.flush()
+
+    def end_turn(self):
+        """Reports the messages dropped by rate limiting, resets the limits and flushes
+        """
+        for key, count in self._counts.items():
+            if count > self.rate_limit:
+                self._lines.append("{}: {} more messages suppressed".format(key, count - self.rate_limit))
+        self._counts.clear()
+        self.flush()
+
+    def flush(self):
+        """Writes every buffered line with a single write and flush
+        """
+        if not self._lines:
+            return
+        text = "\n".join(self._lines) + "\n"
+        self._lines = []
+        stream = self.stream if self.stream is not None else sys.stderr
+        try:
+            stream.write(text)
+            stream.flush()
+        except (OSError, ValueError):
+            # The stream was closed, nothing can be reported anymore
+            pass
+
+    def clear(self):
+        """Drops every buffered line and rate limit count without writing them
+        """
+        self._lines = []
+        self._counts.clear()
+
+
+logger = Logger()
+atexit.register(logger.flush)
@@ -0,0 +1,141 @@
+import json
+import threading
+
+from .util import send_command, logger
+
+# The watchdog of the turn in progress, if any. GameState.submit_turn submits through it.
+_active = None
+
+
+class Watchdog:
+    """Submits a fallback turn if on_turn runs too long, and discards the late result.
+
+    AlgoCore starts the watchdog when a turn's game state arrives. A timer thread fires once the
+    budget has elapsed and submits the best turn offered so far with offer or GameState.checkpoint,
+    or the default turn if nothing was offered. Both threads submit through the same lock, and only the
+    first submission of a turn is sent, so a strategy that finishes after the deadline has its turn
+    discarded instead of corrupting the command stream of the next phase.
+
+    Attributes :
+        * budget (float): Seconds from the start of the turn until the fallback turn is submitted
+        * default_build (list): The build stack submitted when nothing better was offered
+        * default_deploy (list): The deploy stack submitted when nothing better was offered
+        * expired_turns (int): The number of turns that were submitted by the timer
+
+    """
+    def __init__(self, budget, default_build=None, default_deploy=None):
+        self.budget = budget
+        self.default_build = default_build or []
+        self.default_deploy = default_deploy or []
+        self.expired_turns = 0
+        self._lock = threading.Lock()
+        self._timer = None
+        self._submitted = True
+        self._expired = False
+        self._best = None
+
+    @classmethod
+    def from_config(cls, config, margin=0.8):
+        """A watchdog whose budget is a fraction of the config's soft time limit per turn
+
+        Args:
+            * config: The game config
+            * margin: The fraction of waitTimeBotSoft to allow, leaving the rest to submit and for the engine's clock
+
+        """
+        soft_limit = config.get("timingAndReplay", {}).get("waitTimeBotSoft", 5000)
+        return cls(soft_limit / 1000 * margin)
+
+    def set_default(self, build_stack, deploy_stack):
+        """Sets the turn submitted when the deadline passes before anything was offered
+        """
+        self.default_build = list(build_stack)
+        self.default_deploy = list(deploy_stack)
+
+    def begin_turn(self):
+        """Starts the timer for a new turn and makes this the watchdog GameState.submit_turn goes through
+        """
+        global _active
+        self.end_turn()
+        with self._lock:
+            self._submitted = False
+            self._expired = False
+            self._best = None
+        _active = self
+        self._timer = threading.Timer(self.budget, self._expire)
+        self._timer.daemon = True
+        self._timer.start()
+
+    def offer(self, build_stack, deploy_stack):
+        """Records the best turn so far. It is copied, so the stacks can keep changing afterwards.
+        """
+        with self._lock:
+            self._best = (list(build_stack), list(deploy_stack))
+
+    def submit(self, build_stack, deploy_stack):
+        """Sends a turn unless one was already sent this turn
+
+        Returns:
+            True if the turn was sent, False if it was discarded
+
+        """
+        with self._lock:
+            if self._submitted:
+                logger.warning("Discarded a turn submitted after the watchdog deadline")
+                return False
+            self._submitted = True
+            if self._timer is not None:
+                self._timer.cancel()
+            send_command(json.dumps(build_stack))
+            send_command(json.dumps(deploy_stack))
+            return True
+
+    def end_turn(self):
+        """Stops the timer. Called by AlgoCore once on_turn returns.
+        """
+        global _active
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        if _active is self:
+            _active = None
+
+    def expired(self):
+        """True if the current or last turn was submitted by the timer
+        """
+        return self._expired
+
+    def _expire(self):
+        with self._lock:
+            if self._submitted:
+                return
+            build_stack, deploy_stack = self._best or (self.default_build, self.default_deploy)
+            self._submitted = True
+            self._expired = True
+            self.expired_turns += 1
+            send_command(json.dumps(build_stack))
+            send_command(json.dumps(deploy_stack))
+        logger.warning("Turn deadline reached after {} seconds, submitted the {} turn", self.budget, "best offered" if self._best else "default")
+
+
+def offer_turn(build_stack, deploy_stack):
+    """Offers a turn to the watchdog of the turn in progress, if any
+    """
+    watchdog = _active
+    if watchdog is not None:
+        watchdog.offer(build_stack, deploy_stack)
+
+
+def submit_turn(build_stack, deploy_stack):
+    """Sends a turn through the watchdog of the turn in progress, or directly if there is none
+
+    Returns:
+        True if the turn was sent, False if the watchdog had already submitted one
+
+    """
+    watchdog = _active
+    if watchdog is not None:
+        return watchdog.submit(build_stack, deploy_stack)
+    send_command(json.dumps(build_stack))
+    send_command(json.dumps(deploy_stack))
+    return True
@@ -0,0 +1,331 @@
+import math
+
+from .game_map import cell_index
+from .navigation import HORIZONTAL, VERTICAL, choose_next_move, descend, endpoint_table, get_path_regions, _CELL_X, _CELL_Y
+from .unit import GameUnit
+
+
+class WaveGroup:
+    """A stack of identical mobile units spawned on one location, followed through the action phase
+
+    Attributes :
+        * unit_type (string): The type of the units
+        * spawn_location (list): Where the units were spawned
+        * location (list): Where the units are now, or where they stopped
+        * count (int): The number of units still alive
+        * health (float): The total health left in the stack
+        * path (list): The (frame, [x, y]) of every location the stack stood on, starting with the spawn at frame 0
+        * outcome (string): None while moving, then 'breach', 'self_destruct', 'destroyed' or 'timeout'
+        * end_frame (int): The frame the stack stopped on, None while it is moving
+        * breaches (int): The number of units that reached the target edge
+
+    """
+    def __init__(self, unit_type, location, count, config, player_index):
+        self.unit = GameUnit(unit_type, config, player_index)
+        self.unit_type = unit_type
+        self.spawn_location = [location[0], location[1]]
+        self.location = [location[0], location[1]]
+        self.count = count
+        self.health = self.unit.max_health * count
+        self.path = [(0, [location[0], location[1]])]
+        self.outcome = None
+        self.end_frame = None
+        self.breaches = 0
+        self.table = None
+        self.move_direction = 0
+        self.steps = 0
+        self.frames_per_move = max(1, round(1 / self.unit.speed)) if self.unit.speed else 0
+
+    def locations(self):
+        """The locations the stack stood on, in order
+        """
+        return [location for _, location in self.path]
+
+
+class WaveTimeline:
+    """The predicted course of a wave of mobile units through one action phase.
+
+    Structures destroyed during the phase are unblocked in a private copy of the pathable regions
+    with PathRegions.remove_structure, so the units re-path exactly as they would in game while
+    only the cells whose pathlength changes are recomputed.
+
+    Only the attacking units and the defending structures are modeled: defending mobile units,
+    shields and the defender's own attacks on structures are ignored.
+
+    Attributes :
+        * player_index (int): The player that spawned the wave, 0 for you 1 for the enemy
+        * groups (list): A WaveGroup for each spawn location and unit type
+        * destroyed (list): The (frame, [x, y]) of every defending structure destroyed, in order
+        * repaths (list): The (frame, group index, [x, y]) of every time a stack's remaining path changed because a structure was destroyed
+        * structure_damage (dict): Maps (x, y) to the damage dealt to the structure there
+        * breaches (int): The number of units that reached the target edge
+        * frames (int): The number of frames simulated
+
+    """
+    def __init__(self, player_index, groups):
+        self.player_index = player_index
+        self.groups = groups
+        self.destroyed = []
+        self.repaths = []
+        self.structure_damage = {}
+        self.breaches = 0
+        self.frames = 0
+
+    def path_of(self, group_index):
+        """The locations crossed by one stack, in order, including every re-path
+        """
+        return self.groups[group_index].locations()
+
+    def total_structure_damage(self):
+        """The damage dealt to defending structures, summed over the board
+        """
+        return sum(self.structure_damage.values())
+
+
+class SelfDestructPrediction:
+    """What happens to a stack of mobile units whose path ends away from its target edge
+
+    Attributes :
+        * unit_type (string): The type of the units
+        * spawn_location (list): Where the units are spawned
+        * count (int): The number of units
+        * path (list): The path the units take, or None if they cannot be spawned there
+        * self_destructs (bool): True if the path ends away from the target edge
+        * detonates (bool): True if the units self destruct after moving far enough to deal damage
+        * location (list): Where the units stop
+        * frame (int): The frame the units self destruct on, None if they reach their target edge
+        * damage (dict): Maps the (x, y) of each enemy structure in the blast to the damage it takes
+        * destroyed (list): The (x, y) of the structures the blast destroys
+
+    """
+    def __init__(self, unit_type, spawn_location, count, path):
+        self.unit_type = unit_type
+        self.spawn_location = [spawn_location[0], spawn_location[1]]
+        self.count = count
+        self.path = path
+        self.self_destructs = False
+        self.detonates = False
+        self.location = path[-1] if path else None
+        self.frame = None
+        self.damage = {}
+        self.destroyed = []
+
+    def total_damage(self):
+        """The damage dealt to enemy structures, summed over the blast
+        """
+        return sum(self.damage.values())
+
+
+def predict_self_destructs(game_state, plan, player_index=0):
+    """Flags the stacks of a spawn plan that will self destruct and predicts the damage their blast deals.
+
+    Paths come from the distance fields already cached for the structure layout, so no new flood is
+    needed unless the layout has never been pathed. Structures are assumed to survive until the blast, 
+    and the units are assumed to survive the trip. Use predict_wave to account for turrets and for 
+    structures destroyed on the way.
+
+    Args:
+        * game_state: The GameState the plan is spawned on
+        * plan: A list of (unit_type, [x, y], count) entries
+        * player_index: The player spawning the units, 0 for you 1 for the enemy
+
+    Returns:
+        A SelfDestructPrediction for each entry of the plan, in order
+
+    """
+    game_map = game_state.game_map
+    config = game_state.config
+    regions = get_path_regions(game_state)
+    predictions = []
+    for unit_type, location, count in plan:
+        region = regions.region_of(location)
+        table = endpoint_table(game_map.get_edge_locations(game_state.get_target_edge(location)))
+        if region == -1:
+            predictions.append(SelfDestructPrediction(unit_type, location, count, None))
+            continue
+        prediction = SelfDestructPrediction(unit_type, location, count, regions.path(location, table))
+        predictions.append(prediction)
+        if regions.reaches_end_points(region, table):
+            continue
+        prediction.self_destructs = True
+        unit = GameUnit(unit_type, config, player_index)
+        unit_def = _unit_definition(config, unit_type)
+        steps = len(prediction.path) - 1
+        # The units give up on the first move after reaching the end of their path
+        frames_per_move = max(1, round(1 / unit.speed)) if unit.speed else 0
+        prediction.frame = (steps + 1) * frames_per_move
+        if steps < unit_def.get("selfDestructStepsRequired", 0):
+            continue
+        prediction.detonates = True
+        damage = unit_def.get("selfDestructDamageTower", 0) * count
+        for x, y in game_map.get_locations_in_range(prediction.location, unit_def.get("selfDestructRange", 0)):
+            for target in game_map[x, y]:
+                if target.stationary and target.player_index != player_index:
+                    prediction.damage[x, y] = min(damage, target.health)
+                    if damage >= target.health:
+                        prediction.destroyed.append((x, y))
+    return predictions
+
+
+def predict_wave(game_state, wave, player_index=0, destroyed=None, max_frames=500):
+    """Simulates a wave of mobile units frame by frame, re-pathing as structures are destroyed
+
+    Args:
+        * game_state: The GameState the wave is spawned on
+        * wave: A list of (unit_type, [x, y], count) entries
+        * player_index: The player spawning the wave, 0 for you 1 for the enemy
+        * destroyed: An optional dict mapping locations (x, y) to the frame a structure there is destroyed by something else,
+          for example your own demolishers from an earlier stack
+        * max_frames: The number of frames to simulate before giving up
+
+    Returns:
+        A WaveTimeline
+
+    """
+    game_map = game_state.game_map
+    config = game_state.config
+    defender = 1 - player_index
+    regions = get_path_regions(game_state).copy()
+    structures = {}
+    for x, y in game_map.structure_locations(defender):
+        for unit in game_map[x, y]:
+            if unit.stationary:
+                structures[x, y] = [unit.health, unit]
+    turrets = [(location, entry[1]) for location, entry in structures.items() if entry[1].damage_i > 0]
+
+    groups = []
+    for unit_type, location, count in wave:
+        group = WaveGroup(unit_type, location, count, config, player_index)
+        group.table = endpoint_table(game_map.get_edge_locations(game_state.get_target_edge(location)))
+        if regions.region_of(location) == -1 or not group.frames_per_move:
+            group.outcome, group.end_frame, group.count = "destroyed", 0, 0
+        groups.append(group)
+    timeline = WaveTimeline(player_index, groups)
+    schedule = {}
+    for location, frame in (destroyed or {}).items():
+        schedule.setdefault(frame, []).append(tuple(location))
+
+    def next_step(group):
+        cell = cell_index(group.location)
+        field = regions.distance_field(regions.labels[cell], group.table)
+        if field[cell] == 0:
+            return cell
+        return choose_next_move(cell, group.move_direction, field, regions.blocked, group.table.direction)
+
+    def planned_path(group):
+        field = regions.distance_field(regions.region_of(group.location), group.table)
+        return descend(group.location, field, regions.blocked, group.table.direction, group.move_direction)
+
+    def destroy(location, frame):
+        if location not in structures:
+            return
+        del structures[location]
+        moving = [(index, group, planned_path(group)) for index, group in enumerate(groups) if group.outcome is None]
+        regions.remove_structure(location)
+        timeline.destroyed.append((frame, [location[0], location[1]]))
+        for index, group, path in moving:
+            if planned_path(group) != path:
+                timeline.repaths.append((frame, index, list(group.location)))
+
+    frame = 0
+    while frame < max_frames and any(group.outcome is None for group in groups):
+        frame += 1
+        for location in schedule.pop(frame, []):
+            destroy(location, frame)
+
+        # Movement
+        for group in groups:
+            if group.outcome is not None or frame % group.frames_per_move:
+                continue
+            cell = cell_index(group.location)
+            step = next_step(group)
+            if step == cell:
+                _self_destruct(game_map, group, structures, timeline, frame, destroy)
+                continue
+            group.move_direction = VERTICAL if _CELL_X[cell] == _CELL_X[step] else HORIZONTAL
+            group.location = [_CELL_X[step], _CELL_Y[step]]
+            group.steps += 1
+            group.path.append((frame, list(group.location)))
+            if group.table.is_end_point[step]:
+                group.outcome, group.end_frame, group.breaches = "breach", frame, group.count
+                timeline.breaches += group.count
+
+        # The wave attacks the defending structures
+        for group in groups:
+            if group.outcome is not None or not group.unit.damage_f:
+                continue
+            target = _choose_structure(game_map, group, structures, player_index)
+            if target is None:
+                continue
+            damage = group.unit.damage_f * group.count
+            entry = structures[target]
+            dealt = min(damage, entry[0])
+            entry[0] -= damage
+            timeline.structure_damage[target] = timeline.structure_damage.get(target, 0) + dealt
+            if entry[0] <= 0:
+                destroy(target, frame)
+
+        # The defending turrets attack the wave
+        for location, turret in turrets:
+            if location not in structures:
+                continue
+            target = None
+            for group in groups:
+                if group.outcome is not None:
+                    continue
+                distance = game_map.distance_between_locations(location, group.location)
+                if distance <= turret.attackRange and (target is None or (distance, group.health) < target[0]):
+                    target = ((distance, group.health), group)
+            if target is None:
+                continue
+            group = target[1]
+            group.health -= turret.damage_i
+            group.count = max(0, math.ceil(group.health / group.unit.max_health))
+            if group.health <= 0:
+                group.outcome, group.end_frame, group.count = "destroyed", frame, 0
+
+    for group in groups:
+        if group.outcome is None:
+            group.outcome, group.end_frame = "timeout", frame
+    timeline.frames = frame
+    return timeline
+
+
+def _choose_structure(game_map, group, structures, player_index):
+    """The structure a stack attacks, by the same priority as GameState.get_target
+    """
+    best, best_key = None, None
+    half = game_map.HALF_ARENA - 0.5
+    for x, y in game_map.get_locations_in_range(group.location, group.unit.attackRange):
+        entry = structures.get((x, y))
+        if entry is None:
+            continue
+        height = y if player_index == 0 else -y
+        key = (game_map.distance_between_locations(group.location, [x, y]), entry[0], height, -abs(half - x))
+        if best_key is None or key < best_key:
+            best, best_key = (x, y), key
+    return best
+
+
+def _unit_definition(config, unit_type):
+    """The unitInformation entry of a unit type
+    """
+    return next(unit for unit in config["unitInformation"] if unit.get("shorthand") == unit_type)
+
+
+def _self_destruct(game_map, group, structures, timeline, frame, destroy):
+    """Ends a stack that cannot reach its target edge, damaging the structures around it if it moved far enough
+    """
+    group.outcome, group.end_frame = "self_destruct", frame
+    unit_def = _unit_definition(group.unit.config, group.unit_type)
+    if group.steps < unit_def.get("selfDestructStepsRequired", 0):
+        return
+    damage = unit_def.get("selfDestructDamageTower", 0) * group.count
+    for x, y in game_map.get_locations_in_range(group.location, unit_def.get("selfDestructRange", 0)):
+        entry = structures.get((x, y))
+        if entry is None:
+            continue
+        timeline.structure_damage[x, y] = timeline.structure_damage.get((x, y), 0) + min(damage, entry[0])
+        entry[0] -= damage
+        if entry[0] <= 0:
+            destroy((x, y), frame)
@@ -0,0 +1,230 @@
+import atexit
+import multiprocessing
+import os
+import queue
+import struct
+import sys
+import time
+import traceback
+
+from .util import debug_write, logger
+from .game_state import GameState
+from .cache import QueryCache
+
+try:
+    from multiprocessing import shared_memory
+except ImportError:
+    shared_memory = None
+
+# Snapshot header: sequence number, length of the encoded turn string, then the batch map is collecting.
+# Sequence 0 marks a snapshot being written; published snapshots are numbered from 1.
+_HEADER = struct.Struct("<QQQ")
+_BATCH = struct.Struct("<Q")
+_BATCH_OFFSET = 16
+
+
+class WorkerPool:
+    """A pool of worker processes that evaluate independent tasks on the current turn's board.
+
+    The workers are forked once, after the config is loaded, and live for the whole game. Each turn
+    the serialized game state is written once into a shared memory block; tasks only carry their own
+    arguments and the snapshot's sequence number, and every worker rebuilds the GameState from the
+    shared block the first time it sees a new sequence number. Workers keep their own QueryCache, so
+    paths computed by one task are reused by the next task on the same worker.
+
+    A task is a function taking a GameState and one argument, defined at module level so it can be pickled
+    by reference. It receives a fresh GameState, so it may spawn units or otherwise change the state freely.
+    Workers must never write to stdout, which is reserved for commands to the game engine, so their
+    stdout is redirected to stderr.
+
+    Where fork or shared memory are not available, or processes is 0, tasks are run in this process instead.
+
+    Attributes :
+        * processes (int): The number of worker processes, 0 when running serially
+        * serial (bool): True if tasks run in this process
+
+    """
+    def __init__(self, config, processes=None, snapshot_size=1 << 20):
+        """Starts the workers
+
+        Args:
+            * config (JSON): The game config, inherited by the workers
+            * processes (int): The number of workers. If None, one less than the number of cores.
+            * snapshot_size (int): The size in bytes of the shared snapshot block. Larger snapshots are sent with each task.
+
+        """
+        self.config = config
+        if processes is None:
+            processes = max(0, (os.cpu_count() or 1) - 1)
+        self.serial = processes <= 0 or shared_memory is None or "fork" not in multiprocessing.get_all_start_methods()
+        self.processes = 0 if self.serial else processes
+        self._sequence = 0
+        self._snapshot = None
+        self._batch = 0
+        self._serial_cache = None
+        self._workers = []
+        self._shared = None
+        if self.serial:
+            return
+
+        context = multiprocessing.get_context("fork")
+        self._shared = shared_memory.SharedMemory(create=True, size=_HEADER.size + snapshot_size)
+        _HEADER.pack_into(self._shared.buf, 0, 0, 0, 0)
+        self._tasks = context.Queue()
+        self._results = context.Queue()
+        for _ in range(self.processes):
+            # Forked workers inherit the shared block's mapping, so they never attach to it by name
+            worker = context.Process(target=_worker_main, args=(config, self._shared, self._tasks, self._results), daemon=True)
+            worker.start()
+            self._workers.append(worker)
+        atexit.register(self.close)
+
+    def set_snapshot(self, serialized_string):
+        """Publishes the game state every following task is evaluated on
+
+        Args:
+            serialized_string: The turn's game state string, as passed to on_turn
+
+        """
+        self._sequence += 1
+        self._snapshot = serialized_string
+        if self.serial:
+            return
+        encoded = serialized_string.encode("utf-8")
+        if len(encoded) <= self._shared.size - _HEADER.size:
+            # Tasks of a timed out batch may still be reading the old snapshot. The header is invalidated
+            # before the body is overwritten, so their check after reading sees it was torn.
+            _HEADER.pack_into(self._shared.buf, 0, 0, 0, self._batch)
+            self._shared.buf[_HEADER.size:_HEADER.size + len(encoded)] = encoded
+            _HEADER.pack_into(self._shared.buf, 0, self._sequence, len(encoded), self._batch)
+
+    def map(self, function, arguments, timeout=None, default=None):
+        """Evaluates function(game_state, argument) for every argument, in parallel where possible.
+
+        Args:
+            * function: A module level function taking a GameState and one argument
+            * arguments: The arguments to evaluate
+            * timeout: Seconds to wait for results. Tasks not finished in time get the default result.
+            * default: The result of tasks that did not finish in time or raised an exception
+
+        Returns:
+            The results, in the order of arguments
+
+        """
+        if self._snapshot is None:
+            raise ValueError("set_snapshot must be called before map")
+        arguments = list(arguments)
+        deadline = None if timeout is None else time.time() + timeout
+        if self.serial:
+            return self._map_serial(function, arguments, deadline, default)
+
+        self._batch += 1
+        # Workers skip the queued tasks of earlier batches, so a missed deadline does not delay this one
+        _BATCH.pack_into(self._shared.buf, _BATCH_OFFSET, self._batch)
+        inline = None if self._fits() else self._snapshot
+        for index, argument in enumerate(arguments):
+            self._tasks.put((self._batch, index, self._sequence, inline, function, argument))
+        results = [default] * len(arguments)
+        pending = len(arguments)
+        while pending:
+            wait = None if deadline is None else deadline - time.time()
+            if wait is not None and wait <= 0:
+                break
+            try:
+                batch, index, ok, result = self._results.get(timeout=wait)
+            except queue.Empty:
+                break
+            # Results of earlier batches that missed their deadline are discarded
+            if batch != self._batch:
+                continue
+            pending -= 1
+            if ok:
+                results[index] = result
+            else:
+                debug_write("Worker task failed: {}".format(result))
+        if pending:
+            debug_write("{} of {} worker tasks missed the deadline".format(pending, len(arguments)))
+        return results
+
+    def _fits(self):
+        return len(self._snapshot.encode("utf-8")) <= self._shared.size - _HEADER.size
+
+    def _map_serial(self, function, arguments, deadline, default):
+        if self._serial_cache is None:
+            self._serial_cache = QueryCache(maxsize=1024)
+        results = [default] * len(arguments)
+        for index, argument in enumerate(arguments):
+            if deadline is not None and time.time() >= deadline:
+                debug_write("{} of {} tasks missed the deadline".format(len(arguments) - index, len(arguments)))
+                break
+            try:
+                results[index] = function(GameState(self.config, self._snapshot, self._serial_cache), argument)
+            except Exception:
+                debug_write("Task failed: {}".format(traceback.format_exc()))
+        return results
+
+    def close(self):
+        """Stops the workers and frees the shared snapshot block. Safe to call more than once.
+        """
+        workers, self._workers = self._workers, []
+        for _ in workers:
+            self._tasks.put(None)
+        for worker in workers:
+            worker.join(timeout=1)
+            if worker.is_alive():
+                worker.terminate()
+        if self._shared is not None:
+            self._shared.close()
+            self._shared.unlink()
+            self._shared = None
+
+
+def _read_snapshot(buffer, task_sequence):
+    """Reads the snapshot of a sequence number from the shared block, or returns None if the block
+    holds another snapshot or was rewritten while it was being read
+    """
+    sequence, length, _ = _HEADER.unpack(buffer[:_HEADER.size])
+    if sequence != task_sequence:
+        # The snapshot moved on to a later turn, or is being written, so this task is stale
+        return None
+    encoded = bytes(buffer[_HEADER.size:_HEADER.size + length])
+    if _HEADER.unpack(buffer[:_HEADER.size])[0] != task_sequence:
+        # Overwritten while it was being read
+        return None
+    return encoded.decode("utf-8")
+
+
+def _worker_main(config, shared, tasks, results):
+    """The loop run by each worker process
+    """
+    # stdout belongs to the game engine, anything printed here goes to stderr instead
+    os.dup2(2, 1)
+    sys.stdout = sys.stderr
+    # Lines buffered by the parent before the fork are the parent's to write, and workers never see a turn end
+    logger.clear()
+    logger.buffered = False
+
+    query_cache = QueryCache(maxsize=1024)
+    sequence, snapshot = None, None
+    while True:
+        task = tasks.get()
+        if task is None:
+            break
+        batch, index, task_sequence, inline, function, argument = task
+        if batch < _BATCH.unpack_from(shared.buf, _BATCH_OFFSET)[0]:
+            # map stopped waiting for this batch
+            continue
+        try:
+            if inline is not None:
+                snapshot = inline
+                sequence = None
+            elif task_sequence != sequence:
+                shared_snapshot = _read_snapshot(shared.buf, task_sequence)
+                if shared_snapshot is None:
+                    results.put((batch, index, False, "stale snapshot"))
+                    continue
+                snapshot = shared_snapshot
+                sequence = task_sequence
+            results.put((batch, index, True, function(GameState(config, snapshot, query_cache), argument)))
+        except Exception:
+            results.put((batch, index, False, traceback.format_exc()))
@@ -1,4 +1,9 @@
 #!/bin/bash
 
 DIR="$( cd "$( dirname "${BASH_SOURCE[0]}" )" && pwd )"
+# If an algo server is listening (python algo_strategy.py --serve $ALGO_SERVER_SOCKET), hand the match to it
+# instead of starting a new interpreter. Falls back to a fresh process when the server or socat is not available.
+if [ -n "$ALGO_SERVER_SOCKET" ] && [ -S "$ALGO_SERVER_SOCKET" ] && command -v socat > /dev/null; then
+    exec socat - "UNIX-CONNECT:$ALGO_SERVER_SOCKET"
+fi
 ${PYTHON_CMD:-python3} -u "$DIR/algo_strategy.py"
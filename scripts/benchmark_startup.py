@@ -0,0 +1,100 @@
+import json
+import os
+import statistics
+import subprocess
+import sys
+import time
+
+# Measures how long an algo takes from process launch to its first submitted turn, the cost paid
+# by every local match and every arena game before the algo does any real work.
+#
+# Usage: python scripts/benchmark_startup.py [algo directory or run file] [runs] [--imports]
+# The first run is reported separately, since it may build caches that later runs reuse.
+# With --imports, the slowest modules imported by the algo's gamelib are listed as well.
+
+TURN_0 = json.dumps({
+    "p2Units": [[], [], [], [], [], [], [], []],
+    "turnInfo": [0, 0, -1],
+    "p1Stats": [30.0, 40.0, 5.0, 0],
+    "p1Units": [[], [], [], [], [], [], [], []],
+    "p2Stats": [30.0, 40.0, 5.0, 0],
+    "events": {"selfDestruct": [], "breach": [], "damage": [], "shield": [], "move": [], "spawn": [], "death": [], "attack": [], "melee": []},
+})
+END_STATE = json.dumps({"turnInfo": [2, 0, -1]})
+
+
+# Starts the algo, sends it the config and the first turn, and times the two lines of its turn
+def time_first_turn(run_command, config_line):
+    start = time.perf_counter()
+    p = subprocess.Popen(
+        run_command,
+        stdin=subprocess.PIPE,
+        stdout=subprocess.PIPE,
+        stderr=subprocess.DEVNULL,
+        universal_newlines=True
+        )
+    p.stdin.write(config_line + "\n")
+    p.stdin.write(TURN_0 + "\n")
+    p.stdin.flush()
+    build = p.stdout.readline()
+    deploy = p.stdout.readline()
+    elapsed = time.perf_counter() - start
+    try:
+        p.stdin.write(END_STATE + "\n")
+        p.stdin.close()
+    except OSError:
+        pass
+    p.wait(timeout=30)
+    if not build or not deploy:
+        raise RuntimeError("The algo exited before submitting its first turn")
+    return elapsed
+
+
+# Lists the modules that take longest to import with the algo's gamelib, using python -X importtime
+def slowest_imports(algo_dir, count=10):
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", "import gamelib"],
+        cwd=algo_dir,
+        stdout=subprocess.DEVNULL,
+        stderr=subprocess.PIPE,
+        universal_newlines=True
+        )
+    timings = []
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:") or "cumulative" in line:
+            continue
+        _, cumulative, module = line[len("import time:"):].split("|")
+        timings.append((int(cumulative), module.strip()))
+    return sorted(timings, reverse=True)[:count]
+
+
+# Get location of this run file
+file_dir = os.path.dirname(os.path.realpath(__file__))
+parent_dir = os.path.abspath(os.path.join(file_dir, os.pardir))
+
+arguments = [argument for argument in sys.argv[1:] if not argument.startswith("--")]
+algo = arguments[0] if arguments else os.path.join(parent_dir, "my-algo2-2")
+runs = int(arguments[1]) if len(arguments) > 1 else 10
+if os.path.isdir(algo):
+    algo_dir = algo
+    run_file = os.path.join(algo, "run.ps1" if sys.platform.startswith('win') else "run.sh")
+else:
+    algo_dir = os.path.dirname(algo)
+    run_file = algo
+run_command = ["powershell", "-File", run_file] if run_file.endswith(".ps1") else ["bash", run_file]
+
+with open(os.path.join(parent_dir, "game-configs.json")) as config_file:
+    config_line = json.dumps(json.load(config_file))
+
+print("Algo: ", run_file)
+first = time_first_turn(run_command, config_line)
+times = [time_first_turn(run_command, config_line) for _ in range(max(runs - 1, 0))]
+print("First run:      {:8.1f} ms".format(first * 1000))
+if times:
+    print("Later runs:     {:8.1f} ms median, {:.1f} ms min, {:.1f} ms max over {} runs".format(
+        statistics.median(times) * 1000, min(times) * 1000, max(times) * 1000, len(times)))
+
+if "--imports" in sys.argv:
+    print("Slowest imports (cumulative):")
+    for microseconds, module in slowest_imports(algo_dir):
+        print("  {:8.1f} ms  {}".format(microseconds / 1000, module))